@@ -3,12 +3,31 @@ Admin Module — Routes and Helpers
 Provides admin dashboard, user management, product management, and category management.
 """
 
+import csv
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
 from functools import wraps
 from flask import (
     Blueprint, render_template, request, redirect, url_for,
-    flash, session, abort, jsonify
+    flash, session, abort, jsonify, current_app, Response,
+    stream_with_context, send_file
 )
 import os
+import pymysql.cursors
+
+import profiling
+
+from archive import ANALYSIS_COLUMNS, archived_product, tier_queries, with_archive
+from cache import bump_version, product_key
+from db import get_db, query_db, transaction
+from file_reaper import queue_delete
+from lookups import get_categories
+from records import make_cards
+from rollups import METRICS, build_series
+from seller_stats import refresh_seller_stats, refresh_sellers
+from similar import set_listed
+from trust_labels import get_trust_label
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -29,10 +48,147 @@ def admin_required(f):
 
 
 # ─── Helpers (import from app) ──────────────────────────────────────
-def get_query_db():
-    """Get query_db from the app module."""
-    from app import query_db
-    return query_db
+def get_shared_cache():
+    """Get the host-wide shared cache registered on the app."""
+    return current_app.extensions['shared_cache']
+
+
+def _invalidate_products(product_ids):
+    """Drop cached product page data for the given products."""
+    cache = get_shared_cache()
+    for product_id in product_ids:
+        cache.delete(product_key(product_id))
+
+
+def _invalidate_seller(query_db, user_id):
+    """Drop a user's card and every cached product page showing them as seller."""
+    get_shared_cache().delete(f'user:{user_id}')
+    products = query_db("SELECT id FROM products WHERE seller_id = %s", (user_id,))
+    _invalidate_products(p['id'] for p in products)
+
+
+def _int_or_none(value):
+    """Coerce a form/JSON value to int, or None if it is missing or malformed."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _paginate(query_db, query, params, page):
+    """Run a listing query for one page. Returns (rows, has_next)."""
+    per_page = current_app.config['ADMIN_PAGE_SIZE']
+    rows = query_db(query + " LIMIT %s OFFSET %s",
+                    list(params) + [per_page + 1, (page - 1) * per_page])
+    return rows[:per_page], len(rows) > per_page
+
+
+def _paginate_tiers(query_db, query, params, order_by, page):
+    """_paginate over live and archived rows (``query`` as for with_archive).
+
+    Each tier is sorted and cut to the rows up to the end of this page
+    before the union, so neither tier is materialised and sorted in full.
+    ``order_by`` must name output columns and end in a unique one.
+    """
+    per_page = current_app.config['ADMIN_PAGE_SIZE']
+    query, params = with_archive(query, params, order_by, page * per_page + 1)
+    return _paginate(query_db, f"{query} ORDER BY {order_by}", params, page)
+
+
+def _parse_date(value):
+    """Parse a YYYY-MM-DD filter value, ignoring anything malformed."""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+
+def _user_filters(args):
+    """Read the user management filters from the query string."""
+    return {
+        'search': args.get('search', '').strip(),
+        'role': args.get('role', ''),
+    }
+
+
+def _user_where(filters):
+    """Build the extra WHERE conditions for user management filters."""
+    where = ''
+    params = []
+    if filters['search']:
+        # Prefix match so idx_users_name and the email unique index apply
+        where += " AND (u.full_name LIKE %s OR u.email LIKE %s)"
+        params.extend([f"{filters['search']}%", f"{filters['search']}%"])
+    if filters['role']:
+        where += " AND u.role = %s"
+        params.append(filters['role'])
+    return where, params
+
+
+def _product_filters(args):
+    """Read the product management filters from the query string."""
+    return {
+        'search': args.get('search', '').strip(),
+        'status': args.get('status', ''),
+        'category': args.get('category', ''),
+    }
+
+
+def _product_where(filters):
+    """Build the extra WHERE conditions for product management filters."""
+    where = ''
+    params = []
+    if filters['search']:
+        where += " AND (p.title LIKE %s OR p.description LIKE %s)"
+        params.extend([f"%{filters['search']}%", f"%{filters['search']}%"])
+    if filters['status']:
+        where += " AND p.status = %s"
+        params.append(filters['status'])
+    if filters['category']:
+        where += " AND p.category_id = %s"
+        params.append(filters['category'])
+    return where, params
+
+
+def _analysis_filters(args):
+    """Read the AI analytics filters from the query string."""
+    return {
+        'blurry': args.get('blurry', '') == '1',
+        'min_trust': args.get('min_trust', None, type=int),
+        'max_trust': args.get('max_trust', None, type=int),
+        'condition': args.get('condition', '').strip(),
+        'duplicates': args.get('duplicates', '') == '1',
+        'date_from': args.get('date_from', '').strip(),
+        'date_to': args.get('date_to', '').strip(),
+    }
+
+
+def _analysis_where(filters):
+    """Build the WHERE clause for AI analytics filters."""
+    clauses = ['1=1']
+    params = []
+    if filters['blurry']:
+        clauses.append('ai.is_blurry = TRUE')
+    if filters['min_trust'] is not None:
+        clauses.append('ai.trust_score >= %s')
+        params.append(filters['min_trust'])
+    if filters['max_trust'] is not None:
+        clauses.append('ai.trust_score <= %s')
+        params.append(filters['max_trust'])
+    if filters['condition']:
+        clauses.append('ai.condition_label = %s')
+        params.append(filters['condition'])
+    if filters['duplicates']:
+        clauses.append('p.duplicate_of IS NOT NULL')
+    date_from = _parse_date(filters['date_from'])
+    if date_from:
+        clauses.append('ai.analyzed_at >= %s')
+        params.append(date_from)
+    date_to = _parse_date(filters['date_to'])
+    if date_to:
+        clauses.append('ai.analyzed_at < %s')
+        params.append(date_to + timedelta(days=1))
+    return ' AND '.join(clauses), params
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -43,7 +199,6 @@ def get_query_db():
 @admin_required
 def dashboard():
     """Admin dashboard with platform statistics."""
-    query_db = get_query_db()
 
     # Aggregate stats
     stats = {
@@ -51,30 +206,37 @@ def dashboard():
             "SELECT COUNT(*) AS cnt FROM users WHERE role != 'admin'", one=True
         )['cnt'],
         'total_products': query_db(
-            "SELECT COUNT(*) AS cnt FROM products", one=True
+            """SELECT (SELECT COUNT(*) FROM products)
+                      + (SELECT COUNT(*) FROM products_archive) AS cnt""", one=True
         )['cnt'],
         'active_products': query_db(
             "SELECT COUNT(*) AS cnt FROM products WHERE status = 'available'", one=True
         )['cnt'],
         'sold_products': query_db(
-            "SELECT COUNT(*) AS cnt FROM products WHERE status = 'sold'", one=True
+            """SELECT (SELECT COUNT(*) FROM products WHERE status = 'sold')
+                      + (SELECT COUNT(*) FROM products_archive WHERE status = 'sold') AS cnt""",
+            one=True
         )['cnt'],
         'total_messages': query_db(
-            "SELECT COUNT(*) AS cnt FROM messages", one=True
+            """SELECT (SELECT COUNT(*) FROM messages)
+                      + (SELECT COALESCE(SUM(message_count), 0) FROM message_archives) AS cnt""",
+            one=True
         )['cnt'],
         'total_categories': query_db(
             "SELECT COUNT(*) AS cnt FROM categories", one=True
         )['cnt'],
-        'ai_analyzed': query_db(
-            "SELECT COUNT(*) AS cnt FROM product_ai_analysis", one=True
-        )['cnt'],
     }
 
-    # Average trust score
-    avg_trust = query_db(
-        "SELECT AVG(trust_score) AS avg_score FROM product_ai_analysis", one=True
+    # Analysis count and average trust score, archived listings included
+    analyses = query_db(
+        """SELECT SUM(cnt) AS cnt, SUM(total) / SUM(cnt) AS avg_score FROM (
+               SELECT COUNT(*) AS cnt, SUM(trust_score) AS total FROM product_ai_analysis
+               UNION ALL
+               SELECT COUNT(*), SUM(trust_score) FROM product_ai_analysis_archive
+           ) tiers""", one=True
     )
-    stats['avg_trust_score'] = round(avg_trust['avg_score'] or 0, 1)
+    stats['ai_analyzed'] = int(analyses['cnt'] or 0)
+    stats['avg_trust_score'] = round(analyses['avg_score'] or 0, 1)
 
     # Recent users (last 5)
     recent_users = query_db(
@@ -91,18 +253,21 @@ def dashboard():
     """)
 
     # Category distribution
-    category_stats = query_db("""
+    listings, _ = with_archive("SELECT p.id, p.category_id FROM {products} p")
+    category_stats = query_db(f"""
         SELECT c.name, COUNT(p.id) AS product_count
         FROM categories c
-        LEFT JOIN products p ON p.category_id = c.id
+        LEFT JOIN ({listings}) p ON p.category_id = c.id
         GROUP BY c.id, c.name
         ORDER BY product_count DESC
     """)
 
-    # Condition distribution from AI analysis
-    condition_stats = query_db("""
-        SELECT condition_label, COUNT(*) AS cnt
-        FROM product_ai_analysis
+    # Condition distribution from AI analysis, archived listings included
+    conditions, _ = with_archive(
+        "SELECT condition_label, COUNT(*) AS cnt FROM {ai} GROUP BY condition_label")
+    condition_stats = query_db(f"""
+        SELECT condition_label, SUM(cnt) AS cnt
+        FROM ({conditions}) tiers
         GROUP BY condition_label
     """)
 
@@ -114,6 +279,96 @@ def dashboard():
                            condition_stats=condition_stats)
 
 
+@admin_bp.route('/api/timeseries')
+@admin_required
+def timeseries():
+    """Daily trend series from the rollup tables, as compact columnar JSON.
+
+    ``metric`` is one of rollups.METRICS; ``days`` (max 365) sets the window
+    and ``category`` optionally restricts it to one category id.
+    """
+    metric = request.args.get('metric', 'listings')
+    if metric not in METRICS:
+        return jsonify({'error': 'Unknown metric', 'metrics': sorted(METRICS)}), 400
+    days = min(max(request.args.get('days', 30, type=int), 1), 365)
+    category_id = request.args.get('category', None, type=int)
+
+    num_col, den_col, _ = METRICS[metric]
+    start = datetime.now().date() - timedelta(days=days - 1)
+    query = f"""
+        SELECT day, category_id, SUM({num_col}) AS num,
+               {f'SUM({den_col})' if den_col else 'NULL'} AS den
+        FROM daily_category_stats
+        WHERE day >= %s
+    """
+    params = [start]
+    if category_id is not None:
+        query += " AND category_id = %s"
+        params.append(category_id)
+    query += " GROUP BY day, category_id"
+
+    result = build_series(query_db(query, params), metric, start, days)
+    names = {str(c['id']): c['name'] for c in query_db("SELECT id, name FROM categories")}
+    names['0'] = 'Uncategorized'
+    result.update({
+        'metric': metric,
+        'start': start.isoformat(),
+        'days': days,
+        'categories': {cat: names.get(cat, cat) for cat in result['series']},
+    })
+    return jsonify(result)
+
+
+@admin_bp.route('/api/cache_stats')
+@admin_required
+def cache_stats():
+    """Hit/miss counters of this worker's listing and shared caches."""
+    return jsonify({
+        'listing': current_app.extensions['listing_cache'].stats(),
+        'shared': get_shared_cache().stats(),
+    })
+
+
+# ═══════════════════════════════════════════════════════════════════
+#  REQUEST PROFILES
+# ═══════════════════════════════════════════════════════════════════
+
+@admin_bp.route('/profiles')
+@admin_required
+def profiles():
+    """Stored request profiles, newest first."""
+    return render_template('admin/profiles.html',
+                           profiles=profiling.list_profiles(current_app.config['PROFILE_DIR']))
+
+
+@admin_bp.route('/profiles/<name>')
+@admin_required
+def profile_detail(name):
+    """Top functions and per-layer time of one profile."""
+    directory = current_app.config['PROFILE_DIR']
+    meta_path = profiling.profile_path(directory, name, '.json')
+    folded_path = profiling.profile_path(directory, name, '.folded')
+    if not meta_path or not folded_path:
+        abort(404)
+    with open(meta_path) as f:
+        meta = json.load(f)
+    summary = profiling.summarize(profiling.load_stacks(folded_path))
+    if request.args.get('format') == 'json':
+        return jsonify({'meta': meta, 'summary': summary})
+    return render_template('admin/profile_detail.html', name=name, meta=meta, summary=summary)
+
+
+@admin_bp.route('/profiles/<name>/folded')
+@admin_required
+def profile_download(name):
+    """Raw collapsed stacks, for flamegraph.pl or speedscope."""
+    path = profiling.profile_path(current_app.config['PROFILE_DIR'], name, '.folded')
+    if not path:
+        abort(404)
+    return send_file(path, mimetype='text/plain', as_attachment=True,
+                     download_name=name + '.folded')
+
+
 # ═══════════════════════════════════════════════════════════════════
 #  USER MANAGEMENT
 # ═══════════════════════════════════════════════════════════════════
@@ -121,44 +376,50 @@ def dashboard():
 @admin_bp.route('/users')
 @admin_required
 def manage_users():
-    """View and manage all users."""
-    query_db = get_query_db()
-    search = request.args.get('search', '').strip()
-    role_filter = request.args.get('role', '')
+    """View and manage all users (newest first, keyset-paginated)."""
+    filters = _user_filters(request.args)
+    before_id = request.args.get('before', None, type=int)
+    per_page = current_app.config['ADMIN_PAGE_SIZE']
 
     query = """
-        SELECT u.*, 
-               (SELECT COUNT(*) FROM products WHERE seller_id = u.id) AS product_count
+        SELECT u.*,
+               COALESCE(s.listing_count, 0) AS product_count,
+               COALESCE(s.active_count, 0) AS active_count,
+               COALESCE(s.sold_count, 0) AS sold_count,
+               COALESCE(s.total_views, 0) AS total_views,
+               s.avg_trust
         FROM users u
+        LEFT JOIN seller_stats s ON s.seller_id = u.id
         WHERE u.role != 'admin'
     """
-    params = []
+    where, params = _user_where(filters)
+    query += where
 
-    if search:
-        query += " AND (u.full_name LIKE %s OR u.email LIKE %s)"
-        params.extend([f'%{search}%', f'%{search}%'])
-    if role_filter:
-        query += " AND u.role = %s"
-        params.append(role_filter)
+    if before_id:
+        query += " AND u.id < %s"
+        params.append(before_id)
 
-    query += " ORDER BY u.created_at DESC"
+    query += " ORDER BY u.id DESC LIMIT %s"
+    params.append(per_page + 1)
 
     users = query_db(query, params)
+    next_before = users[per_page - 1]['id'] if len(users) > per_page else None
     return render_template('admin/users.html',
-                           users=users, search=search, role_filter=role_filter)
+                           users=users[:per_page], search=filters['search'],
+                           role_filter=filters['role'], next_before=next_before)
 
 
 @admin_bp.route('/users/<int:user_id>/toggle_status', methods=['POST'])
 @admin_required
 def toggle_user_status(user_id):
     """Block or unblock a user by changing their role."""
-    query_db = get_query_db()
     user = query_db("SELECT * FROM users WHERE id = %s", (user_id,), one=True)
     if not user or user['role'] == 'admin':
         abort(404)
 
     new_role = request.form.get('new_role', 'student')
     query_db("UPDATE users SET role = %s WHERE id = %s", (new_role, user_id), commit=True)
+    _invalidate_seller(query_db, user_id)
     flash(f"User '{user['full_name']}' role updated to '{new_role}'.", 'success')
     return redirect(url_for('admin.manage_users'))
 
@@ -167,21 +428,28 @@ def toggle_user_status(user_id):
 @admin_required
 def delete_user(user_id):
     """Delete a user and all their data."""
-    query_db = get_query_db()
     user = query_db("SELECT * FROM users WHERE id = %s", (user_id,), one=True)
     if not user or user['role'] == 'admin':
         abort(404)
 
-    # Delete user's product images
-    products = query_db("SELECT image_filename FROM products WHERE seller_id = %s", (user_id,))
-    from flask import current_app
+    # Delete user's product images, archived ones included
+    products = query_db(*with_archive(
+        "SELECT p.id, p.image_filename FROM {products} p WHERE p.seller_id = %s", (user_id,)))
     for p in products:
         if p['image_filename']:
             img_path = os.path.join(current_app.config['UPLOAD_FOLDER'], p['image_filename'])
             if os.path.exists(img_path):
                 os.remove(img_path)
 
-    query_db("DELETE FROM users WHERE id = %s", (user_id,), commit=True)
+    with transaction() as cur:
+        # messages is partitioned and has no foreign keys to cascade from users
+        cur.execute("DELETE FROM messages WHERE sender_id = %s OR receiver_id = %s",
+                    (user_id, user_id))
+        cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
+    bump_version(query_db)
+    get_shared_cache().delete(f'user:{user_id}')
+    _invalidate_products(p['id'] for p in products)
+    set_listed((p['id'] for p in products), False)
     flash(f"User '{user['full_name']}' has been deleted.", 'info')
     return redirect(url_for('admin.manage_users'))
 
@@ -193,62 +461,173 @@ def delete_user(user_id):
 @admin_bp.route('/products')
 @admin_required
 def manage_products():
-    """View and manage all products."""
-    query_db = get_query_db()
-    search = request.args.get('search', '').strip()
-    status_filter = request.args.get('status', '')
-    category_filter = request.args.get('category', '')
-
-    query = """
-        SELECT p.*, u.full_name AS seller_name, u.email AS seller_email,
+    """View and manage all products, archived ones included."""
+    filters = _product_filters(request.args)
+    page = max(request.args.get('page', 1, type=int), 1)
+
+    where, params = _product_where(filters)
+    rows, has_next = _paginate_tiers(query_db, """
+        SELECT p.id, p.title, p.price, p.image_filename, p.item_condition,
+               p.status, p.views_count, p.created_at, p.seller_id,
+               u.full_name AS seller_name, u.email AS seller_email,
                c.name AS category_name,
                ai.trust_score, ai.condition_label, ai.is_blurry
-        FROM products p
+        FROM {products} p
         JOIN users u ON p.seller_id = u.id
         LEFT JOIN categories c ON p.category_id = c.id
-        LEFT JOIN product_ai_analysis ai ON ai.product_id = p.id
+        LEFT JOIN {ai} ai ON ai.product_id = p.id
         WHERE 1=1
-    """
-    params = []
+    """ + where, params, 'created_at DESC, id DESC', page)
+    products = make_cards(rows, get_trust_label)
+    categories = get_categories()
 
-    if search:
-        query += " AND (p.title LIKE %s OR p.description LIKE %s)"
-        params.extend([f'%{search}%', f'%{search}%'])
-    if status_filter:
-        query += " AND p.status = %s"
-        params.append(status_filter)
-    if category_filter:
-        query += " AND p.category_id = %s"
-        params.append(category_filter)
+    return render_template('admin/products.html',
+                           products=products, categories=categories,
+                           search=filters['search'], status_filter=filters['status'],
+                           category_filter=filters['category'],
+                           page=page, has_next=has_next)
 
-    query += " ORDER BY p.created_at DESC"
 
-    products = query_db(query, params)
-    categories = query_db("SELECT * FROM categories ORDER BY name")
+# action -> (status a product must have, new status); None matches any
+# status / deletes the rows. Sold listings are never relisted or removed.
+BULK_ACTIONS = {
+    'remove': ('available', 'removed'),
+    'restore': ('removed', 'available'),
+    'delete': (None, None),
+}
 
-    return render_template('admin/products.html',
-                           products=products, categories=categories,
-                           search=search, status_filter=status_filter,
-                           category_filter=category_filter)
+
+def _bulk_where(data, product_ids):
+    """Build the WHERE clause selecting bulk targets, or None if nothing was selected."""
+    clauses = []
+    params = []
+    if product_ids:
+        clauses.append(f"p.id IN ({', '.join(['%s'] * len(product_ids))})")
+        params.extend(product_ids)
+    seller_id = _int_or_none(data.get('seller_id'))
+    if seller_id is not None:
+        clauses.append('p.seller_id = %s')
+        params.append(seller_id)
+    category_id = _int_or_none(data.get('category_id'))
+    if category_id is not None:
+        clauses.append('p.category_id = %s')
+        params.append(category_id)
+    max_trust = _int_or_none(data.get('max_trust'))
+    if max_trust is not None:
+        clauses.append('ai.trust_score < %s')
+        params.append(max_trust)
+    if not clauses:
+        return None, []
+    return ' AND '.join(clauses), params
+
+
+@admin_bp.route('/products/bulk', methods=['POST'])
+@admin_required
+def bulk_products():
+    """Remove, restore or delete many products in one transaction.
+
+    Targets are explicit ``product_ids`` and/or a filter (``seller_id``,
+    ``category_id``, ``max_trust`` = trust score below X). Remove only
+    takes available listings and restore only removed ones, so a filter
+    never relists or hides sold listings. Accepts a form post or a JSON
+    body and reports the affected counts.
+    """
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        raw_ids = data.get('product_ids') or []
+    else:
+        data = request.form
+        raw_ids = request.form.getlist('product_ids')
+    product_ids = [pid for pid in map(_int_or_none, raw_ids) if pid is not None]
+
+    action = data.get('action', '')
+    if action not in BULK_ACTIONS:
+        return jsonify({'error': 'Unknown action'}), 400
+    where, params = _bulk_where(data, product_ids)
+    if where is None:
+        return jsonify({'error': 'No products selected'}), 400
+
+    from_status, new_status = BULK_ACTIONS[action]
+    if from_status is not None:
+        where += " AND p.status = %s"
+        params.append(from_status)
+    with transaction() as cur:
+        cur.execute(f"""
+            SELECT p.id, p.seller_id, p.image_filename
+            FROM products p
+            LEFT JOIN product_ai_analysis ai ON ai.product_id = p.id
+            WHERE {where}
+            FOR UPDATE
+        """, params)
+        # Locked rows in the required status: exactly the rows changed below
+        targets = cur.fetchall()
+
+        affected = 0
+        if targets:
+            ids = [t['id'] for t in targets]
+            placeholders = ', '.join(['%s'] * len(ids))
+            if new_status is None:
+                cur.execute(f"DELETE FROM products WHERE id IN ({placeholders})", ids)
+            else:
+                cur.execute(f"UPDATE products SET status = %s WHERE id IN ({placeholders})",
+                            [new_status] + ids)
+            affected = cur.rowcount
+
+    seller_ids = {t['seller_id'] for t in targets}
+    refresh_sellers(query_db, seller_ids)
+    if affected:
+        bump_version(query_db)
+        _invalidate_products(t['id'] for t in targets)
+        set_listed((t['id'] for t in targets), new_status == 'available')
+
+    files_queued = 0
+    if new_status is None:
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        files_queued = queue_delete(
+            os.path.join(upload_folder, t['image_filename'])
+            for t in targets if t['image_filename']
+        )
+
+    result = {
+        'action': action,
+        'matched': len(targets),
+        'affected': affected,
+        'sellers': len(seller_ids),
+        'files_queued': files_queued,
+    }
+    if request.is_json:
+        return jsonify(result)
+    flash(f"Bulk {action}: {affected} of {len(targets)} product(s) affected.", 'success')
+    return redirect(url_for('admin.manage_products'))
 
 
 @admin_bp.route('/products/<int:product_id>/remove', methods=['POST'])
 @admin_required
 def remove_product(product_id):
     """Admin removes a product listing."""
-    query_db = get_query_db()
     product = query_db("SELECT * FROM products WHERE id = %s", (product_id,), one=True)
     if not product:
-        abort(404)
-
-    # Delete image file
-    if product['image_filename']:
-        from flask import current_app
-        img_path = os.path.join(current_app.config['UPLOAD_FOLDER'], product['image_filename'])
-        if os.path.exists(img_path):
-            os.remove(img_path)
+        archived = archived_product(query_db, product_id)
+        if not archived:
+            abort(404)
+        query_db("DELETE FROM products_archive WHERE id = %s", (product_id,), commit=True)
+        refresh_seller_stats(query_db, archived['seller_id'])
+        _invalidate_products([product_id])
+        if archived['image_filename']:
+            queue_delete([os.path.join(current_app.config['UPLOAD_FOLDER'],
+                                       archived['image_filename'])])
+        flash(f"Archived product '{archived['title']}' has been removed.", 'info')
+        return redirect(url_for('admin.manage_products'))
 
     query_db("DELETE FROM products WHERE id = %s", (product_id,), commit=True)
+    refresh_seller_stats(query_db, product['seller_id'])
+    bump_version(query_db)
+    _invalidate_products([product_id])
+    set_listed([product_id], False)
+
+    # Delete image file in the background
+    if product['image_filename']:
+        queue_delete([os.path.join(current_app.config['UPLOAD_FOLDER'], product['image_filename'])])
     flash(f"Product '{product['title']}' has been removed.", 'info')
     return redirect(url_for('admin.manage_products'))
 
@@ -257,13 +636,16 @@ def remove_product(product_id):
 @admin_required
 def toggle_product_status(product_id):
     """Toggle product status (available/removed)."""
-    query_db = get_query_db()
     product = query_db("SELECT * FROM products WHERE id = %s", (product_id,), one=True)
     if not product:
         abort(404)
 
     new_status = 'removed' if product['status'] == 'available' else 'available'
     query_db("UPDATE products SET status = %s WHERE id = %s", (new_status, product_id), commit=True)
+    refresh_seller_stats(query_db, product['seller_id'])
+    bump_version(query_db)
+    _invalidate_products([product_id])
+    set_listed([product_id], new_status == 'available')
     flash(f"Product '{product['title']}' status changed to '{new_status}'.", 'success')
     return redirect(url_for('admin.manage_products'))
 
@@ -276,7 +658,6 @@ def toggle_product_status(product_id):
 @admin_required
 def manage_categories():
     """View and manage categories."""
-    query_db = get_query_db()
     categories = query_db("""
         SELECT c.*, COUNT(p.id) AS product_count
         FROM categories c
@@ -291,7 +672,6 @@ def manage_categories():
 @admin_required
 def add_category():
     """Add a new category."""
-    query_db = get_query_db()
     name = request.form.get('name', '').strip()
     icon = request.form.get('icon', 'bi-tag').strip()
 
@@ -305,6 +685,8 @@ def add_category():
         return redirect(url_for('admin.manage_categories'))
 
     query_db("INSERT INTO categories (name, icon) VALUES (%s, %s)", (name, icon), commit=True)
+    bump_version(query_db)
+    get_shared_cache().delete('categories')
     flash(f"Category '{name}' added successfully.", 'success')
     return redirect(url_for('admin.manage_categories'))
 
@@ -313,7 +695,6 @@ def add_category():
 @admin_required
 def edit_category(category_id):
     """Edit a category."""
-    query_db = get_query_db()
     name = request.form.get('name', '').strip()
     icon = request.form.get('icon', 'bi-tag').strip()
 
@@ -323,6 +704,9 @@ def edit_category(category_id):
 
     query_db("UPDATE categories SET name = %s, icon = %s WHERE id = %s",
              (name, icon, category_id), commit=True)
+    bump_version(query_db)
+    get_shared_cache().delete('categories')
+    get_shared_cache().delete_prefix(product_key(''))  # pages show the category name
     flash(f"Category updated successfully.", 'success')
     return redirect(url_for('admin.manage_categories'))
 
@@ -331,12 +715,14 @@ def edit_category(category_id):
 @admin_required
 def delete_category(category_id):
     """Delete a category."""
-    query_db = get_query_db()
     cat = query_db("SELECT * FROM categories WHERE id = %s", (category_id,), one=True)
     if not cat:
         abort(404)
 
     query_db("DELETE FROM categories WHERE id = %s", (category_id,), commit=True)
+    bump_version(query_db)
+    get_shared_cache().delete('categories')
+    get_shared_cache().delete_prefix(product_key(''))  # pages show the category name
     flash(f"Category '{cat['name']}' deleted.", 'info')
     return redirect(url_for('admin.manage_categories'))
 
@@ -349,27 +735,27 @@ def delete_category(category_id):
 @admin_required
 def ai_analytics():
     """View AI analysis statistics and reports."""
-    query_db = get_query_db()
-
-    # All analyzed products
-    analyses = query_db("""
-        SELECT ai.*, p.title AS product_title, p.image_filename, 
-               u.full_name AS seller_name
-        FROM product_ai_analysis ai
-        JOIN products p ON ai.product_id = p.id
-        JOIN users u ON p.seller_id = u.id
-        ORDER BY ai.analyzed_at DESC
-    """)
+    filters = _analysis_filters(request.args)
+    sort_by = request.args.get('sort', 'newest')
+    page = max(request.args.get('page', 1, type=int), 1)
+
+    # Stats — one grouped pass over each tier's analysis table
+    condition_rows = query_db(*with_archive("""
+        SELECT condition_label, COUNT(*) AS cnt,
+               SUM(is_blurry) AS blurry, SUM(trust_score) AS trust_sum
+        FROM {ai}
+        GROUP BY condition_label
+    """))
 
-    # Stats
-    total = len(analyses)
-    blurry_count = sum(1 for a in analyses if a['is_blurry'])
-    avg_trust = sum(a['trust_score'] for a in analyses) / total if total > 0 else 0
+    total = sum(r['cnt'] for r in condition_rows)
+    blurry_count = int(sum(r['blurry'] or 0 for r in condition_rows))
+    trust_sum = sum(r['trust_sum'] or 0 for r in condition_rows)
+    avg_trust = float(trust_sum) / total if total > 0 else 0
 
     condition_counts = {}
-    for a in analyses:
-        label = a['condition_label'] or 'Unknown'
-        condition_counts[label] = condition_counts.get(label, 0) + 1
+    for r in condition_rows:
+        label = r['condition_label'] or 'Unknown'
+        condition_counts[label] = condition_counts.get(label, 0) + r['cnt']
 
     ai_stats = {
         'total_analyzed': total,
@@ -379,5 +765,184 @@ def ai_analytics():
         'condition_counts': condition_counts,
     }
 
+    # Filtered, sorted page of analyses, archived listings included
+    where, params = _analysis_where(filters)
+    sort_map = {
+        'newest': 'analyzed_at DESC, id DESC',
+        'oldest': 'analyzed_at ASC, id ASC',
+        'trust_high': 'trust_score DESC, id DESC',
+        'trust_low': 'trust_score ASC, id ASC',
+        'blur_high': 'blur_score DESC, id DESC',
+        'blur_low': 'blur_score ASC, id ASC',
+    }
+    columns = ', '.join(f'ai.{col}' for col in ANALYSIS_COLUMNS)
+    query = f"""
+        SELECT {columns}, p.title AS product_title, p.image_filename, p.duplicate_of,
+               u.full_name AS seller_name
+        FROM {{ai}} ai
+        JOIN {{products}} p ON ai.product_id = p.id
+        JOIN users u ON p.seller_id = u.id
+        WHERE {where}
+    """
+    analyses, has_next = _paginate_tiers(query_db, query, params,
+                                         sort_map.get(sort_by, sort_map['newest']), page)
+
     return render_template('admin/ai_analytics.html',
-                           analyses=analyses, ai_stats=ai_stats)
+                           analyses=analyses, ai_stats=ai_stats,
+                           filters=filters, sort_by=sort_by,
+                           page=page, has_next=has_next,
+                           duplicate_clusters=_duplicate_clusters())
+
+
+def _duplicate_clusters():
+    """Largest near-duplicate photo clusters from the last ``dupes.py --cluster`` run.
+
+    Members may be live or archived. Rows of listings deleted since the
+    run are skipped.
+    """
+    exists = ' OR '.join(f'EXISTS ({q})' for q in tier_queries(
+        "SELECT 1 FROM {products} p WHERE p.id = dc.product_id"))
+    clusters = query_db(f"""
+        SELECT dc.cluster_id, COUNT(*) AS size
+        FROM duplicate_clusters dc
+        WHERE {exists}
+        GROUP BY dc.cluster_id
+        HAVING size > 1
+        ORDER BY size DESC, dc.cluster_id
+        LIMIT %s
+    """, (current_app.config['DUPLICATE_CLUSTER_LIMIT'],))
+    if not clusters:
+        return []
+    placeholders = ', '.join(['%s'] * len(clusters))
+    query, params = with_archive(f"""
+        SELECT dc.cluster_id, p.id, p.title, p.image_filename, p.status,
+               p.seller_id, u.full_name AS seller_name
+        FROM duplicate_clusters dc
+        JOIN {{products}} p ON p.id = dc.product_id
+        JOIN users u ON u.id = p.seller_id
+        WHERE dc.cluster_id IN ({placeholders})
+    """, [c['cluster_id'] for c in clusters])
+    members = query_db(query + " ORDER BY id", params)
+    products = {}
+    for m in members:
+        products.setdefault(m['cluster_id'], []).append(m)
+    return [{'cluster_id': c['cluster_id'], 'size': c['size'],
+             'products': products.get(c['cluster_id'], [])} for c in clusters]
+
+
+# ═══════════════════════════════════════════════════════════════════
+#  DATA EXPORT
+# ═══════════════════════════════════════════════════════════════════
+
+EXPORT_FETCH_SIZE = 1000
+
+
+def _json_default(value):
+    """Serialize the Decimal/datetime values pymysql returns."""
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+class _LineBuffer:
+    """Write target for csv.writer that hands back each formatted line."""
+    def __init__(self):
+        self.line = ''
+
+    def write(self, text):
+        self.line = text
+
+
+def _stream_export(query, params, fmt):
+    """Yield CSV or NDJSON lines from an unbuffered server-side cursor."""
+    db = get_db(cursorclass=pymysql.cursors.SSCursor)
+    cur = db.cursor()
+    try:
+        cur.execute(query, params)
+        columns = [col[0] for col in cur.description]
+        buffer = _LineBuffer()
+        writer = csv.writer(buffer)
+        if fmt == 'csv':
+            writer.writerow(columns)
+            yield buffer.line
+        while True:
+            rows = cur.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                if fmt == 'csv':
+                    writer.writerow(row)
+                    yield buffer.line
+                else:
+                    yield json.dumps(dict(zip(columns, row)), default=_json_default) + '\n'
+    finally:
+        cur.close()
+        db.close()
+
+
+def _export_query(dataset, args):
+    """Return (query, params) for an export, using the same filters as its page."""
+    if dataset == 'products':
+        where, params = _product_where(_product_filters(args))
+        query, params = with_archive("""
+            SELECT p.id, p.title, p.price, p.status, p.item_condition,
+                   p.views_count, p.created_at,
+                   p.seller_id, u.full_name AS seller_name, u.email AS seller_email,
+                   c.name AS category_name,
+                   ai.trust_score, ai.condition_label, ai.is_blurry
+            FROM {products} p
+            JOIN users u ON p.seller_id = u.id
+            LEFT JOIN categories c ON p.category_id = c.id
+            LEFT JOIN {ai} ai ON ai.product_id = p.id
+            WHERE 1=1
+        """ + where, params)
+        return query + " ORDER BY id", params
+    if dataset == 'users':
+        where, params = _user_where(_user_filters(args))
+        return """
+            SELECT u.id, u.full_name, u.email, u.phone, u.department, u.role,
+                   u.created_at,
+                   COALESCE(s.listing_count, 0) AS product_count,
+                   COALESCE(s.active_count, 0) AS active_count,
+                   COALESCE(s.sold_count, 0) AS sold_count,
+                   COALESCE(s.total_views, 0) AS total_views,
+                   s.avg_trust
+            FROM users u
+            LEFT JOIN seller_stats s ON s.seller_id = u.id
+            WHERE u.role != 'admin'
+        """ + where + " ORDER BY u.id", params
+    if dataset == 'ai_analyses':
+        where, params = _analysis_where(_analysis_filters(args))
+        query, params = with_archive("""
+            SELECT ai.product_id, p.title AS product_title,
+                   u.full_name AS seller_name,
+                   ai.blur_score, ai.is_blurry, ai.condition_label,
+                   ai.condition_confidence, ai.trust_score,
+                   ai.feedback_text, ai.analyzed_at
+            FROM {ai} ai
+            JOIN {products} p ON ai.product_id = p.id
+            JOIN users u ON p.seller_id = u.id
+            WHERE """ + where, params)
+        return query + " ORDER BY product_id", params
+    return None, None
+
+
+@admin_bp.route('/export/<dataset>')
+@admin_required
+def export_data(dataset):
+    """Stream products, users or AI analyses as CSV (default) or NDJSON."""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        abort(400)
+    query, params = _export_query(dataset, request.args)
+    if query is None:
+        abort(404)
+
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(_stream_export(query, params, fmt)),
+        mimetype=mimetype,
+        headers={'Content-Disposition':
+                 f'attachment; filename={dataset}_{stamp}.{fmt}'}
+    )
@@ -0,0 +1,30 @@
+"""
+AI Loader — Deferred import of ai_module
+ai_module pulls in TensorFlow and OpenCV, which take seconds to import and
+are not fork-safe. Web workers import this module instead; the analysis
+pipeline is loaded on first use, in the worker that needs it. Trust labels
+come from trust_labels, which never needs ai_module.
+"""
+
+import threading
+
+_lock = threading.Lock()
+_funcs = {}
+
+
+def load():
+    """Import ai_module now (e.g. to warm up a worker). Safe to call repeatedly."""
+    if not _funcs:
+        with _lock:
+            if not _funcs:
+                from ai_module import analyze_product_image
+                _funcs['analyze_product_image'] = analyze_product_image
+    return _funcs
+
+
+def is_loaded():
+    return bool(_funcs)
+
+
+def analyze_product_image(image_path, description=''):
+    return load()['analyze_product_image'](image_path, description)
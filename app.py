@@ -4,65 +4,112 @@ A secure, campus-exclusive platform for buying and selling used/unused items.
 Enhanced with AI-based image analysis and trust scoring.
 """
 
+import hashlib
+import json
 import os
+import time
 import uuid
-from datetime import datetime
+from contextlib import ExitStack
+from datetime import timezone
 from functools import wraps
 
 from flask import (
     Flask, render_template, request, redirect, url_for,
-    flash, session, jsonify, abort
+    flash, session, jsonify, abort, make_response, Response, current_app
 )
-from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-import pymysql
-import pymysql.cursors
 
 from config import Config
-from ai_module import analyze_product_image
-from ai_module.trust_scorer import get_trust_label
-
-# ─── App Initialization ─────────────────────────────────────────────
-app = Flask(__name__)
-app.config.from_object(Config)
-
-# Ensure upload directory exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-# Register Admin Blueprint
-from admin_routes import admin_bp
-app.register_blueprint(admin_bp)
-
-
-# ─── Database Helper ─────────────────────────────────────────────────
-def get_db():
-    """Create and return a MySQL database connection."""
-    return pymysql.connect(
-        host=app.config['MYSQL_HOST'],
-        user=app.config['MYSQL_USER'],
-        password=app.config['MYSQL_PASSWORD'],
-        database=app.config['MYSQL_DB'],
-        port=app.config['MYSQL_PORT'],
-        cursorclass=pymysql.cursors.DictCursor,
-        charset='utf8mb4'
-    )
-
-
-def query_db(query, args=(), one=False, commit=False):
-    """Execute a database query and return results."""
-    db = get_db()
-    cur = db.cursor()
-    cur.execute(query, args)
-    if commit:
-        db.commit()
-        last_id = cur.lastrowid
-        cur.close()
-        db.close()
-        return last_id
-    results = cur.fetchone() if one else cur.fetchall()
-    cur.close()
-    db.close()
-    return results
+from archive import archived_product, with_archive
+from ai_loader import analyze_product_image
+from seller_stats import refresh_seller_stats
+from cache import (LRUCache, SharedCache, get_version_info, bump_version, listing_key,
+                   similar_key)
+from conversations import load_chat, load_history, load_inbox, mark_chat_read, record_message
+from db import query_db, transaction
+from dupes import dhash, find_duplicates
+from lookups import get_categories, get_user_card, get_product_view, invalidate_product
+from price_stats import price_suggestion, record_listing, record_sale
+from passwords import PasswordHashBusy, hash_password, needs_rehash, verify_password
+from ratelimit import AnalysisBusy, analysis_slot, retry_later
+from records import make_cards
+from saved_searches import (delete_search, mark_read, notifications_after,
+                            notify_matches, save_search)
+from similar import index_product, set_listed, similar_ids
+from trending import record_event, seed_listing, top_trending
+from trust_labels import get_trust_label
+from view_counter import ViewCounter
+import db
+import db_stats
+import metrics
+import profiling
+import ratelimit
+import similar
+import trending
+from metrics import ai_stage
+
+# ─── Route Registry ─────────────────────────────────────────────────
+# Views are collected here and added by create_app() under their own
+# function names, so endpoints stay 'index', 'login', ... for url_for().
+_routes = []
+_error_handlers = []
+
+
+def route(rule, **options):
+    """Register a view function for every app built by create_app()."""
+    def decorator(f):
+        _routes.append((rule, f, options))
+        return f
+    return decorator
+
+
+def errorhandler(code):
+    """Register an error handler for every app built by create_app()."""
+    def decorator(f):
+        _error_handlers.append((code, f))
+        return f
+    return decorator
+
+
+# ─── Request Helpers ────────────────────────────────────────────────
+def is_anonymous_view():
+    """True when the response cannot depend on the session (no login, no flashes)."""
+    return 'user_id' not in session and '_flashes' not in session
+
+
+# ─── Conditional GET ────────────────────────────────────────────────
+def conditional(etag, last_modified, build):
+    """Answer with 304 when the client's copy is current, else with build().
+
+    ``build`` is only called for a full response, so validators must be
+    computed before any query or template work. The page also depends on
+    who is logged in, so the user id is part of the ETag; pending flash
+    messages disable validation entirely.
+    """
+    if '_flashes' in session:
+        return build()
+
+    etag = f"{etag}-u{session.get('user_id', 0)}"
+    if last_modified is not None:
+        # MySQL TIMESTAMPs arrive naive in the server's local time
+        last_modified = last_modified.astimezone(timezone.utc).replace(microsecond=0)
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        since = request.if_modified_since
+        not_modified = bool(last_modified and since and last_modified <= since)
+
+    response = Response(status=304) if not_modified else make_response(build())
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    if 'user_id' in session:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    return response
 
 
 # ─── Auth Decorator ──────────────────────────────────────────────────
@@ -80,7 +127,7 @@ def login_required(f):
 # ─── File Upload Helper ─────────────────────────────────────────────
 def allowed_file(filename):
     return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
+           filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
 
 def save_upload(file):
@@ -88,7 +135,7 @@ def save_upload(file):
     if file and allowed_file(file.filename):
         ext = file.filename.rsplit('.', 1)[1].lower()
         filename = f"{uuid.uuid4().hex}.{ext}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
         file.save(filepath)
         return filename
     return None
@@ -99,21 +146,28 @@ def save_upload(file):
 # ═══════════════════════════════════════════════════════════════════
 
 # ─── Homepage ────────────────────────────────────────────────────────
-@app.route('/')
-def index():
-    """Homepage — Browse all available products with search and filters."""
-    search = request.args.get('search', '').strip()
-    category_id = request.args.get('category', '', type=str)
-    sort_by = request.args.get('sort', 'newest')
-
+LISTING_SORTS = {
+    'newest': 'p.created_at DESC',
+    'oldest': 'p.created_at ASC',
+    'price_low': 'p.price ASC',
+    'price_high': 'p.price DESC',
+    'trust': 'ai.trust_score DESC',
+    'trending': 't.rank_score DESC',
+}
+
+
+def load_listings(search, category_id, sort_by):
+    """Run the homepage listing query for one filter combination."""
     query = """
-        SELECT p.*, u.full_name AS seller_name, c.name AS category_name,
-               c.icon AS category_icon,
+        SELECT p.id, p.title, p.price, p.image_filename, p.item_condition,
+               p.created_at, u.full_name AS seller_name,
+               c.name AS category_name, c.icon AS category_icon,
                ai.trust_score, ai.condition_label
         FROM products p
         JOIN users u ON p.seller_id = u.id
         LEFT JOIN categories c ON p.category_id = c.id
         LEFT JOIN product_ai_analysis ai ON ai.product_id = p.id
+        LEFT JOIN product_trending t ON t.product_id = p.id
         WHERE p.status = 'available'
     """
     params = []
@@ -126,30 +180,71 @@ def index():
         query += " AND p.category_id = %s"
         params.append(category_id)
 
-    # Sorting
-    sort_map = {
-        'newest': 'p.created_at DESC',
-        'oldest': 'p.created_at ASC',
-        'price_low': 'p.price ASC',
-        'price_high': 'p.price DESC',
-        'trust': 'ai.trust_score DESC',
-    }
-    query += f" ORDER BY {sort_map.get(sort_by, 'p.created_at DESC')}"
+    query += f" ORDER BY {LISTING_SORTS[sort_by]}"
+    return make_cards(query_db(query, params), get_trust_label)
 
-    products = query_db(query, params)
-    categories = query_db("SELECT * FROM categories ORDER BY name")
 
-    return render_template('index.html',
-                           products=products,
-                           categories=categories,
-                           search=search,
-                           selected_category=category_id,
-                           sort_by=sort_by,
-                           get_trust_label=get_trust_label)
+@route('/')
+def index():
+    """Homepage — Browse all available products with search and filters."""
+    search = request.args.get('search', '').strip()
+    category_id = request.args.get('category', '', type=str)
+    sort_by = request.args.get('sort', 'newest')
+    sort_key = sort_by if sort_by in LISTING_SORTS else 'newest'
+
+    # Results are cached per catalog version; any catalog write bumps it
+    version_info = get_version_info(query_db)
+    version = version_info['version']
+    # Trending moves without catalog writes; recompute that sort once per period
+    if sort_key == 'trending':
+        version = f'{version}.t{trending_period()}'
+    cache_key = listing_key(version, search, category_id, sort_key)
+
+    shared_cache = current_app.extensions['shared_cache']
+    listing_cache = current_app.extensions['listing_cache']
+
+    # The trending block is read from its shared cache up front so the page
+    # is keyed on the cards it shows, not on the clock
+    trending = top_trending(query_db, make_cards, get_trust_label).get(
+        int(category_id) if category_id.isdigit() else 0, [])
+    trending_sig = hashlib.sha1(json.dumps(
+        [[card.id, card.title, str(card.price)] for card in trending]).encode()).hexdigest()[:12]
+
+    def render():
+        products = listing_cache.get(cache_key)
+        if products is None:
+            products = shared_cache.get_or_set(
+                cache_key, lambda: load_listings(search, category_id, sort_key)
+            )
+            listing_cache.set(cache_key, products)
+        return render_template('index.html',
+                               products=products,
+                               trending=trending,
+                               categories=get_categories(),
+                               search=search,
+                               selected_category=category_id,
+                               sort_by=sort_by,
+                               get_trust_label=get_trust_label)
+
+    page_params = json.dumps([version, trending_sig, search, category_id, sort_by])
+
+    def build():
+        # Anonymous visitors all get identical HTML, so share the rendered page
+        if is_anonymous_view():
+            return shared_cache.get_or_set('page:index:' + page_params, render)
+        return render()
+
+    etag = 'i' + hashlib.sha1(page_params.encode()).hexdigest()[:20]
+    return conditional(etag, version_info['updated_at'], build)
+
+
+def trending_period():
+    """Number of the current TRENDING_TOP_TTL window; trending data changes between windows."""
+    return int(time.time() // current_app.config['TRENDING_TOP_TTL'])
 
 
 # ─── User Registration ──────────────────────────────────────────────
-@app.route('/register', methods=['GET', 'POST'])
+@route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         full_name = request.form.get('full_name', '').strip()
@@ -180,7 +275,11 @@ def register():
                 flash(error, 'danger')
             return render_template('register.html')
 
-        password_hash = generate_password_hash(password)
+        try:
+            password_hash = hash_password(password)
+        except PasswordHashBusy:
+            flash('Too many sign-ups right now. Please try again in a moment.', 'warning')
+            return render_template('register.html'), 503
         query_db(
             """INSERT INTO users (full_name, email, password_hash, phone, department, role)
                VALUES (%s, %s, %s, %s, %s, %s)""",
@@ -194,7 +293,7 @@ def register():
 
 
 # ─── User Login ──────────────────────────────────────────────────────
-@app.route('/login', methods=['GET', 'POST'])
+@route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email = request.form.get('email', '').strip()
@@ -204,7 +303,20 @@ def login():
             "SELECT * FROM users WHERE email = %s", (email,), one=True
         )
 
-        if user and check_password_hash(user['password_hash'], password):
+        try:
+            valid = bool(user) and verify_password(user['password_hash'], password)
+        except PasswordHashBusy:
+            flash('Too many sign-ins right now. Please try again in a moment.', 'warning')
+            return render_template('login.html'), 503
+
+        if valid:
+            if needs_rehash(user['password_hash']):
+                # Upgrade hashes made with older parameters while we have the password
+                try:
+                    query_db("UPDATE users SET password_hash = %s, updated_at = updated_at "
+                             "WHERE id = %s", (hash_password(password), user['id']), commit=True)
+                except PasswordHashBusy:
+                    pass  # Retried on the next login
             session['user_id'] = user['id']
             session['user_name'] = user['full_name']
             session['user_email'] = user['email']
@@ -221,7 +333,7 @@ def login():
 
 
 # ─── Logout ──────────────────────────────────────────────────────────
-@app.route('/logout')
+@route('/logout')
 def logout():
     session.clear()
     flash('You have been logged out.', 'info')
@@ -229,11 +341,11 @@ def logout():
 
 
 # ─── Add Product (with AI Analysis) ─────────────────────────────────
-@app.route('/add_product', methods=['GET', 'POST'])
+@route('/add_product', methods=['GET', 'POST'])
 @login_required
 def add_product():
     """Upload a new product listing. Triggers AI image analysis."""
-    categories = query_db("SELECT * FROM categories ORDER BY name")
+    categories = get_categories()
 
     if request.method == 'POST':
         title = request.form.get('title', '').strip()
@@ -248,6 +360,8 @@ def add_product():
             errors.append('Product title is required.')
         if price <= 0:
             errors.append('Price must be greater than zero.')
+        if item_condition not in current_app.config['ITEM_CONDITIONS']:
+            errors.append('Please choose a valid item condition.')
         if not file or file.filename == '':
             errors.append('Product image is required.')
         elif file and not allowed_file(file.filename):
@@ -258,223 +372,364 @@ def add_product():
                 flash(error, 'danger')
             return render_template('add_product.html', categories=categories)
 
-        # Save uploaded image
-        filename = save_upload(file)
-        if not filename:
-            flash('Error saving image.', 'danger')
-            return render_template('add_product.html', categories=categories)
-
-        # Insert product into database
-        product_id = query_db(
-            """INSERT INTO products
-               (seller_id, title, description, price, category_id, item_condition, image_filename)
-               VALUES (%s, %s, %s, %s, %s, %s, %s)""",
-            (session['user_id'], title, description, price,
-             category_id, item_condition, filename),
-            commit=True
-        )
+        # Perceptual hash, checked against every listed photo. It needs only
+        # PIL, so it is stored with the listing whatever the analysis does
+        image_hash = None
+        duplicates = []
+        try:
+            with ai_stage('hash'):
+                image_hash = dhash(file.stream)
+                duplicates = find_duplicates(query_db, image_hash,
+                                             current_app.config['DUPLICATE_HASH_RADIUS'])
+        except Exception as e:
+            print(f"[Duplicate Check Error] {e}")
+        file.stream.seek(0)
 
-        # ── AI IMAGE ANALYSIS ──
-        image_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        # Claim an analysis slot before anything is saved, so a busy host turns
+        # the upload away instead of listing it without an analysis
+        slot = ExitStack()
         try:
-            ai_result = analyze_product_image(image_path, description)
-
-            # Store AI results in database
-            query_db(
-                """INSERT INTO product_ai_analysis
-                   (product_id, blur_score, is_blurry, condition_label,
-                    condition_confidence, feedback_text, trust_score)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s)""",
-                (product_id,
-                 ai_result['blur_score'],
-                 ai_result['is_blurry'],
-                 ai_result['condition_label'],
-                 ai_result['condition_confidence'],
-                 ai_result['feedback_text'],
-                 ai_result['trust_score']),
+            slot.enter_context(analysis_slot())
+        except AnalysisBusy as e:
+            flash('Image analysis is busy right now. Please try again in a few seconds.', 'warning')
+            response = make_response(render_template('add_product.html', categories=categories), 503)
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+
+        with slot:
+            # Save uploaded image
+            filename = save_upload(file)
+            if not filename:
+                flash('Error saving image.', 'danger')
+                return render_template('add_product.html', categories=categories)
+
+            # Insert product into database
+            product_id = query_db(
+                """INSERT INTO products
+                   (seller_id, title, description, price, category_id, item_condition,
+                    image_filename, image_hash, duplicate_of)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                (session['user_id'], title, description, price,
+                 category_id, item_condition, filename, image_hash,
+                 duplicates[0][1] if duplicates else None),
                 commit=True
             )
-        except Exception as e:
-            print(f"[AI Analysis Error] {e}")
-            # Product is still saved even if AI fails
 
-        flash('Product listed successfully! AI analysis complete.', 'success')
+            # ── AI IMAGE ANALYSIS ──
+            image_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+            ai_result = None
+            try:
+                with ai_stage('pipeline'):
+                    ai_result = analyze_product_image(image_path, description)
+            except Exception as e:
+                print(f"[AI Analysis Error] {e}")
+                # Product is still saved even if AI fails
+
+        trust_score = None
+        analyzed = False
+        if ai_result:
+            try:
+                # Store AI results in database
+                with ai_stage('store'):
+                    query_db(
+                        """INSERT INTO product_ai_analysis
+                           (product_id, blur_score, is_blurry, condition_label,
+                            condition_confidence, feedback_text, trust_score)
+                           VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+                        (product_id,
+                         ai_result['blur_score'],
+                         ai_result['is_blurry'],
+                         ai_result['condition_label'],
+                         ai_result['condition_confidence'],
+                         ai_result['feedback_text'],
+                         ai_result['trust_score']),
+                        commit=True
+                    )
+                trust_score = ai_result['trust_score']
+                analyzed = True
+            except Exception as e:
+                print(f"[AI Analysis Error] {e}")
+
+        index_product(product_id, image_path)
+        seed_listing(product_id, trust_score)
+        record_listing(transaction, category_id, item_condition, price)
+        notify_matches(query_db, transaction, product_id, session['user_id'],
+                       title, description, category_id)
+        refresh_seller_stats(query_db, session['user_id'])
+        bump_version(query_db)
+        invalidate_product(product_id)
+
+        if analyzed:
+            flash('Product listed successfully! AI analysis complete.', 'success')
+        else:
+            flash('Product listed successfully. AI analysis could not be completed '
+                  'for this photo.', 'warning')
+        if duplicates:
+            flash(f'This photo closely matches {len(duplicates)} existing listing(s). '
+                  'Duplicate listings may be reviewed by an admin.', 'warning')
         return redirect(url_for('product_detail', product_id=product_id))
 
     return render_template('add_product.html', categories=categories)
 
 
 # ─── Product Detail ──────────────────────────────────────────────────
-@app.route('/product/<int:product_id>')
-def product_detail(product_id):
-    """View a single product with AI analysis feedback."""
-    product = query_db(
-        """SELECT p.*, u.full_name AS seller_name, u.email AS seller_email,
-                  u.department AS seller_department, u.phone AS seller_phone,
-                  c.name AS category_name, c.icon AS category_icon
+def load_similar(product_id, version):
+    """Cards for the similar block, shared per catalog version (any listing change bumps it)."""
+    return current_app.extensions['shared_cache'].get_or_set(
+        similar_key(product_id, version), lambda: _similar_cards(product_id))
+
+
+def _similar_cards(product_id):
+    """The index over-fetches so unlisted rows can drop out."""
+    count = current_app.config['SIMILAR_COUNT']
+    ids = similar_ids(product_id, count * 2)
+    if not ids:
+        return []
+    rows = query_db(
+        f"""SELECT p.id, p.title, p.price, p.image_filename, p.item_condition,
+                  ai.trust_score, ai.condition_label
            FROM products p
-           JOIN users u ON p.seller_id = u.id
-           LEFT JOIN categories c ON p.category_id = c.id
-           WHERE p.id = %s""",
-        (product_id,), one=True
+           LEFT JOIN product_ai_analysis ai ON ai.product_id = p.id
+           WHERE p.id IN ({', '.join(['%s'] * len(ids))}) AND p.status = 'available'""",
+        ids
     )
+    rank = {pid: i for i, pid in enumerate(ids)}
+    rows.sort(key=lambda row: rank[row['id']])
+    return make_cards(rows[:count], get_trust_label)
 
-    if not product:
-        abort(404)
 
-    # Increment view count
-    query_db("UPDATE products SET views_count = views_count + 1 WHERE id = %s",
-             (product_id,), commit=True)
+@route('/product/<int:product_id>')
+def product_detail(product_id):
+    """View a single product with AI analysis feedback."""
+    view = get_product_view(product_id)
+    if not view:
+        abort(404)
 
-    # Get AI analysis
-    ai_analysis = query_db(
-        "SELECT * FROM product_ai_analysis WHERE product_id = %s",
-        (product_id,), one=True
-    )
+    # Views are buffered and written in batches
+    current_app.extensions['view_counter'].add(product_id, view.seller_id)
+    record_event(product_id, 'view')
 
-    trust_info = None
-    if ai_analysis:
-        trust_info = get_trust_label(ai_analysis['trust_score'])
+    # The similar block changes with other listings, so the catalog version
+    # is part of the validators
+    version_info = get_version_info(query_db)
+    version = version_info['version']
+    etag = f"{view.etag}-c{version}"
+    last_modified = max(filter(None, (view.last_modified, version_info['updated_at'])),
+                        default=None)
 
-    return render_template('product_detail.html',
-                           product=product,
-                           ai_analysis=ai_analysis,
-                           trust_info=trust_info)
+    return conditional(etag, last_modified, lambda: render_template(
+        'product_detail.html',
+        product=view.product,
+        ai_analysis=view.ai_analysis,
+        trust_info=view.trust_info,
+        similar=load_similar(product_id, version)))
 
 
 # ─── My Listings ─────────────────────────────────────────────────────
-@app.route('/my_listings')
+@route('/my_listings')
 @login_required
 def my_listings():
-    """View current user's product listings."""
-    products = query_db(
-        """SELECT p.*, c.name AS category_name,
+    """View current user's product listings, archived ones included."""
+    query, params = with_archive(
+        """SELECT p.id, p.title, p.price, p.image_filename, p.item_condition,
+                  p.status, p.views_count, p.created_at,
+                  c.name AS category_name,
                   ai.trust_score, ai.condition_label
-           FROM products p
+           FROM {products} p
            LEFT JOIN categories c ON p.category_id = c.id
-           LEFT JOIN product_ai_analysis ai ON ai.product_id = p.id
-           WHERE p.seller_id = %s
-           ORDER BY p.created_at DESC""",
+           LEFT JOIN {ai} ai ON ai.product_id = p.id
+           WHERE p.seller_id = %s""",
         (session['user_id'],)
     )
+    products = make_cards(query_db(query + " ORDER BY created_at DESC", params),
+                          get_trust_label)
     return render_template('my_listings.html',
                            products=products,
                            get_trust_label=get_trust_label)
 
 
 # ─── Mark as Sold ────────────────────────────────────────────────────
-@app.route('/product/<int:product_id>/sold', methods=['POST'])
+@route('/product/<int:product_id>/sold', methods=['POST'])
 @login_required
 def mark_sold(product_id):
-    product = query_db("SELECT * FROM products WHERE id = %s AND seller_id = %s",
-                       (product_id, session['user_id']), one=True)
-    if not product:
-        abort(403)
-    query_db("UPDATE products SET status = 'sold' WHERE id = %s",
-             (product_id,), commit=True)
+    with transaction() as cur:
+        cur.execute("SELECT sold_at FROM products WHERE id = %s AND seller_id = %s FOR UPDATE",
+                    (product_id, session['user_id']))
+        product = cur.fetchone()
+        if not product:
+            abort(403)
+        # A repeated submit changes nothing, and a listing sold again after
+        # a restore keeps its first sale time, so no sale is counted twice
+        cur.execute(
+            """UPDATE products SET status = 'sold', sold_at = COALESCE(sold_at, CURRENT_TIMESTAMP)
+               WHERE id = %s AND status != 'sold'""",
+            (product_id,)
+        )
+        first_sale = cur.rowcount == 1 and product['sold_at'] is None
+    if first_sale:
+        record_sale(transaction, product_id)
+    refresh_seller_stats(query_db, session['user_id'])
+    bump_version(query_db)
+    invalidate_product(product_id)
+    set_listed([product_id], False)
     flash('Product marked as sold!', 'success')
     return redirect(url_for('my_listings'))
 
 
 # ─── Delete Product ──────────────────────────────────────────────────
-@app.route('/product/<int:product_id>/delete', methods=['POST'])
+@route('/product/<int:product_id>/delete', methods=['POST'])
 @login_required
 def delete_product(product_id):
     product = query_db("SELECT * FROM products WHERE id = %s AND seller_id = %s",
                        (product_id, session['user_id']), one=True)
     if not product:
-        abort(403)
+        archived = archived_product(query_db, product_id)
+        if not archived or archived['seller_id'] != session['user_id']:
+            abort(403)
+        delete_archived_product(archived)
+        flash('Product deleted.', 'info')
+        return redirect(url_for('my_listings'))
 
     # Delete image file
     if product['image_filename']:
-        img_path = os.path.join(app.config['UPLOAD_FOLDER'], product['image_filename'])
+        img_path = os.path.join(current_app.config['UPLOAD_FOLDER'], product['image_filename'])
         if os.path.exists(img_path):
             os.remove(img_path)
 
     query_db("DELETE FROM products WHERE id = %s", (product_id,), commit=True)
+    refresh_seller_stats(query_db, session['user_id'])
+    bump_version(query_db)
+    invalidate_product(product_id)
+    set_listed([product_id], False)
     flash('Product deleted.', 'info')
     return redirect(url_for('my_listings'))
 
 
+def delete_archived_product(product):
+    """Delete a listing from the archive tier; it is already unlisted everywhere."""
+    if product['image_filename']:
+        img_path = os.path.join(current_app.config['UPLOAD_FOLDER'], product['image_filename'])
+        if os.path.exists(img_path):
+            os.remove(img_path)
+    query_db("DELETE FROM products_archive WHERE id = %s", (product['id'],), commit=True)
+    refresh_seller_stats(query_db, product['seller_id'])
+    invalidate_product(product['id'])
+
+
+# ─── Saved Searches ──────────────────────────────────────────────────
+@route('/saved_searches', methods=['GET', 'POST'])
+@login_required
+def saved_searches():
+    """Save the current homepage filters, or list saved searches and their matches."""
+    user_id = session['user_id']
+    if request.method == 'POST':
+        search = request.form.get('search', '').strip()[:200]
+        category_id = request.form.get('category', None, type=int)
+        if not search and not category_id:
+            flash('Enter a search or pick a category to save.', 'warning')
+        elif save_search(transaction, user_id, search, category_id,
+                         current_app.config['SAVED_SEARCH_LIMIT']) is None:
+            flash('You have reached the saved search limit. Delete one first.', 'warning')
+        else:
+            flash("Search saved! We'll let you know about new matching listings.", 'success')
+        return redirect(url_for('index', search=search, category=category_id or ''))
+
+    searches = query_db(
+        """SELECT s.*, c.name AS category_name FROM saved_searches s
+           LEFT JOIN categories c ON c.id = s.category_id
+           WHERE s.user_id = %s ORDER BY s.created_at DESC""",
+        (user_id,)
+    )
+    notifications = notifications_after(query_db, user_id, 0,
+                                        current_app.config['NOTIFICATION_PAGE_SIZE'])
+    if notifications:
+        mark_read(query_db, user_id, notifications[0]['id'])
+    return render_template('saved_searches.html',
+                           searches=searches,
+                           notifications=notifications)
+
+
+@route('/saved_searches/<int:search_id>/delete', methods=['POST'])
+@login_required
+def delete_saved_search(search_id):
+    delete_search(query_db, session['user_id'], search_id)
+    flash('Saved search deleted.', 'info')
+    return redirect(url_for('saved_searches'))
+
+
+@route('/api/notifications')
+@login_required
+def api_notifications():
+    """
+    AJAX endpoint: Saved-search matches newer than ?after=<id>.
+    Polls that are already up to date are answered from the shared cache.
+    """
+    user_id = session['user_id']
+    after_id = request.args.get('after', 0, type=int)
+    notifications = notifications_after(query_db, user_id, after_id,
+                                        current_app.config['NOTIFICATION_PAGE_SIZE'])
+    return jsonify({
+        'latest': notifications[0]['id'] if notifications else max(after_id, 0),
+        'notifications': [{
+            'id': n['id'],
+            'product_id': n['product_id'],
+            'title': n['title'],
+            'price': float(n['price']),
+            'image_url': url_for('static', filename='uploads/' + n['image_filename'])
+                         if n['image_filename'] else None,
+            'search': n['query_text'],
+            'is_read': bool(n['is_read']),
+            'url': url_for('product_detail', product_id=n['product_id']),
+        } for n in notifications],
+    })
+
+
 # ─── Messages ────────────────────────────────────────────────────────
-@app.route('/messages')
+@route('/messages')
 @login_required
 def messages():
     """View all conversations for the current user."""
-    conversations = query_db(
-        """SELECT DISTINCT
-               CASE WHEN m.sender_id = %s THEN m.receiver_id ELSE m.sender_id END AS other_user_id,
-               u.full_name AS other_user_name,
-               p.title AS product_title,
-               p.id AS product_id,
-               (SELECT message_text FROM messages
-                WHERE (sender_id = m.sender_id AND receiver_id = m.receiver_id)
-                   OR (sender_id = m.receiver_id AND receiver_id = m.sender_id)
-                ORDER BY created_at DESC LIMIT 1) AS last_message,
-               (SELECT created_at FROM messages
-                WHERE (sender_id = m.sender_id AND receiver_id = m.receiver_id)
-                   OR (sender_id = m.receiver_id AND receiver_id = m.sender_id)
-                ORDER BY created_at DESC LIMIT 1) AS last_time
-           FROM messages m
-           JOIN users u ON u.id = CASE WHEN m.sender_id = %s THEN m.receiver_id ELSE m.sender_id END
-           LEFT JOIN products p ON p.id = m.product_id
-           WHERE m.sender_id = %s OR m.receiver_id = %s
-           GROUP BY other_user_id, u.full_name, p.title, p.id
-           ORDER BY last_time DESC""",
-        (session['user_id'], session['user_id'],
-         session['user_id'], session['user_id'])
-    )
-    return render_template('messages.html', conversations=conversations)
+    return render_template('messages.html',
+                           conversations=load_inbox(query_db, session['user_id']))
 
 
-@app.route('/messages/<int:other_user_id>', methods=['GET', 'POST'])
+@route('/messages/<int:other_user_id>', methods=['GET', 'POST'])
 @login_required
 def chat(other_user_id):
-    """Chat with another user."""
+    """Chat with another user. Compacted history loads with ?history=1."""
     product_id = request.args.get('product_id', None, type=int)
 
     if request.method == 'POST':
         message_text = request.form.get('message', '').strip()
         prod_id = request.form.get('product_id', None, type=int)
         if message_text:
-            query_db(
-                """INSERT INTO messages (sender_id, receiver_id, product_id, message_text)
-                   VALUES (%s, %s, %s, %s)""",
-                (session['user_id'], other_user_id, prod_id, message_text),
-                commit=True
-            )
+            started = record_message(transaction, session['user_id'], other_user_id,
+                                     prod_id, message_text)
+            if started and prod_id:
+                record_event(prod_id, 'chat')
 
-    # Fetch all messages
-    chat_messages = query_db(
-        """SELECT m.*, u.full_name AS sender_name
-           FROM messages m
-           JOIN users u ON m.sender_id = u.id
-           WHERE ((m.sender_id = %s AND m.receiver_id = %s)
-               OR (m.sender_id = %s AND m.receiver_id = %s))
-           ORDER BY m.created_at ASC""",
-        (session['user_id'], other_user_id,
-         other_user_id, session['user_id'])
-    )
+    chat_messages, has_history = load_chat(query_db, session['user_id'], other_user_id)
+    mark_chat_read(transaction, session['user_id'], other_user_id)
 
-    # Mark as read
-    query_db(
-        """UPDATE messages SET is_read = TRUE
-           WHERE sender_id = %s AND receiver_id = %s AND is_read = FALSE""",
-        (other_user_id, session['user_id']),
-        commit=True
-    )
+    other_user = get_user_card(other_user_id)
 
-    other_user = query_db("SELECT * FROM users WHERE id = %s",
-                          (other_user_id,), one=True)
+    earlier = []
+    if has_history and request.args.get('history') == '1':
+        names = {session['user_id']: session['user_name'],
+                 other_user_id: other_user['full_name'] if other_user else ''}
+        earlier = load_history(query_db, session['user_id'], other_user_id)
+        for message in earlier:
+            message['sender_name'] = names.get(message['sender_id'], '')
 
     return render_template('chat.html',
-                           messages=chat_messages,
+                           messages=earlier + chat_messages,
+                           has_history=has_history and not earlier,
                            other_user=other_user,
                            product_id=product_id)
 
 
 # ─── AI Analysis API (AJAX Endpoint) ────────────────────────────────
-@app.route('/api/analyze_image', methods=['POST'])
+@route('/api/analyze_image', methods=['POST'])
 @login_required
 def api_analyze_image():
     """
@@ -490,37 +745,126 @@ def api_analyze_image():
     if not allowed_file(file.filename):
         return jsonify({'error': 'Invalid file format'}), 400
 
-    # Save temporarily
-    filename = save_upload(file)
-    image_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-
+    # Claim a slot before saving, so a busy host leaves no file behind
+    slot = ExitStack()
     try:
-        result = analyze_product_image(image_path, description)
-        trust_info = get_trust_label(result['trust_score'])
-        result['trust_label'] = trust_info['label']
-        result['trust_color'] = trust_info['color']
-        result['trust_icon'] = trust_info['icon']
-        result['temp_filename'] = filename
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        slot.enter_context(analysis_slot())
+    except AnalysisBusy as e:
+        return retry_later('Image analysis is busy. Please try again shortly.',
+                           e.retry_after, 503)
+
+    with slot:
+        # Save temporarily
+        filename = save_upload(file)
+        image_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+        try:
+            with ai_stage('pipeline'):
+                result = analyze_product_image(image_path, description)
+            trust_info = get_trust_label(result['trust_score'])
+        except Exception as e:
+            if os.path.exists(image_path):
+                os.remove(image_path)
+            return jsonify({'error': str(e)}), 500
+
+    result['trust_label'] = trust_info['label']
+    result['trust_color'] = trust_info['color']
+    result['trust_icon'] = trust_info['icon']
+    result['temp_filename'] = filename
+    return jsonify(result)
+
+
+@route('/api/price_suggestion')
+@login_required
+def api_price_suggestion():
+    """
+    AJAX endpoint: Suggested price range for a category and condition.
+    Used by the product upload form; reads precomputed digests only.
+    """
+    category_id = request.args.get('category_id', 0, type=int)
+    condition = request.args.get('condition', '*')
+    config = current_app.config
+    # Each distinct value would otherwise get its own query and cache entry
+    if condition != '*' and condition not in config['ITEM_CONDITIONS']:
+        return jsonify({'error': 'Unknown condition'}), 400
+    suggestion = current_app.extensions['shared_cache'].get_or_set(
+        f'price:{category_id}:{condition}',
+        lambda: price_suggestion(query_db, category_id, condition, config['PRICE_MIN_SAMPLES']),
+        ttl=config['PRICE_SUGGESTION_TTL']
+    )
+    if suggestion is None:
+        return jsonify({'error': 'Not enough listings to suggest a price'}), 404
+    return jsonify(suggestion)
 
 
 # ─── Error Handlers ─────────────────────────────────────────────────
-@app.errorhandler(404)
+@errorhandler(404)
 def page_not_found(e):
     return render_template('base.html',
                            error_code=404,
                            error_message='Page not found'), 404
 
 
-@app.errorhandler(403)
+@errorhandler(403)
 def forbidden(e):
     return render_template('base.html',
                            error_code=403,
                            error_message='Access denied'), 403
 
 
+# ═══════════════════════════════════════════════════════════════════
+#  APP FACTORY
+# ═══════════════════════════════════════════════════════════════════
+
+def create_app(config=Config):
+    """Build the app. Cheap: ai_module is not imported until first used.
+
+    Under gunicorn with preload_app this runs once in the master and the
+    workers inherit the result. Nothing built here holds a connection:
+    MySQL connections are opened per call, the shared cache reconnects per
+    process and the view counter starts its flush thread per process.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config)
+
+    # Ensure upload directory exists
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    db.init_app(app)
+
+    # Host-wide cache shared by all workers (SQLite file in WAL mode)
+    app.extensions['shared_cache'] = SharedCache(app.config['SHARED_CACHE_PATH'],
+                                                 default_ttl=app.config['SHARED_CACHE_TTL'])
+    # Per-worker front for version-keyed listing results (entries never go stale)
+    app.extensions['listing_cache'] = LRUCache(app.config['LISTING_CACHE_SIZE'], name='listing')
+    # Buffered product view counts, flushed in the background
+    app.extensions['view_counter'] = ViewCounter(transaction,
+                                                 interval=app.config['VIEW_FLUSH_INTERVAL'])
+
+    # Per-request DB statistics (Server-Timing header, slow/N+1 query logs)
+    db_stats.init_app(app)
+    # Prometheus request/DB/AI/cache metrics, served at /metrics
+    metrics.init_app(app)
+    # On-demand sampling profiler, results under /admin/profiles
+    profiling.init_app(app)
+    # Token buckets for expensive POSTs and the host-wide analysis cap
+    ratelimit.init_app(app)
+    # Memory-mapped image embeddings behind the product page's similar block
+    similar.init_app(app)
+    # Decayed engagement scores behind the trending sort and block
+    trending.init_app(app, transaction)
+
+    for rule, view, options in _routes:
+        app.add_url_rule(rule, view_func=view, **options)
+    for code, handler in _error_handlers:
+        app.register_error_handler(code, handler)
+
+    # Register Admin Blueprint
+    from admin_routes import admin_bp
+    app.register_blueprint(admin_bp)
+
+    return app
+
+
 # ─── Run ─────────────────────────────────────────────────────────────
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,182 @@
+"""
+Archive — Hot/cold lifecycle for old listings
+Listings that have been sold or removed for ARCHIVE_AFTER_DAYS move out
+of products into products_archive. Their analyses move to
+product_ai_analysis_archive and their photos to the ARCHIVE_SUBDIR of
+the upload folder, which can be a mount on cheaper storage. Product ids
+are kept, so links, messages and the similar index still refer to the
+same listing, and the live tables and their indexes only hold listings
+that are still read.
+
+Pages that show a seller's full history (my listings, admin tables,
+exports, seller statistics) use ``with_archive`` to read both tiers.
+
+The archiver moves ARCHIVE_BATCH_SIZE listings per transaction and
+sleeps ARCHIVE_PAUSE seconds between batches, so live traffic keeps
+its locks and I/O:
+
+    python archive.py --run [--max-batches N]
+"""
+
+import argparse
+import os
+import shutil
+import time
+
+PRODUCT_COLUMNS = ('id', 'seller_id', 'title', 'description', 'price', 'category_id',
+                   'item_condition', 'status', 'image_filename', 'views_count',
+                   'image_hash', 'duplicate_of', 'created_at', 'sold_at', 'updated_at')
+ANALYSIS_COLUMNS = ('id', 'product_id', 'blur_score', 'is_blurry', 'condition_label',
+                    'condition_confidence', 'feedback_text', 'trust_score', 'analyzed_at')
+
+_HOT = {'{products}': 'products', '{ai}': 'product_ai_analysis'}
+_COLD = {'{products}': 'products_archive', '{ai}': 'product_ai_analysis_archive'}
+
+
+def _tables(query, tables):
+    for placeholder, table in tables.items():
+        query = query.replace(placeholder, table)
+    return query
+
+
+def tier_queries(query):
+    """``query`` for the live tier, then for the archive tier."""
+    return [_tables(query, _HOT), _tables(query, _COLD)]
+
+
+def with_archive(query, params=(), order_by=None, limit=None):
+    """Run ``query`` over live and archived listings as one UNION ALL.
+
+    ``query`` names its tables ``{products}`` and ``{ai}``; each branch
+    keeps its own WHERE so both use their indexes. ORDER BY and LIMIT
+    appended by the caller apply to the union and must use output
+    column names. Given ``order_by`` and ``limit``, each branch is also
+    sorted and cut to ``limit`` rows, so a paged union never sorts
+    either tier in full. Returns (query, params).
+    """
+    hot, cold = tier_queries(query)
+    params = list(params)
+    if order_by:
+        hot, cold = (f"{branch} ORDER BY {order_by} LIMIT %s" for branch in (hot, cold))
+        params.append(limit)
+    return f"({hot}) UNION ALL ({cold})", params * 2
+
+
+def archived_product(query_db, product_id):
+    """An archived listing's row, or None."""
+    return query_db("SELECT * FROM products_archive WHERE id = %s", (product_id,), one=True)
+
+
+# ─── Archiver ────────────────────────────────────────────────────────
+def _copy_images(upload_folder, subdir, filenames):
+    """Copy photos into the archive subdirectory. Returns the names copied."""
+    os.makedirs(os.path.join(upload_folder, subdir), exist_ok=True)
+    copied = []
+    for name in filenames:
+        try:
+            shutil.copy2(os.path.join(upload_folder, name),
+                         os.path.join(upload_folder, subdir, name))
+        except FileNotFoundError:
+            continue
+        copied.append(name)
+    return copied
+
+
+def _remove_images(folder, filenames):
+    for name in filenames:
+        try:
+            os.remove(os.path.join(folder, name))
+        except FileNotFoundError:
+            pass
+
+
+def archive_batch(transaction, upload_folder, subdir, after_days, batch_size):
+    """Move one batch of old sold/removed listings to the archive tier.
+
+    Photos are copied to cold storage inside the transaction, and the hot
+    copies are deleted only once it has committed. Until then the live
+    rows keep pointing at files that still exist.
+
+    Returns [(product_id, seller_id)] of the listings moved.
+    """
+    copied = []
+    try:
+        with transaction() as cur:
+            cur.execute(
+                """SELECT id, seller_id, image_filename FROM products
+                   WHERE status IN ('sold', 'removed')
+                     AND updated_at < NOW() - INTERVAL %s DAY
+                   ORDER BY id LIMIT %s
+                   FOR UPDATE SKIP LOCKED""",
+                (after_days, batch_size)
+            )
+            rows = cur.fetchall()
+            if not rows:
+                return []
+            ids = [r['id'] for r in rows]
+            placeholders = ', '.join(['%s'] * len(ids))
+            copied = _copy_images(upload_folder, subdir,
+                                  [r['image_filename'] for r in rows if r['image_filename']])
+
+            columns = ', '.join(PRODUCT_COLUMNS)
+            selected = columns.replace('image_filename',
+                                       "CONCAT(%s, '/', image_filename)")
+            cur.execute(
+                f"""INSERT INTO products_archive ({columns})
+                    SELECT {selected} FROM products WHERE id IN ({placeholders})""",
+                [subdir] + ids
+            )
+            columns = ', '.join(ANALYSIS_COLUMNS)
+            cur.execute(
+                f"""INSERT INTO product_ai_analysis_archive ({columns})
+                    SELECT {columns} FROM product_ai_analysis
+                    WHERE product_id IN ({placeholders})""",
+                ids
+            )
+            # Cascades clear analyses, trending rows and notifications
+            cur.execute(f"DELETE FROM products WHERE id IN ({placeholders})", ids)
+    except Exception:
+        # Rolled back: the rows still use the hot photos, so drop the copies
+        _remove_images(os.path.join(upload_folder, subdir), copied)
+        raise
+    _remove_images(upload_folder, copied)
+    return [(r['id'], r['seller_id']) for r in rows]
+
+
+def run_archiver(transaction, config, max_batches=None, on_batch=None):
+    """Archive batches until none are left (or ``max_batches``). Returns the listing count."""
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(transaction, config.UPLOAD_FOLDER, config.ARCHIVE_SUBDIR,
+                              config.ARCHIVE_AFTER_DAYS, config.ARCHIVE_BATCH_SIZE)
+        if not moved:
+            break
+        total += len(moved)
+        batches += 1
+        if on_batch:
+            on_batch(moved)
+        time.sleep(config.ARCHIVE_PAUSE)
+    return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Move old sold/removed listings to the archive.')
+    parser.add_argument('--run', action='store_true', required=True)
+    parser.add_argument('--max-batches', type=int, default=None)
+    args = parser.parse_args()
+
+    from cache import SharedCache, product_key
+    from config import Config
+    from db import transaction
+
+    cache = SharedCache(Config.SHARED_CACHE_PATH)
+
+    def forget(moved):
+        # Product pages fall back to the archive; drop their cached live rows
+        for product_id, _ in moved:
+            cache.delete(product_key(product_id))
+        print(f"   archived {len(moved)} listings (up to #{moved[-1][0]})")
+
+    count = run_archiver(transaction, Config, args.max_batches, on_batch=forget)
+    print(f"✅ {count} listings archived")
@@ -0,0 +1,273 @@
+"""
+Caching — Versioned listing cache and a cross-worker shared store
+Listing results are keyed by their normalized filters plus the catalog
+version stored in cache_versions. Any catalog write bumps the version, so
+entries from before the write can never be served again; they simply age
+out of the LRU.
+
+SharedCache is a SQLite file in WAL mode that every worker on the host
+opens, so one worker's computed value serves all of them. It supports
+TTLs, explicit invalidation and single-flight recomputation.
+"""
+
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import record_cache
+
+CATALOG = 'catalog'
+
+
+class LRUCache:
+    """Thread-safe, size-bounded cache with least-recently-used eviction."""
+
+    def __init__(self, maxsize=256, name='lru'):
+        self.maxsize = maxsize
+        self.name = name
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                record_cache(self.name, False)
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            record_cache(self.name, True)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Return size and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+# ─── Shared Cache ───────────────────────────────────────────────────
+_MISSING = object()
+
+
+class SharedCache:
+    """Host-wide cache backed by a SQLite file in WAL mode.
+
+    Safe across threads and forked workers: each (process, thread) pair
+    opens its own connection lazily.
+    """
+
+    STRIPES = 64            # In-process locks for single-flight
+    PURGE_EVERY = 200       # Sets between expired-row sweeps
+
+    def __init__(self, path, default_ttl=300, max_entries=10000, lock_timeout=10.0,
+                 name='shared'):
+        self.path = path
+        self.name = name
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.lock_timeout = lock_timeout
+        self._local = threading.local()
+        self._stripes = [threading.Lock() for _ in range(self.STRIPES)]
+        self._sets = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.lock_timeout,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+                                key TEXT PRIMARY KEY,
+                                value BLOB NOT NULL,
+                                expires_at REAL NOT NULL)""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS flights (
+                                key TEXT PRIMARY KEY,
+                                expires_at REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_expiry ON entries(expires_at)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _lookup(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM entries WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        return _MISSING if row is None else pickle.loads(row[0])
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        if value is _MISSING:
+            self.misses += 1
+            record_cache(self.name, False)
+            return default
+        self.hits += 1
+        record_cache(self.name, True)
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (ttl or self.default_ttl)
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires_at)
+        )
+        self._sets += 1
+        if self._sets % self.PURGE_EVERY == 0:
+            self._purge(conn)
+
+    def set_max(self, key, value, ttl=None):
+        """Store ``value`` unless a larger one is cached. Returns the value kept.
+
+        Read and write share one write transaction, so a slow writer holding
+        an older value cannot overwrite a newer one.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = self._lookup(key)
+            if current is _MISSING or current < value:
+                self.set(key, value, ttl)
+            else:
+                value = current
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix):
+        """Invalidate every key starting with ``prefix``."""
+        self._conn().execute(
+            "DELETE FROM entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+        )
+
+    def get_or_set(self, key, compute, ttl=None):
+        """Return the cached value, computing it at most once across all workers."""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self._stripes[hash(key) % self.STRIPES]:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                return value
+            if self._acquire_flight(key):
+                try:
+                    value = compute()
+                    self.set(key, value, ttl)
+                    return value
+                finally:
+                    self._conn().execute("DELETE FROM flights WHERE key = ?", (key,))
+            # Another worker is computing it; wait for its result
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.02)
+                value = self._lookup(key)
+                if value is not _MISSING:
+                    return value
+            value = compute()
+            self.set(key, value, ttl)
+            return value
+
+    def _acquire_flight(self, key):
+        """Claim the right to compute ``key``; stale claims are taken over."""
+        now = time.time()
+        cur = self._conn().execute(
+            """INSERT INTO flights (key, expires_at) VALUES (?, ?)
+               ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at
+               WHERE flights.expires_at < ?""",
+            (key, now + self.lock_timeout, now)
+        )
+        return cur.rowcount == 1
+
+    def _purge(self, conn):
+        """Drop expired rows, then the soonest-expiring ones beyond max_entries."""
+        conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            """DELETE FROM entries WHERE key IN (
+                   SELECT key FROM entries ORDER BY expires_at DESC
+                   LIMIT -1 OFFSET ?)""",
+            (self.max_entries,)
+        )
+
+    def stats(self):
+        """Return this worker's hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            'path': self.path,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+# ─── Catalog Version ────────────────────────────────────────────────
+def get_version_info(query_db, name=CATALOG):
+    """Current version and the time it was last bumped."""
+    row = query_db("SELECT version, updated_at FROM cache_versions WHERE name = %s",
+                   (name,), one=True)
+    return row or {'version': 0, 'updated_at': None}
+
+
+def bump_version(query_db, name=CATALOG):
+    """Invalidate every cache entry built from the named data set."""
+    query_db(
+        """INSERT INTO cache_versions (name, version) VALUES (%s, 1)
+           ON DUPLICATE KEY UPDATE version = version + 1""",
+        (name,), commit=True
+    )
+
+
+def product_key(product_id):
+    """Shared-cache key of a product's detail view."""
+    return f'product:{product_id}'
+
+
+def similar_key(product_id, version):
+    """Shared-cache key of a product's similar block at a catalog version."""
+    return f'similar:{product_id}:{version}'
+
+
+def listing_key(version, search, category_id, sort_by):
+    """Normalize listing filters into a cache key.
+
+    Search is case-folded because LIKE under the utf8mb4 collations is
+    case-insensitive, so both spellings return the same rows.
+    """
+    return 'listing:' + json.dumps([version, search.lower(), str(category_id or ''), sort_by])
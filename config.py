@@ -15,6 +15,92 @@ class Config:
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB max upload
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+    ITEM_CONDITIONS = ('New', 'Like New', 'Used', 'Heavily Used')   # products.item_condition ENUM
+
+    # Caching
+    LISTING_CACHE_SIZE = 512      # Max cached listing result sets per worker
+    SHARED_CACHE_PATH = os.environ.get(
+        'SHARED_CACHE_PATH',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'shared_cache.sqlite3'))
+    SHARED_CACHE_TTL = 300        # Seconds, default for shared entries
+    CATEGORIES_TTL = 3600         # Seconds; category edits invalidate explicitly
+    VIEW_FLUSH_INTERVAL = 5.0     # Seconds between batched view-count writes
+
+    # DB Instrumentation
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))   # Log + EXPLAIN above this
+    N_PLUS_ONE_THRESHOLD = 10     # Warn when one statement shape repeats more often per request
+    DB_STATS_LOG = os.environ.get('DB_STATS_LOG', '1') == '1'    # One JSON line per request
+
+    # Request Profiling (admins: X-Profile: 1 header or ?_profile=1)
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))   # Share of all requests
+    PROFILE_INTERVAL_MS = 5       # Stack sampling interval
+    PROFILE_DIR = os.environ.get(
+        'PROFILE_DIR',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'profiles'))
+    PROFILE_KEEP = 200            # Newest profiles kept on disk
+
+    # Password Hashing (pick a method with: python passwords.py --target-ms 50)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))   # Per process
+    PASSWORD_HASH_QUEUE = 16      # Callers allowed to wait for a worker
+    PASSWORD_HASH_TIMEOUT = 5.0   # Seconds to wait before refusing
+
+    # Rate Limits: endpoint -> scope -> (burst, seconds to refill it), POST only
+    RATE_LIMIT_PATH = os.environ.get(
+        'RATE_LIMIT_PATH',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'ratelimit.sqlite3'))
+    RATE_LIMITS = {
+        'api_analyze_image': {'user': (10, 60), 'ip': (30, 60)},
+        'add_product': {'user': (10, 3600), 'ip': (30, 3600)},
+        'chat': {'user': (30, 60), 'ip': (60, 60)},
+        'login': {'user': (5, 300), 'ip': (20, 60)},    # 'user' = email tried from this IP
+    }
+    # Comma-separated client addresses that skip RATE_LIMITS (e.g. 127.0.0.1 for loadtest.py)
+    RATE_LIMIT_EXEMPT = frozenset(
+        ip.strip() for ip in os.environ.get('RATE_LIMIT_EXEMPT', '').split(',') if ip.strip())
+    ANALYSIS_CONCURRENCY = int(os.environ.get('ANALYSIS_CONCURRENCY', 4))   # Host-wide
+    ANALYSIS_SLOT_WAIT = 0.5      # Seconds to wait for a free analysis slot before refusing
+    ANALYSIS_LEASE_TTL = 120      # Seconds before a crashed worker's slot is reclaimed
+
+    # Duplicate Photos
+    DUPLICATE_HASH_RADIUS = 6     # Max differing dHash bits (of 64) for a near-duplicate
+    DUPLICATE_CLUSTER_LIMIT = 20  # Largest clusters shown on the AI analytics page
+
+    # Similar Items
+    SIMILAR_INDEX_DIR = os.environ.get(
+        'SIMILAR_INDEX_DIR',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'similar'))
+    SIMILAR_COUNT = 6             # Cards in the product page's similar block
+
+    # Price Suggestions
+    PRICE_MIN_SAMPLES = 10        # Fewer values than this and a digest is not trusted
+    PRICE_SUGGESTION_TTL = 300    # Seconds a suggestion stays in the shared cache
+
+    # Saved Searches
+    SAVED_SEARCH_LIMIT = 20       # Saved searches per user
+    NOTIFICATION_PAGE_SIZE = 50   # Newest notifications returned per poll
+
+    # Trending
+    TRENDING_HALF_LIFE_HOURS = 48  # An event counts half as much after this long
+    TRENDING_WEIGHTS = {'listed': 2.0, 'view': 1.0, 'chat': 10.0}
+    TRENDING_FLUSH_INTERVAL = 10.0  # Seconds between flushes of buffered events
+    TRENDING_TOP_K = 8            # Cards in the homepage's trending block
+    TRENDING_TOP_TTL = 60         # Seconds between recomputations of the top-K block
+
+    # Archive (cold tier for old sold/removed listings)
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 180))
+    ARCHIVE_SUBDIR = 'archive'    # Under UPLOAD_FOLDER; may be a mount on cold storage
+    ARCHIVE_BATCH_SIZE = 500      # Listings moved per transaction
+    ARCHIVE_PAUSE = 0.5           # Seconds between batches
+
+    # Message Retention
+    MESSAGE_RETENTION_MONTHS = 6  # Closed conversations older than this are compacted
+    MESSAGE_PARTITIONS_AHEAD = 3  # Monthly partitions created in advance
+    MESSAGE_COMPACT_BATCH = 200   # Conversations compacted per transaction
+    MESSAGE_COMPACT_PAUSE = 0.5   # Seconds between compaction batches
+
+    # Admin Listings
+    ADMIN_PAGE_SIZE = 50          # Rows per page in admin tables
 
     # AI Thresholds
     BLUR_THRESHOLD = 100.0        # Laplacian variance below this = blurry
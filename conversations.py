@@ -0,0 +1,380 @@
+"""
+Conversations — Partitioned message storage and retention compaction
+messages is range-partitioned by month on created_at. The conversations
+table keeps one summary row per (user pair, product): who, when it
+started, the last message and unread counts per side. The inbox reads
+only those rows. Chat queries carry a ``created_at >= live_since`` bound,
+so MySQL prunes them to the months a conversation actually spans.
+
+Conversations about a listing that was sold or removed more than
+MESSAGE_RETENTION_MONTHS ago are compacted: their messages become one
+zlib-compressed JSON blob in message_archives and leave the partitioned
+table. Blobs are read only when someone opens the older history of a
+chat. Partitions that compaction has emptied are dropped.
+
+Run from cron (creates the coming months' partitions, compacts, drops):
+
+    python conversations.py --maintain
+
+After a bulk load, or to rebuild the summaries from messages:
+
+    python conversations.py --rebuild
+"""
+
+import argparse
+import json
+import time
+import zlib
+from datetime import date, datetime
+
+
+def _pair(a, b):
+    return min(a, b), max(a, b)
+
+
+# ─── Writing ─────────────────────────────────────────────────────────
+def record_message(transaction, sender_id, receiver_id, product_id, text):
+    """Store a message and update its conversation. Returns True if it started one."""
+    low, high = _pair(sender_id, receiver_id)
+    with transaction() as cur:
+        cur.execute(
+            """INSERT INTO messages (sender_id, receiver_id, product_id, message_text)
+               VALUES (%s, %s, %s, %s)""",
+            (sender_id, receiver_id, product_id, text)
+        )
+        cur.execute(
+            """INSERT INTO conversations
+                   (user_low, user_high, product_id, started_at, live_since, last_message_at,
+                    last_message, last_sender_id, message_count, unread_low, unread_high)
+               VALUES (%s, %s, %s, NOW(), NOW(), NOW(), LEFT(%s, 255), %s, 1, %s, %s)
+               ON DUPLICATE KEY UPDATE
+                   live_since = COALESCE(live_since, VALUES(live_since)),
+                   last_message_at = VALUES(last_message_at),
+                   last_message = VALUES(last_message),
+                   last_sender_id = VALUES(last_sender_id),
+                   message_count = message_count + 1,
+                   unread_low = unread_low + VALUES(unread_low),
+                   unread_high = unread_high + VALUES(unread_high)""",
+            (low, high, product_id or 0, text, sender_id,
+             int(receiver_id == low), int(receiver_id == high))
+        )
+        # MySQL reports 1 for an insert and 2 for an update
+        return cur.rowcount == 1
+
+
+# ─── Reading ─────────────────────────────────────────────────────────
+def load_inbox(query_db, user_id):
+    """The user's conversations, newest first, from the summary rows only."""
+    branch = """
+        SELECT c.id, c.{other} AS other_user_id, c.product_id,
+               c.last_message, c.last_message_at AS last_time, c.unread_{side} AS unread
+        FROM conversations c WHERE c.user_{side} = %s
+    """
+    return query_db(
+        f"""SELECT c.other_user_id, u.full_name AS other_user_name,
+                   COALESCE(p.title, pa.title) AS product_title,
+                   COALESCE(p.id, pa.id) AS product_id,
+                   c.last_message, c.last_time, c.unread
+            FROM ({branch.format(other='user_high', side='low')}
+                  UNION ALL
+                  {branch.format(other='user_low', side='high')}) c
+            JOIN users u ON u.id = c.other_user_id
+            LEFT JOIN products p ON p.id = c.product_id
+            LEFT JOIN products_archive pa ON pa.id = c.product_id
+            ORDER BY c.last_time DESC""",
+        (user_id, user_id)
+    )
+
+
+def _pair_state(query_db, user_id, other_id):
+    """(earliest live message time or None, whether any history is compacted)."""
+    low, high = _pair(user_id, other_id)
+    return query_db(
+        """SELECT MIN(live_since) AS since, COALESCE(MAX(archived), FALSE) AS archived
+           FROM conversations WHERE user_low = %s AND user_high = %s""",
+        (low, high), one=True
+    )
+
+
+def load_chat(query_db, user_id, other_id):
+    """Live messages between two users, oldest first, plus whether older history exists."""
+    state = _pair_state(query_db, user_id, other_id)
+    if state['since'] is None:
+        return [], bool(state['archived'])
+    rows = query_db(
+        """SELECT m.*, u.full_name AS sender_name
+           FROM messages m
+           JOIN users u ON m.sender_id = u.id
+           WHERE ((m.sender_id = %s AND m.receiver_id = %s)
+               OR (m.sender_id = %s AND m.receiver_id = %s))
+             AND m.created_at >= %s
+           ORDER BY m.created_at ASC""",
+        (user_id, other_id, other_id, user_id, state['since'])
+    )
+    return rows, bool(state['archived'])
+
+
+def mark_chat_read(transaction, user_id, other_id):
+    """Mark the other user's messages to ``user_id`` as read."""
+    low, high = _pair(user_id, other_id)
+    side = 'low' if user_id == low else 'high'
+    with transaction() as cur:
+        cur.execute(
+            f"""SELECT MIN(live_since) AS since, SUM(unread_{side}) AS unread
+                FROM conversations WHERE user_low = %s AND user_high = %s""",
+            (low, high)
+        )
+        state = cur.fetchone()
+        if not state['unread']:
+            return
+        cur.execute(
+            """UPDATE messages SET is_read = TRUE
+               WHERE sender_id = %s AND receiver_id = %s AND is_read = FALSE
+                 AND created_at >= %s""",
+            (other_id, user_id, state['since'])
+        )
+        cur.execute(
+            f"""UPDATE conversations SET unread_{side} = 0
+                WHERE user_low = %s AND user_high = %s""",
+            (low, high)
+        )
+
+
+def load_history(query_db, user_id, other_id):
+    """Compacted messages between two users, oldest first (decompressed on demand)."""
+    low, high = _pair(user_id, other_id)
+    blobs = query_db(
+        """SELECT a.payload FROM message_archives a
+           JOIN conversations c ON c.id = a.conversation_id
+           WHERE c.user_low = %s AND c.user_high = %s""",
+        (low, high)
+    )
+    rows = [row for blob in blobs for row in _unpack(blob['payload'])]
+    rows.sort(key=lambda m: (m['created_at'], m['id']))
+    return rows
+
+
+# ─── Compaction ──────────────────────────────────────────────────────
+_ARCHIVED_FIELDS = ('id', 'sender_id', 'receiver_id', 'product_id', 'message_text',
+                    'is_read', 'created_at')
+
+
+def _pack(rows):
+    return zlib.compress(json.dumps(
+        [[row[f] if f != 'created_at' else row[f].isoformat() for f in _ARCHIVED_FIELDS]
+         for row in rows], separators=(',', ':')).encode(), 9)
+
+
+def _unpack(payload):
+    rows = []
+    for values in json.loads(zlib.decompress(payload)):
+        row = dict(zip(_ARCHIVED_FIELDS, values))
+        row['created_at'] = datetime.fromisoformat(row['created_at'])
+        rows.append(row)
+    return rows
+
+
+def compact_batch(transaction, months, batch_size):
+    """Compact one batch of closed conversations.
+
+    Returns (conversations compacted, messages moved out of the live table).
+    """
+    moved = 0
+    with transaction() as cur:
+        # Closed = listing sold/removed (live or archived) or deleted before the cutoff
+        cur.execute(
+            """SELECT c.id, c.user_low, c.user_high, c.product_id, c.live_since
+               FROM conversations c
+               LEFT JOIN products p ON p.id = c.product_id
+               LEFT JOIN products_archive pa ON pa.id = c.product_id
+               WHERE c.live_since IS NOT NULL AND c.product_id != 0
+                 AND c.last_message_at < NOW() - INTERVAL %s MONTH
+                 AND (pa.updated_at < NOW() - INTERVAL %s MONTH
+                      OR (p.status IN ('sold', 'removed')
+                          AND p.updated_at < NOW() - INTERVAL %s MONTH)
+                      OR (p.id IS NULL AND pa.id IS NULL))
+               ORDER BY c.id LIMIT %s
+               FOR UPDATE OF c SKIP LOCKED""",
+            (months, months, months, batch_size)
+        )
+        conversations = cur.fetchall()
+        for conv in conversations:
+            cur.execute(
+                """SELECT * FROM messages
+                   WHERE ((sender_id = %s AND receiver_id = %s)
+                       OR (sender_id = %s AND receiver_id = %s))
+                     AND product_id = %s AND created_at >= %s
+                   ORDER BY created_at, id""",
+                (conv['user_low'], conv['user_high'], conv['user_high'], conv['user_low'],
+                 conv['product_id'], conv['live_since'])
+            )
+            fetched = cur.fetchall()
+            live = [row['id'] for row in fetched]
+            rows = list(fetched)
+            cur.execute("SELECT payload FROM message_archives WHERE conversation_id = %s",
+                        (conv['id'],))
+            earlier = cur.fetchone()
+            if earlier:
+                rows = _unpack(earlier['payload']) + rows
+            if rows:
+                cur.execute(
+                    """REPLACE INTO message_archives
+                           (conversation_id, message_count, first_at, last_at, payload)
+                       VALUES (%s, %s, %s, %s, %s)""",
+                    (conv['id'], len(rows), rows[0]['created_at'], rows[-1]['created_at'],
+                     _pack(rows))
+                )
+                if live:
+                    # The created_at bound keeps the delete inside the conversation's months
+                    cur.execute(
+                        f"""DELETE FROM messages
+                            WHERE id IN ({', '.join(['%s'] * len(live))})
+                              AND created_at >= %s""",
+                        live + [conv['live_since']]
+                    )
+                    moved += cur.rowcount
+            cur.execute(
+                """UPDATE conversations SET live_since = NULL, archived = %s,
+                       unread_low = 0, unread_high = 0
+                   WHERE id = %s""",
+                (bool(rows), conv['id'])
+            )
+    return len(conversations), moved
+
+
+# ─── Partitions ──────────────────────────────────────────────────────
+def _month_start(day, offset=0):
+    months = day.year * 12 + day.month - 1 + offset
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def _partitions(query_db):
+    """Partition names of messages in order: pYYYYMM for each month, then pmax."""
+    rows = query_db(
+        """SELECT PARTITION_NAME AS name FROM information_schema.PARTITIONS
+           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'messages'
+             AND PARTITION_NAME IS NOT NULL
+           ORDER BY PARTITION_ORDINAL_POSITION"""
+    )
+    return [r['name'] for r in rows]
+
+
+def _partition_month(name):
+    return date(int(name[1:5]), int(name[5:7]), 1)
+
+
+def ensure_partitions(query_db, months_ahead):
+    """Split pmax into monthly partitions through ``months_ahead`` months from now."""
+    names = _partitions(query_db)
+    if not names:
+        raise RuntimeError('messages is not partitioned; run setup_db.py first')
+    monthly = [name for name in names if name != 'pmax']
+    if monthly:
+        start = _month_start(_partition_month(monthly[-1]), 1)
+    else:
+        # Only pmax so far: start at the oldest message so existing rows are split too
+        oldest = query_db("SELECT MIN(created_at) AS oldest FROM messages", one=True)['oldest']
+        start = _month_start(oldest.date() if oldest else date.today())
+    end = _month_start(date.today(), months_ahead + 1)
+
+    new = []
+    month = start
+    while month < end:
+        upper = _month_start(month, 1)
+        new.append(f"PARTITION p{month:%Y%m} VALUES LESS THAN "
+                   f"(UNIX_TIMESTAMP('{upper:%Y-%m-%d} 00:00:00'))")
+        month = upper
+    if new:
+        query_db(f"""ALTER TABLE messages REORGANIZE PARTITION pmax INTO
+                     ({', '.join(new)}, PARTITION pmax VALUES LESS THAN MAXVALUE)""",
+                 commit=True)
+    return len(new)
+
+
+def drop_empty_partitions(query_db, months):
+    """Drop monthly partitions older than ``months`` that compaction has emptied."""
+    cutoff = _month_start(date.today(), -months)
+    dropped = []
+    for name in _partitions(query_db):
+        if name == 'pmax' or _partition_month(name) >= cutoff:
+            break
+        if not query_db(f"SELECT 1 FROM messages PARTITION ({name}) LIMIT 1", one=True):
+            query_db(f"ALTER TABLE messages DROP PARTITION {name}", commit=True)
+            dropped.append(name)
+    return dropped
+
+
+# ─── Rebuild ─────────────────────────────────────────────────────────
+def rebuild_conversations(query_db):
+    """Recompute the summaries of conversations with live messages (after bulk loads)."""
+    query_db(
+        """INSERT INTO conversations
+               (user_low, user_high, product_id, started_at, live_since, last_message_at,
+                last_message, last_sender_id, message_count, unread_low, unread_high)
+           SELECT user_low, user_high, product_key, MIN(created_at), MIN(created_at),
+                  MAX(created_at),
+                  MAX(CASE WHEN newest = 1 THEN LEFT(message_text, 255) END),
+                  MAX(CASE WHEN newest = 1 THEN sender_id END),
+                  COUNT(*),
+                  SUM(NOT is_read AND receiver_id = user_low),
+                  SUM(NOT is_read AND receiver_id = user_high)
+           FROM (
+               SELECT sender_id, receiver_id, message_text, is_read, created_at,
+                      LEAST(sender_id, receiver_id) AS user_low,
+                      GREATEST(sender_id, receiver_id) AS user_high,
+                      COALESCE(product_id, 0) AS product_key,
+                      ROW_NUMBER() OVER (
+                          PARTITION BY LEAST(sender_id, receiver_id),
+                                       GREATEST(sender_id, receiver_id),
+                                       COALESCE(product_id, 0)
+                          ORDER BY created_at DESC, id DESC) AS newest
+               FROM messages
+           ) m
+           GROUP BY user_low, user_high, product_key
+           ON DUPLICATE KEY UPDATE
+               started_at = LEAST(started_at, VALUES(started_at)),
+               live_since = VALUES(live_since),
+               last_message_at = VALUES(last_message_at),
+               last_message = VALUES(last_message),
+               last_sender_id = VALUES(last_sender_id),
+               message_count = VALUES(message_count)
+                   + COALESCE((SELECT a.message_count FROM message_archives a
+                               WHERE a.conversation_id = conversations.id), 0),
+               unread_low = VALUES(unread_low),
+               unread_high = VALUES(unread_high)""",
+        commit=True
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain message partitions and compaction.')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--maintain', action='store_true')
+    group.add_argument('--rebuild', action='store_true')
+    args = parser.parse_args()
+
+    from config import Config
+    from db import query_db, transaction
+
+    if args.rebuild:
+        rebuild_conversations(query_db)
+        print("✅ Conversation summaries rebuilt")
+        return
+
+    months = Config.MESSAGE_RETENTION_MONTHS
+    added = ensure_partitions(query_db, Config.MESSAGE_PARTITIONS_AHEAD)
+    print(f"   {added} monthly partitions added")
+    total = 0
+    while True:
+        compacted, moved = compact_batch(transaction, months, Config.MESSAGE_COMPACT_BATCH)
+        if not compacted:
+            break
+        total += moved
+        print(f"   compacted {compacted} conversations ({moved} messages)")
+        time.sleep(Config.MESSAGE_COMPACT_PAUSE)
+    dropped = drop_empty_partitions(query_db, months)
+    print(f"✅ {total} messages compacted, partitions dropped: {', '.join(dropped) or 'none'}")
+
+
+if __name__ == '__main__':
+    main()
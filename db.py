@@ -0,0 +1,120 @@
+"""
+Database — Connections, queries and transactions
+Shared by the app, the admin blueprint and the maintenance scripts. Every
+call opens its own connection, so nothing here survives a fork and it is
+safe to import before gunicorn forks its workers. Connection settings come
+from Config until create_app() calls init_app() with the app's config.
+"""
+
+import time
+from contextlib import contextmanager
+
+import pymysql
+import pymysql.connections
+import pymysql.cursors
+
+import db_stats
+import metrics
+from config import Config
+
+
+def _connect_args(get):
+    return {
+        'host': get('MYSQL_HOST'),
+        'user': get('MYSQL_USER'),
+        'password': get('MYSQL_PASSWORD'),
+        'database': get('MYSQL_DB'),
+        'port': get('MYSQL_PORT'),
+    }
+
+
+_settings = _connect_args(lambda key: getattr(Config, key))
+
+
+def init_app(app):
+    """Use the app's MySQL settings for every connection opened from now on."""
+    _settings.update(_connect_args(app.config.get))
+
+
+class TrackedConnection(pymysql.connections.Connection):
+    """pymysql connection that reports opens and closes to the metrics gauges."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._tracked = True
+        metrics.connection_opened()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if self._tracked:
+                self._tracked = False
+                metrics.connection_closed()
+
+
+class TrackedCursor(pymysql.cursors.DictCursor):
+    """DictCursor that reports each statement to db_stats, as query_db does."""
+
+    _batch = False
+
+    def execute(self, query, args=None):
+        if self._batch:
+            return super().execute(query, args)
+        started = time.perf_counter()
+        result = super().execute(query, args)
+        db_stats.record(self, query, args, time.perf_counter() - started, self.rowcount)
+        return result
+
+    def executemany(self, query, args):
+        # One record for the batch, not one per row or generated statement
+        started = time.perf_counter()
+        self._batch = True
+        try:
+            result = super().executemany(query, args)
+        finally:
+            self._batch = False
+        db_stats.record(self, query, None, time.perf_counter() - started, self.rowcount)
+        return result
+
+
+def get_db(cursorclass=pymysql.cursors.DictCursor):
+    """Create and return a MySQL database connection."""
+    return TrackedConnection(cursorclass=cursorclass, charset='utf8mb4', **_settings)
+
+
+def query_db(query, args=(), one=False, commit=False):
+    """Execute a database query and return results."""
+    db = get_db()
+    cur = db.cursor()
+    started = time.perf_counter()
+    cur.execute(query, args)
+    if commit:
+        db.commit()
+        db_stats.record(cur, query, args, time.perf_counter() - started, cur.rowcount)
+        last_id = cur.lastrowid
+        cur.close()
+        db.close()
+        return last_id
+    results = cur.fetchone() if one else cur.fetchall()
+    rows = (1 if results else 0) if one else len(results)
+    db_stats.record(cur, query, args, time.perf_counter() - started, rows)
+    cur.close()
+    db.close()
+    return results
+
+
+@contextmanager
+def transaction():
+    """Yield a cursor whose statements are committed together, or rolled back on error."""
+    db = get_db()
+    cur = db.cursor(TrackedCursor)
+    try:
+        yield cur
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cur.close()
+        db.close()
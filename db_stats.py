@@ -0,0 +1,143 @@
+"""
+DB Instrumentation — Per-request statement statistics
+query_db and transaction() cursors report every statement here. Each request gets a statement count,
+total DB time, rows returned and its slowest statement, exposed as a
+Server-Timing header and one structured log line. Slow statements are
+logged with their EXPLAIN plan, and repeated statement shapes (N+1
+patterns) raise a warning.
+"""
+
+import json
+import logging
+import re
+import time
+from collections import Counter
+
+from flask import g, has_request_context, request, current_app
+
+logger = logging.getLogger('campus_marketplace.db')
+
+_IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)+\s*\)')
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_SPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """Reduce a statement to its shape: literals, IN lists and whitespace collapsed."""
+    sql = _IN_LIST.sub('(%s, ...)', sql)
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class RequestStats:
+    """Statement statistics for one request."""
+    __slots__ = ('started', 'count', 'total', 'rows', 'slowest', 'slowest_sql',
+                 'shapes', 'warned')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.total = 0.0
+        self.rows = 0
+        self.slowest = 0.0
+        self.slowest_sql = None
+        self.shapes = Counter()
+        self.warned = set()
+
+    def as_dict(self):
+        return {
+            'queries': self.count,
+            'db_ms': round(self.total * 1000, 2),
+            'rows': self.rows,
+            'slowest_ms': round(self.slowest * 1000, 2),
+            'slowest_sql': self.slowest_sql,
+        }
+
+
+def current():
+    """Stats of the active request, or None outside a request (scripts, threads)."""
+    if not has_request_context():
+        return None
+    return g.get('db_stats')
+
+
+def record(cur, query, args, elapsed, rows):
+    """Account one executed statement; EXPLAIN it on ``cur``'s connection if it was slow."""
+    stats = current()
+    if stats is None:
+        return
+    config = current_app.config
+    shape = normalize_sql(query)
+    stats.count += 1
+    stats.total += elapsed
+    stats.rows += rows
+    if elapsed > stats.slowest:
+        stats.slowest = elapsed
+        stats.slowest_sql = shape
+
+    stats.shapes[shape] += 1
+    repeats = stats.shapes[shape]
+    if repeats > config['N_PLUS_ONE_THRESHOLD'] and shape not in stats.warned:
+        stats.warned.add(shape)
+        logger.warning("Possible N+1 on %s %s: statement ran %d+ times: %s",
+                       request.method, request.path, repeats, shape)
+
+    if elapsed * 1000 >= config['SLOW_QUERY_MS']:
+        plan = None
+        if shape.lstrip('( ').upper().startswith('SELECT'):
+            # A separate cursor, so a transaction's pending results survive
+            explain = cur.connection.cursor()
+            try:
+                explain.execute('EXPLAIN ' + query, args)
+                plan = explain.fetchall()
+            except Exception as e:
+                plan = f'EXPLAIN failed: {e}'
+            finally:
+                explain.close()
+        logger.warning(json.dumps({
+            'event': 'slow_query',
+            'path': request.path,
+            'ms': round(elapsed * 1000, 2),
+            'sql': shape,
+            'plan': plan,
+        }, default=str))
+
+
+def init_app(app):
+    """Start stats for each request and report them when it finishes."""
+    app_logger = logging.getLogger('campus_marketplace')
+    if not app_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+        app_logger.addHandler(handler)
+        app_logger.setLevel(logging.INFO)
+
+    @app.before_request
+    def _start_db_stats():
+        g.db_stats = RequestStats()
+
+    @app.after_request
+    def _report_db_stats(response):
+        stats = current()
+        if stats is None:
+            return response
+        app_ms = (time.perf_counter() - stats.started) * 1000
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={stats.total * 1000:.2f};desc="{stats.count} queries", '
+            f'app;dur={app_ms:.2f}'
+        )
+        if app.config['DB_STATS_LOG']:
+            line = {
+                'event': 'request_db',
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'app_ms': round(app_ms, 2),
+            }
+            line.update(stats.as_dict())
+            logger.info(json.dumps(line))
+        return response
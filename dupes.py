@@ -0,0 +1,262 @@
+"""
+Duplicate Detection — Perceptual hashes and a BK-tree for near-duplicate photos
+Each listing photo gets a 64-bit difference hash (dHash) stored in
+products.image_hash. It needs only PIL, so it is computed at upload even
+when the AI analysis fails. Hashes of re-posted or re-used photos
+differ in only a few bits, so a BK-tree over Hamming distance answers
+"which listings are within N bits of this one" without a full scan.
+
+add_product flags near-duplicates at upload time through a per-process
+tree that catches up with new listings by id watermark. The watermark
+trails a minute behind, and listings newer than it are compared directly.
+The batch job groups all existing duplicates for the admin AI analytics
+page:
+
+    python dupes.py --cluster
+"""
+
+import argparse
+import os
+import threading
+
+from PIL import Image
+
+from archive import with_archive
+
+# Ids are assigned when the INSERT runs but become visible at commit, so
+# the tree stops a minute short of now, like the rollups' watermarks
+_UPPER_BOUND = """SELECT COALESCE((SELECT id FROM products
+                                      WHERE created_at < NOW() - INTERVAL 1 MINUTE
+                                      ORDER BY id DESC LIMIT 1), 0) AS upper"""
+
+
+def dhash(image, size=8):
+    """64-bit difference hash: brighter-than-right-neighbour bits of a 9x8 thumbnail.
+
+    ``image`` is a path or a readable file object.
+    """
+    with Image.open(image) as img:
+        pixels = list(img.convert('L').resize((size + 1, size), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """Metric tree over Hamming distance; each node is [hash, items, {distance: child}]."""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value, radius):
+        """(distance, item) pairs within ``radius`` bits of ``value``."""
+        if self.root is None:
+            return []
+        found = []
+        stack = [self.root]
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                found.extend((distance, item) for item in items)
+            # Triangle inequality: only children in [d - r, d + r] can match
+            for edge, child in children.items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+class HashIndex:
+    """Per-process BK-tree of listing photos, caught up by product id.
+
+    Loading every hash takes seconds at millions of listings, so the tree
+    is built on a background thread (at worker warm-up, or on the first
+    lookup) and swapped in when complete. Lookups before then find nothing.
+    """
+
+    BATCH_SIZE = 50000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tree = None
+        self._last_id = 0
+        self._pid = None
+        self._building = False
+
+    def _reset_after_fork(self):
+        if self._pid != os.getpid():
+            self._tree, self._last_id, self._pid, self._building = None, 0, os.getpid(), False
+
+    def _rows(self, query_db, after_id, upper):
+        """Hashed products with ids in (``after_id``, ``upper``], in id order."""
+        while after_id < upper:
+            rows = query_db(
+                """SELECT id, image_hash FROM products
+                   WHERE id > %s AND id <= %s AND image_hash IS NOT NULL
+                   ORDER BY id LIMIT %s""",
+                (after_id, upper, self.BATCH_SIZE)
+            )
+            yield from rows
+            if len(rows) < self.BATCH_SIZE:
+                return
+            after_id = rows[-1]['id']
+
+    def build(self, query_db):
+        """Load the full tree without holding the lock, then swap it in."""
+        with self._lock:
+            self._reset_after_fork()
+            if self._building or self._tree is not None:
+                return
+            self._building = True
+        tree = BKTree()
+        try:
+            last_id = query_db(_UPPER_BOUND, one=True)['upper']
+            for row in self._rows(query_db, 0, last_id):
+                tree.add(row['image_hash'], row['id'])
+        except Exception as e:
+            print(f"[Duplicate Index Error] {e}")
+            with self._lock:
+                self._building = False
+            return
+        with self._lock:
+            self._tree, self._last_id, self._building = tree, last_id, False
+
+    def find(self, query_db, image_hash, radius, exclude=None):
+        """Existing products whose photo is within ``radius`` bits, closest first."""
+        with self._lock:
+            self._reset_after_fork()
+            tree, last_id = self._tree, self._last_id
+        if tree is None:
+            threading.Thread(target=self.build, args=(query_db,), name='hash-index',
+                             daemon=True).start()
+            return []
+
+        # Query without the lock so a slow catch-up doesn't queue other uploads
+        upper = query_db(_UPPER_BOUND, one=True)['upper']
+        new_rows = list(self._rows(query_db, last_id, upper))
+        recent = query_db("SELECT id, image_hash FROM products WHERE id > %s "
+                          "AND image_hash IS NOT NULL", (max(upper, last_id),))
+
+        with self._lock:
+            # Another lookup may have caught up meanwhile; add each row once
+            for row in new_rows:
+                if row['id'] > self._last_id:
+                    tree.add(row['image_hash'], row['id'])
+            self._last_id = max(self._last_id, upper)
+            matches = tree.search(image_hash, radius)
+        for row in recent:
+            distance = hamming(image_hash, row['image_hash'])
+            if distance <= radius:
+                matches.append((distance, row['id']))
+
+        distances = {}
+        for distance, product_id in matches:
+            if product_id != exclude:
+                distances[product_id] = min(distance, distances.get(product_id, 64))
+        if not distances:
+            return []
+        # The tree never forgets; drop products deleted or archived since they were indexed
+        placeholders = ', '.join(['%s'] * len(distances))
+        alive = query_db(f"SELECT id FROM products WHERE id IN ({placeholders})",
+                         list(distances))
+        return sorted(((distances[r['id']], r['id']) for r in alive))
+
+
+_index = HashIndex()
+
+
+def warm_up(query_db):
+    """Build this worker's hash index now (gunicorn post_fork with AI_WARMUP=1)."""
+    _index.build(query_db)
+
+
+def find_duplicates(query_db, image_hash, radius, exclude=None):
+    """[(distance, product_id)] of near-duplicate listings, closest first.
+
+    Empty while this worker's index is still being built; the batch
+    clustering job still groups such listings afterwards.
+    """
+    return _index.find(query_db, image_hash, radius, exclude)
+
+
+# ─── Batch Clustering ────────────────────────────────────────────────
+def cluster_duplicates(query_db, transaction, radius):
+    """Group all photos within ``radius`` bits of each other into duplicate_clusters.
+
+    Clusters are connected components (union-find over BK-tree matches)
+    over live and archived listings; each is identified by its oldest
+    product id. Returns the cluster count.
+    """
+    rows = query_db(*with_archive(
+        """SELECT p.id AS product_id, p.image_hash FROM {products} p
+           WHERE p.image_hash IS NOT NULL"""
+    ))
+    tree = BKTree()
+    for row in rows:
+        tree.add(row['image_hash'], row['product_id'])
+
+    parent = {row['product_id']: row['product_id'] for row in rows}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for row in rows:
+        for _, other in tree.search(row['image_hash'], radius):
+            a, b = find(row['product_id']), find(other)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+
+    members = {}
+    for product_id in parent:
+        members.setdefault(find(product_id), []).append(product_id)
+    clusters = {root: ids for root, ids in members.items() if len(ids) > 1}
+
+    with transaction() as cur:
+        cur.execute("DELETE FROM duplicate_clusters")
+        cur.executemany(
+            "INSERT INTO duplicate_clusters (product_id, cluster_id) VALUES (%s, %s)",
+            [(product_id, min(ids)) for ids in clusters.values() for product_id in ids]
+        )
+    return len(clusters)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cluster near-duplicate listing photos.')
+    parser.add_argument('--cluster', action='store_true', required=True)
+    parser.add_argument('--radius', type=int, default=None, help='max differing bits')
+    args = parser.parse_args()
+
+    from config import Config
+    from db import query_db, transaction
+    count = cluster_duplicates(query_db, transaction,
+                               args.radius if args.radius is not None
+                               else Config.DUPLICATE_HASH_RADIUS)
+    print(f"✅ {count} duplicate clusters written")
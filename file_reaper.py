@@ -0,0 +1,49 @@
+"""
+File Reaper — Background deletion of uploaded images
+Routes queue paths here after their rows are gone, so the request never
+waits on disk I/O for bulk removals.
+"""
+
+import os
+import queue
+import threading
+
+_queue = queue.Queue()
+_worker = None
+_worker_pid = None
+_lock = threading.Lock()
+
+
+def _run():
+    while True:
+        path = _queue.get()
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"[File Reaper Error] {path}: {e}")
+        finally:
+            _queue.task_done()
+
+
+def _ensure_worker():
+    """Start the reaper thread once per process (threads do not survive fork)."""
+    global _worker, _worker_pid
+    with _lock:
+        if _worker is None or _worker_pid != os.getpid() or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name='file-reaper', daemon=True)
+            _worker.start()
+            _worker_pid = os.getpid()
+
+
+def queue_delete(paths):
+    """Schedule files for deletion. Returns how many were queued."""
+    count = 0
+    for path in paths:
+        if path:
+            _queue.put(path)
+            count += 1
+    if count:
+        _ensure_worker()
+    return count
@@ -0,0 +1,37 @@
+"""
+Gunicorn configuration
+    gunicorn -c gunicorn.conf.py
+
+The app is built once in the master (preload_app) and forked into the
+workers. Set AI_WARMUP=1 on hosts that serve uploads so each worker
+imports ai_module and builds its duplicate-photo index in the background
+right after fork instead of on its first upload; web-only workers leave
+it unset and boot without them.
+"""
+
+import multiprocessing
+import os
+import threading
+
+import metrics
+
+wsgi_app = 'app:create_app()'
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = True
+timeout = 60
+
+
+def post_fork(server, worker):
+    # TensorFlow is not fork-safe, so it is only ever imported in a worker
+    if os.environ.get('AI_WARMUP') == '1':
+        import ai_loader
+        import dupes
+        from db import query_db
+        threading.Thread(target=ai_loader.load, name='ai-warmup', daemon=True).start()
+        threading.Thread(target=dupes.warm_up, args=(query_db,), name='hash-index',
+                         daemon=True).start()
+
+
+child_exit = metrics.child_exit
@@ -0,0 +1,380 @@
+"""
+Load Test — Concurrent virtual users against a running marketplace
+Each virtual user registers, logs in and then loops over weighted flows
+(browse, search, view product, chat, sell with image upload, admin
+dashboard) with random think time. Reports throughput and p50/p95/p99
+latency per endpoint, writes the results as JSON for comparison across
+commits, and exits non-zero when a budget or baseline check fails.
+
+    python loadtest.py --users 20 --duration 60 --out results/head.json
+    python loadtest.py --baseline results/main.json --budgets budgets.json
+
+Budgets file: {"*": {"p95_ms": 500, "error_rate": 0.01},
+               "product_detail": {"p99_ms": 300}}
+
+Every virtual user comes from this machine's address, which would empty
+the per-IP rate-limit buckets within seconds. Start the server under test
+with that address exempt, e.g.  RATE_LIMIT_EXEMPT=127.0.0.1 gunicorn ...
+Analysis slots (ANALYSIS_CONCURRENCY) still apply, so sell flows may see
+503s when more users upload at once than there are slots.
+"""
+
+import argparse
+import http.cookiejar
+import json
+import math
+import os
+import random
+import re
+import struct
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+import zlib
+
+from config import Config
+
+ADMIN_EMAIL = os.environ.get('LOADTEST_ADMIN_EMAIL', 'admin@campus.edu')
+ADMIN_PASSWORD = os.environ.get('LOADTEST_ADMIN_PASSWORD', 'Admin@123')
+
+SEARCH_TERMS = ('book', 'laptop', 'cycle', 'calculator', 'chair', 'notes', 'phone',
+                'lamp', 'shoes', 'guitar', 'table', 'bag')
+SORTS = ('newest', 'oldest', 'price_low', 'price_high', 'trust')
+
+_PRODUCT_LINK = re.compile(r'/product/(\d+)')
+_CHAT_LINK = re.compile(r'/messages/(\d+)')
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Measure each endpoint on its own instead of following redirects."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def make_png(width=256, height=256, seed=0):
+    """A noisy gradient PNG, built with zlib so no imaging library is needed."""
+    rng = random.Random(seed)
+    base = [rng.randrange(256) for _ in range(3)]
+    rows = []
+    for y in range(height):
+        row = bytearray(b'\x00')
+        for x in range(width):
+            noise = rng.randrange(-24, 25)
+            row += bytes(((base[0] + x + noise) & 255,
+                          (base[1] + y + noise) & 255,
+                          (base[2] + (x ^ y)) & 255))
+        rows.append(bytes(row))
+
+    def chunk(tag, data):
+        return (struct.pack('>I', len(data)) + tag + data
+                + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(b''.join(rows), 6)) + chunk(b'IEND', b''))
+
+
+def _multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    body = bytearray()
+    for name, value in fields.items():
+        body += (f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"'
+                 f'\r\n\r\n{value}\r\n').encode()
+    for name, (filename, data, ctype) in files.items():
+        body += (f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                 f'filename="{filename}"\r\nContent-Type: {ctype}\r\n\r\n').encode()
+        body += data + b'\r\n'
+    body += f'--{boundary}--\r\n'.encode()
+    return bytes(body), f'multipart/form-data; boundary={boundary}'
+
+
+# ─── Results ─────────────────────────────────────────────────────────
+class Recorder:
+    """Thread-safe latency samples per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def add(self, name, seconds, ok):
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self.samples = {}
+            self.errors = {}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, errors, duration):
+    values = sorted(samples)
+    count = len(values)
+    return {
+        'requests': count,
+        'errors': errors,
+        'error_rate': round(errors / count, 4) if count else 0.0,
+        'rps': round(count / duration, 2) if duration else 0.0,
+        'mean_ms': round(sum(values) / count * 1000, 2) if count else 0.0,
+        'p50_ms': round(percentile(values, 50) * 1000, 2),
+        'p95_ms': round(percentile(values, 95) * 1000, 2),
+        'p99_ms': round(percentile(values, 99) * 1000, 2),
+        'max_ms': round(values[-1] * 1000, 2) if count else 0.0,
+    }
+
+
+# ─── Virtual User ────────────────────────────────────────────────────
+class VirtualUser(threading.Thread):
+    """One browser session looping over weighted flows until ``stop`` is set."""
+
+    def __init__(self, index, args, recorder, stop, run_id):
+        super().__init__(name=f'vu-{index}', daemon=True)
+        self.index = index
+        self.args = args
+        self.recorder = recorder
+        self.stop = stop
+        self.rng = random.Random(f'{args.seed}-{index}')
+        self.email = f'loadtest-{run_id}-{index}@campus.edu'
+        self.is_admin = index < args.admins
+        self.product_ids = []
+        self.sellers = []
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect)
+        self.flows = [
+            (self.browse, args.weight_browse),
+            (self.search, args.weight_search),
+            (self.view_product, args.weight_view),
+            (self.chat, args.weight_chat),
+            (self.sell, args.weight_sell),
+        ]
+        if self.is_admin:
+            self.flows.append((self.admin_dashboard, args.weight_admin))
+
+    # HTTP ────────────────────────────────────────────────────────────
+    def request(self, name, path, data=None, content_type=None):
+        """Issue one request, record its latency, and return (status, body)."""
+        req = urllib.request.Request(self.args.base + path, data=data,
+                                     method='POST' if data is not None else 'GET')
+        if content_type:
+            req.add_header('Content-Type', content_type)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.args.timeout) as resp:
+                status, body = resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            status, body = e.code, e.read()
+        except (urllib.error.URLError, OSError):
+            status, body = 0, b''
+        elapsed = time.perf_counter() - started
+        if name:
+            self.recorder.add(name, elapsed, 0 < status < 400)
+        return status, body.decode('utf-8', errors='replace')
+
+    def post_form(self, name, path, fields):
+        return self.request(name, path, urllib.parse.urlencode(fields).encode(),
+                            'application/x-www-form-urlencoded')
+
+    def remember_links(self, html):
+        ids = _PRODUCT_LINK.findall(html)
+        if ids:
+            self.product_ids = list(dict.fromkeys(ids))[:100]
+
+    # Flows ───────────────────────────────────────────────────────────
+    def login(self):
+        if self.is_admin:
+            email, password = ADMIN_EMAIL, ADMIN_PASSWORD
+        else:
+            email, password = self.email, 'Loadtest123'
+            self.post_form('register', '/register', {
+                'full_name': f'Load Tester {self.index}', 'email': email,
+                'password': password, 'confirm_password': password,
+                'phone': '9000000000', 'department': 'Computer Science', 'role': 'student',
+            })
+        status, _ = self.post_form('login', '/login', {'email': email, 'password': password})
+        return status == 302
+
+    def browse(self):
+        params = {'sort': self.rng.choice(SORTS)}
+        if self.rng.random() < 0.3:
+            params['category'] = self.rng.randint(1, 8)
+        _, html = self.request('index', '/?' + urllib.parse.urlencode(params))
+        self.remember_links(html)
+
+    def search(self):
+        term = self.rng.choice(SEARCH_TERMS)
+        _, html = self.request('search', '/?' + urllib.parse.urlencode({'search': term}))
+        self.remember_links(html)
+
+    def view_product(self):
+        if not self.product_ids:
+            return self.browse()
+        # Popular products get most of the traffic
+        pick = min(int(self.rng.expovariate(1 / 5)), len(self.product_ids) - 1)
+        _, html = self.request('product_detail', f'/product/{self.product_ids[pick]}')
+        sellers = _CHAT_LINK.findall(html)
+        if sellers:
+            self.sellers.append((sellers[0], self.product_ids[pick]))
+            del self.sellers[:-20]
+
+    def chat(self):
+        if not self.sellers:
+            return self.view_product()
+        seller, product_id = self.rng.choice(self.sellers)
+        self.request('chat', f'/messages/{seller}?product_id={product_id}')
+        self.post_form('chat_send', f'/messages/{seller}', {
+            'message': f'Is this still available? ({self.rng.randrange(10000)})',
+            'product_id': product_id,
+        })
+
+    def sell(self):
+        self.request('add_product_form', '/add_product')
+        body, ctype = _multipart({
+            'title': f'Load test item {self.rng.randrange(100000)}',
+            'description': 'Lightly used, works fine. Pick up near the library.',
+            'price': self.rng.randrange(50, 5000),
+            'category_id': self.rng.randint(1, 8),
+            'item_condition': self.rng.choice(Config.ITEM_CONDITIONS),
+        }, {'image': ('item.png', make_png(seed=self.rng.randrange(1 << 30)), 'image/png')})
+        self.request('add_product', '/add_product', body, ctype)
+
+    def admin_dashboard(self):
+        self.request('admin_dashboard', '/admin/')
+
+    def run(self):
+        if not self.login():
+            print(f"[Load Test] {self.name} could not log in as {self.email if not self.is_admin else ADMIN_EMAIL}")
+        self.browse()
+        funcs, weights = zip(*[(f, w) for f, w in self.flows if w > 0])
+        while not self.stop.is_set():
+            self.rng.choices(funcs, weights)[0]()
+            if self.args.think > 0:
+                self.stop.wait(self.rng.expovariate(1 / self.args.think))
+
+
+# ─── Checks ──────────────────────────────────────────────────────────
+def check_budgets(endpoints, budgets):
+    """Compare endpoint stats against budgets. Returns a list of failure messages."""
+    failures = []
+    default = budgets.get('*', {})
+    for name, stats in endpoints.items():
+        for metric, limit in {**default, **budgets.get(name, {})}.items():
+            if stats.get(metric, 0) > limit:
+                failures.append(f'{name}: {metric} {stats[metric]} > budget {limit}')
+    return failures
+
+
+def check_baseline(endpoints, baseline, max_regression, min_ms):
+    """Flag endpoints whose p95 grew by more than ``max_regression`` over the baseline."""
+    failures = []
+    for name, stats in endpoints.items():
+        old = baseline.get('endpoints', {}).get(name)
+        if not old or stats['p95_ms'] < min_ms:
+            continue
+        if stats['p95_ms'] > old['p95_ms'] * (1 + max_regression):
+            failures.append(f"{name}: p95 {stats['p95_ms']}ms vs baseline {old['p95_ms']}ms")
+    return failures
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+                              ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--base', default=os.environ.get('LOADTEST_BASE', 'http://127.0.0.1:5000'))
+    parser.add_argument('--users', type=int, default=10, help='concurrent virtual users')
+    parser.add_argument('--admins', type=int, default=1, help='how many of them log in as admin')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of measured load')
+    parser.add_argument('--ramp', type=float, default=5, help='seconds to start all users')
+    parser.add_argument('--think', type=float, default=1.0, help='mean think time, 0 = closed loop')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=1)
+    for flow, weight in (('browse', 40), ('search', 20), ('view', 25), ('chat', 8),
+                         ('sell', 5), ('admin', 2)):
+        parser.add_argument(f'--weight-{flow}', type=float, default=weight)
+    parser.add_argument('--out', help='write results JSON here')
+    parser.add_argument('--baseline', help='results JSON of an earlier run to compare with')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='allowed p95 growth over the baseline (0.2 = 20%%)')
+    parser.add_argument('--min-ms', type=float, default=5,
+                        help='ignore baseline regressions below this p95')
+    parser.add_argument('--budgets', help='JSON file of per-endpoint limits')
+    args = parser.parse_args(argv)
+
+    recorder = Recorder()
+    stop = threading.Event()
+    run_id = uuid.uuid4().hex[:8]
+    users = [VirtualUser(i, args, recorder, stop, run_id) for i in range(args.users)]
+
+    print(f"[Load Test] {args.users} users against {args.base} for {args.duration:.0f}s")
+    for user in users:
+        user.start()
+        time.sleep(args.ramp / max(args.users, 1))
+    # Samples taken during ramp-up (registration, logins) are discarded
+    recorder.reset()
+    started = time.time()
+    stop.wait(args.duration)
+    stop.set()
+    for user in users:
+        user.join(args.timeout)
+    duration = time.time() - started
+
+    endpoints = {name: summarize(values, recorder.errors.get(name, 0), duration)
+                 for name, values in sorted(recorder.samples.items())}
+    all_samples = [v for values in recorder.samples.values() for v in values]
+    results = {
+        'meta': {'base': args.base, 'users': args.users, 'duration': round(duration, 2),
+                 'think': args.think, 'seed': args.seed, 'commit': _git_commit(),
+                 'started': started},
+        'total': summarize(all_samples, sum(recorder.errors.values()), duration),
+        'endpoints': endpoints,
+    }
+
+    print(f"\n{'endpoint':<18}{'reqs':>7}{'err':>6}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, s in list(endpoints.items()) + [('TOTAL', results['total'])]:
+        print(f"{name:<18}{s['requests']:>7}{s['errors']:>6}{s['rps']:>8}"
+              f"{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}")
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.out}")
+
+    failures = []
+    if args.budgets:
+        with open(args.budgets) as f:
+            failures += check_budgets(endpoints, json.load(f))
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures += check_baseline(endpoints, json.load(f), args.max_regression, args.min_ms)
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures and (args.budgets or args.baseline):
+        print("✅ Within budget")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
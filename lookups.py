@@ -0,0 +1,66 @@
+"""
+Lookups — Cached reads shared by the site and the admin blueprint
+Values live in the app's SharedCache and are invalidated explicitly by the
+routes that change them.
+"""
+
+from flask import current_app
+
+from archive import tier_queries
+from cache import product_key
+from db import query_db
+from records import AI_SELECT, ProductView
+from trust_labels import get_trust_label
+
+
+def _shared_cache():
+    return current_app.extensions['shared_cache']
+
+
+def get_categories():
+    """All categories by name. Invalidated explicitly by the admin category routes."""
+    return _shared_cache().get_or_set(
+        'categories', lambda: query_db("SELECT * FROM categories ORDER BY name"),
+        ttl=current_app.config['CATEGORIES_TTL']
+    )
+
+
+def get_user_card(user_id):
+    """Public profile fields of a user. Invalidated when an admin edits or deletes them."""
+    return _shared_cache().get_or_set(
+        f'user:{user_id}',
+        lambda: query_db(
+            """SELECT id, full_name, email, phone, department, role,
+                      profile_image, created_at
+               FROM users WHERE id = %s""",
+            (user_id,), one=True
+        )
+    )
+
+
+def get_product_view(product_id):
+    """Product, seller and AI analysis in one query, cached per product id.
+
+    Archived listings are looked up only after the live tables miss.
+    """
+    def load():
+        for query in tier_queries(
+                f"""SELECT p.*, u.full_name AS seller_name, u.email AS seller_email,
+                           u.department AS seller_department, u.phone AS seller_phone,
+                           c.name AS category_name, c.icon AS category_icon,
+                           {AI_SELECT}
+                    FROM {{products}} p
+                    JOIN users u ON p.seller_id = u.id
+                    LEFT JOIN categories c ON p.category_id = c.id
+                    LEFT JOIN {{ai}} ai ON ai.product_id = p.id
+                    WHERE p.id = %s"""):
+            row = query_db(query, (product_id,), one=True)
+            if row:
+                return ProductView.from_row(row, get_trust_label)
+        return None
+    return _shared_cache().get_or_set(product_key(product_id), load)
+
+
+def invalidate_product(product_id):
+    """Drop the cached product page data after the product or its analysis changes."""
+    _shared_cache().delete(product_key(product_id))
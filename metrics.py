@@ -0,0 +1,133 @@
+"""
+Metrics — Prometheus registry and /metrics endpoint
+Per-endpoint request latency, in-flight requests, DB connection gauges,
+AI analysis stage timings, cache hit/miss counters, rate-limit refusals
+and password hashing.
+
+With several gunicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty
+shared directory before starting the server. Each worker then writes its
+samples there and /metrics aggregates all of them, whichever worker
+serves the scrape. Wire ``child_exit`` into the gunicorn config so dead
+workers' live gauges are dropped.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+    REGISTRY, generate_latest, multiprocess
+)
+
+MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by endpoint and status',
+    ['endpoint', 'method', 'status'],
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+)
+IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'Requests currently being served',
+    ['endpoint'], multiprocess_mode='livesum'
+)
+DB_CONNECTIONS_OPEN = Gauge(
+    'db_connections_open', 'MySQL connections currently open',
+    multiprocess_mode='livesum'
+)
+DB_CONNECTIONS_OPENED = Counter(
+    'db_connections_opened_total', 'MySQL connections opened'
+)
+AI_STAGE_LATENCY = Histogram(
+    'ai_analysis_stage_seconds', 'AI image analysis time by pipeline stage',
+    ['stage'],
+    buckets=(.01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Cache lookups by cache and result',
+    ['cache', 'result']
+)
+RATE_LIMITED = Counter(
+    'rate_limited_total', 'Requests refused by rate limits or the analysis cap',
+    ['endpoint', 'scope']
+)
+PASSWORD_HASH_LATENCY = Histogram(
+    'password_hash_seconds', 'Password hash/verify time on the hashing pool',
+    ['op'],
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5)
+)
+PASSWORD_HASH_WAITING = Gauge(
+    'password_hash_waiting', 'Requests waiting for a hashing pool slot',
+    multiprocess_mode='livesum'
+)
+
+
+def record_cache(cache, hit):
+    """Count one cache lookup."""
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+@contextmanager
+def ai_stage(stage):
+    """Time one AI pipeline stage: ``with ai_stage('blur'): ...``"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        AI_STAGE_LATENCY.labels(stage).observe(time.perf_counter() - started)
+
+
+def connection_opened():
+    DB_CONNECTIONS_OPENED.inc()
+    DB_CONNECTIONS_OPEN.inc()
+
+
+def connection_closed():
+    DB_CONNECTIONS_OPEN.dec()
+
+
+def child_exit(server, worker):
+    """gunicorn hook: drop a dead worker's live gauges from the shared directory."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def _endpoint():
+    # Unmatched URLs share one label so 404 scans cannot explode cardinality
+    return request.endpoint or 'unmatched'
+
+
+def init_app(app):
+    """Time every request and serve the registry at /metrics."""
+    @app.before_request
+    def _start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        g.metrics_endpoint = _endpoint()
+        IN_FLIGHT.labels(g.metrics_endpoint).inc()
+
+    @app.after_request
+    def _capture_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _finish_request_metrics(exc):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        endpoint = g.pop('metrics_endpoint')
+        status = g.pop('metrics_status', 500 if exc else 200)
+        IN_FLIGHT.labels(endpoint).dec()
+        REQUEST_LATENCY.labels(endpoint, request.method, str(status)).observe(
+            time.perf_counter() - started)
+
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus text exposition of all workers' metrics."""
+        if MULTIPROC_DIR:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
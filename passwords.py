@@ -0,0 +1,131 @@
+"""
+Passwords — Bounded, measured password hashing
+Hashing and verification run on a small per-process thread pool so a
+burst of logins cannot put every request thread on the CPU at once;
+callers beyond the pool plus PASSWORD_HASH_QUEUE wait at most
+PASSWORD_HASH_TIMEOUT seconds and then get PasswordHashBusy. Hashes made
+with other parameters than PASSWORD_HASH_METHOD are upgraded on login.
+
+Pick parameters for this hardware with the benchmark:
+
+    python passwords.py --target-ms 50
+"""
+
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from metrics import PASSWORD_HASH_LATENCY, PASSWORD_HASH_WAITING
+
+
+class PasswordHashBusy(Exception):
+    """Raised when the hashing pool stays saturated for longer than the timeout."""
+
+
+_lock = threading.Lock()
+_pool = None
+_pool_pid = None
+_slots = None
+_methods = {}
+
+
+def _executor():
+    """The pool and its admission semaphore, created once per process (threads do not survive fork)."""
+    global _pool, _pool_pid, _slots
+    if _pool_pid != os.getpid():
+        with _lock:
+            if _pool_pid != os.getpid():
+                config = current_app.config
+                workers = config['PASSWORD_HASH_WORKERS']
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pwhash')
+                _slots = threading.BoundedSemaphore(workers + config['PASSWORD_HASH_QUEUE'])
+                _pool_pid = os.getpid()
+    return _pool, _slots
+
+
+def _run(op, func, *args):
+    pool, slots = _executor()
+    timeout = current_app.config['PASSWORD_HASH_TIMEOUT']
+    PASSWORD_HASH_WAITING.inc()
+    try:
+        if not slots.acquire(timeout=timeout):
+            raise PasswordHashBusy(f'password hashing pool busy for {timeout}s')
+    finally:
+        PASSWORD_HASH_WAITING.dec()
+    try:
+        with PASSWORD_HASH_LATENCY.labels(op).time():
+            return pool.submit(func, *args).result()
+    finally:
+        slots.release()
+
+
+def hash_password(password):
+    """Hash with the configured method."""
+    return _run('hash', generate_password_hash, password,
+                current_app.config['PASSWORD_HASH_METHOD'])
+
+
+def verify_password(stored_hash, password):
+    return _run('verify', check_password_hash, stored_hash, password)
+
+
+def _full_method(method):
+    # 'scrypt' and 'scrypt:32768:8:1' are the same parameters; let werkzeug expand them
+    if method not in _methods:
+        _methods[method] = generate_password_hash('', method).split('$', 1)[0]
+    return _methods[method]
+
+
+def needs_rehash(stored_hash):
+    """True when the stored hash was made with other parameters than configured."""
+    return stored_hash.split('$', 1)[0] != _full_method(current_app.config['PASSWORD_HASH_METHOD'])
+
+
+# ─── Benchmark ───────────────────────────────────────────────────────
+CANDIDATES = (
+    [f'scrypt:{2 ** n}:8:1' for n in range(13, 18)]
+    + [f'pbkdf2:sha256:{i}' for i in (200000, 400000, 600000, 900000, 1200000)]
+)
+
+
+def benchmark(method, rounds=5):
+    """Median seconds for one hash with ``method``."""
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        generate_password_hash('benchmark-password', method)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pick password hash parameters for a latency target.')
+    parser.add_argument('--target-ms', type=float, default=50)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    best = {}
+    for method in CANDIDATES:
+        ms = benchmark(method, args.rounds) * 1000
+        fits = ms <= args.target_ms
+        print(f"{method:<24}{ms:>9.1f} ms{'' if fits else '  (over target)'}")
+        family = method.split(':', 1)[0]
+        # Candidates are ordered weakest to strongest within each family
+        if fits:
+            best[family] = method
+
+    if not best:
+        print(f"❌ Nothing fits {args.target_ms:.0f} ms; raise the target or add workers")
+        return
+    choice = best.get('scrypt') or best['pbkdf2']
+    print(f"✅ PASSWORD_HASH_METHOD={choice}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""
+Price Statistics — Mergeable per-category price distributions
+Asking prices, sold prices and days-to-sell are kept as t-digests per
+(category, condition), plus a '*' condition covering the whole category.
+Listing a product or marking it sold adds one value to a few digests; no
+statistic ever rescans products. A price suggestion reads at most six
+small rows and takes quantiles from them.
+
+Backfill or repair from scratch:  python price_stats.py --rebuild
+"""
+
+import argparse
+import math
+import struct
+
+from archive import with_archive
+
+ALL_CONDITIONS = '*'
+
+
+class TDigest:
+    """Merging t-digest (Dunning) with the arcsine scale function."""
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.centroids = []         # [mean, weight], sorted by mean
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer = []
+
+    def add(self, value, weight=1):
+        value = float(value)
+        self._buffer.append([value, weight])
+        self.count += weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self._buffer) >= self.compression * 5:
+            self._compress()
+
+    def merge(self, other):
+        other._compress()
+        self._buffer.extend([m, w] for m, w in other.centroids)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+    def _scale(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        items = sorted(self.centroids + self._buffer)
+        self._buffer = []
+        total = sum(w for _, w in items)
+        merged = []
+        done = 0
+        k_lower = self._scale(0)
+        mean, weight = items[0]
+        for m, w in items[1:]:
+            # A centroid may grow while it spans at most one unit of k-scale
+            if self._scale((done + weight + w) / total) - k_lower <= 1:
+                weight += w
+                mean += (m - mean) * w / weight
+            else:
+                merged.append([mean, weight])
+                done += weight
+                k_lower = self._scale(done / total)
+                mean, weight = m, w
+        merged.append([mean, weight])
+        self.centroids = merged
+
+    def quantile(self, q):
+        """Estimated value at quantile ``q`` in [0, 1], or None when empty."""
+        self._compress()
+        if not self.centroids:
+            return None
+        if len(self.centroids) == 1:
+            return self.centroids[0][0]
+        target = q * self.count
+        # Interpolate between centroid centres, anchored at min and max
+        prev_value, prev_rank = self.min, 0.0
+        seen = 0
+        for mean, weight in self.centroids:
+            center = seen + weight / 2
+            if target <= center:
+                span = center - prev_rank
+                frac = (target - prev_rank) / span if span else 0.0
+                return prev_value + (mean - prev_value) * frac
+            prev_value, prev_rank = mean, center
+            seen += weight
+        span = self.count - prev_rank
+        frac = (target - prev_rank) / span if span else 1.0
+        return prev_value + (self.max - prev_value) * frac
+
+    def to_bytes(self):
+        self._compress()
+        header = struct.pack('<Hddd', self.compression, self.count, self.min, self.max)
+        return header + b''.join(struct.pack('<dd', m, w) for m, w in self.centroids)
+
+    @classmethod
+    def from_bytes(cls, data):
+        compression, count, lo, hi = struct.unpack_from('<Hddd', data)
+        digest = cls(compression)
+        digest.count, digest.min, digest.max = count, lo, hi
+        digest.centroids = [list(pair) for pair in struct.iter_unpack('<dd', data[26:])]
+        return digest
+
+
+# ─── Incremental Updates ─────────────────────────────────────────────
+def _fold(cur, category_id, condition, values):
+    """Add {kind: value} to the category's digests for ``condition`` and for '*'."""
+    category_id = category_id or 0
+    for cond in (condition, ALL_CONDITIONS):
+        for kind, value in values.items():
+            cur.execute(
+                """SELECT digest FROM price_digests
+                   WHERE category_id = %s AND item_condition = %s AND kind = %s
+                   FOR UPDATE""",
+                (category_id, cond, kind)
+            )
+            row = cur.fetchone()
+            digest = TDigest.from_bytes(row['digest']) if row else TDigest()
+            digest.add(value)
+            cur.execute(
+                """INSERT INTO price_digests (category_id, item_condition, kind, digest, samples)
+                   VALUES (%s, %s, %s, %s, %s)
+                   ON DUPLICATE KEY UPDATE digest = VALUES(digest), samples = VALUES(samples)""",
+                (category_id, cond, kind, digest.to_bytes(), digest.count)
+            )
+
+
+def record_listing(transaction, category_id, condition, price):
+    """Account a new listing's asking price. Failures only cost suggestions."""
+    try:
+        with transaction() as cur:
+            _fold(cur, category_id, condition, {'listed': price})
+    except Exception as e:
+        print(f"[Price Stats Error] {e}")
+
+
+def record_sale(transaction, product_id):
+    """Account a product just marked sold: its price and days from listing to sale."""
+    try:
+        with transaction() as cur:
+            cur.execute(
+                """SELECT category_id, item_condition, price,
+                          TIMESTAMPDIFF(SECOND, created_at, sold_at) AS seconds
+                   FROM products WHERE id = %s AND sold_at IS NOT NULL""",
+                (product_id,)
+            )
+            p = cur.fetchone()
+            if p:
+                _fold(cur, p['category_id'], p['item_condition'],
+                      {'sold': p['price'], 'days_to_sold': max(p['seconds'], 0) / 86400})
+    except Exception as e:
+        print(f"[Price Stats Error] {e}")
+
+
+# ─── Suggestions ─────────────────────────────────────────────────────
+def price_suggestion(query_db, category_id, condition, min_samples=10):
+    """Suggested price range from sold prices, falling back to asking prices.
+
+    Prefers the condition's own digests and widens to the whole category
+    when they hold fewer than ``min_samples`` values.
+    """
+    rows = query_db(
+        """SELECT item_condition, kind, digest, samples FROM price_digests
+           WHERE category_id = %s AND item_condition IN (%s, %s)""",
+        (category_id or 0, condition or ALL_CONDITIONS, ALL_CONDITIONS)
+    )
+    digests = {(r['item_condition'], r['kind']): r for r in rows}
+
+    def pick(kind):
+        for cond in (condition, ALL_CONDITIONS):
+            row = digests.get((cond, kind))
+            if row and row['samples'] >= min_samples:
+                return cond, TDigest.from_bytes(row['digest'])
+        return None, None
+
+    scope, digest = pick('sold')
+    basis = 'sold'
+    if digest is None:
+        scope, digest = pick('listed')
+        basis = 'listed'
+    if digest is None:
+        return None
+
+    _, days = pick('days_to_sold')
+    return {
+        'basis': basis,
+        'condition': scope,
+        'samples': int(digest.count),
+        'low': round(digest.quantile(0.25), 2),
+        'median': round(digest.quantile(0.5), 2),
+        'high': round(digest.quantile(0.75), 2),
+        'median_days_to_sell': round(days.quantile(0.5), 1) if days else None,
+    }
+
+
+# ─── Rebuild ─────────────────────────────────────────────────────────
+def rebuild_price_stats(query_db, transaction):
+    """Recompute every digest from products (backfill or repair)."""
+    digests = {}
+
+    def add(category_id, condition, kind, value):
+        for cond in (condition, ALL_CONDITIONS):
+            digests.setdefault((category_id or 0, cond, kind), TDigest()).add(value)
+
+    rows = query_db(*with_archive(
+        """SELECT category_id, item_condition, price,
+                  TIMESTAMPDIFF(SECOND, created_at, sold_at) AS seconds
+           FROM {products}"""
+    ))
+    for p in rows:
+        add(p['category_id'], p['item_condition'], 'listed', p['price'])
+        if p['seconds'] is not None:
+            add(p['category_id'], p['item_condition'], 'sold', p['price'])
+            add(p['category_id'], p['item_condition'], 'days_to_sold', max(p['seconds'], 0) / 86400)
+
+    with transaction() as cur:
+        cur.execute("DELETE FROM price_digests")
+        cur.executemany(
+            """INSERT INTO price_digests (category_id, item_condition, kind, digest, samples)
+               VALUES (%s, %s, %s, %s, %s)""",
+            [key + (d.to_bytes(), d.count) for key, d in digests.items()]
+        )
+    return len(digests)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild price distributions from products.')
+    parser.add_argument('--rebuild', action='store_true', required=True)
+    parser.parse_args()
+
+    from db import query_db, transaction
+    count = rebuild_price_stats(query_db, transaction)
+    print(f"✅ Price statistics rebuilt: {count} digests")
@@ -0,0 +1,203 @@
+"""
+Profiling — On-demand request profiling with collapsed-stack output
+An admin can profile a single request by sending ``X-Profile: 1`` or adding
+``?_profile=1``; PROFILE_SAMPLE_RATE additionally profiles a random share of
+all requests. A sampler thread records the request thread's stack every
+PROFILE_INTERVAL_MS and the result is stored as collapsed stacks
+(``frame;frame;frame count``), the input format of flamegraph.pl and
+speedscope, next to a small JSON metadata file.
+"""
+
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import g, request, session
+
+_NAME_RE = re.compile(r'^[\w.-]+$')
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_MODULES = {
+    name[:-3] for name in os.listdir(_PROJECT_DIR) if name.endswith('.py')
+}
+
+# Module prefix -> layer, checked from the leaf frame towards the root
+LAYERS = (
+    ('ai_module', 'ai_module'),
+    ('jinja2', 'Jinja'),
+    ('pymysql', 'pymysql'),
+    ('flask', 'Flask'),
+    ('werkzeug', 'Flask'),
+)
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                module = frame.f_globals.get('__name__', '?')
+                stack.append(f'{module}:{frame.f_code.co_name}')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+
+# ─── Storage ─────────────────────────────────────────────────────────
+def _save(directory, keep, meta, stacks):
+    os.makedirs(directory, exist_ok=True)
+    name = f"{int(meta['started'] * 1000)}_{meta['endpoint']}_{os.getpid()}"
+    with open(os.path.join(directory, name + '.folded'), 'w') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+    with open(os.path.join(directory, name + '.json'), 'w') as f:
+        json.dump(meta, f)
+
+    # Keep only the newest profiles
+    metas = sorted(n for n in os.listdir(directory) if n.endswith('.json'))
+    for old in metas[:-keep]:
+        for ext in ('.json', '.folded'):
+            try:
+                os.remove(os.path.join(directory, old[:-5] + ext))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles(directory):
+    """Metadata of stored profiles, newest first."""
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name)) as f:
+                meta = json.load(f)
+            meta['name'] = name[:-5]
+            profiles.append(meta)
+    return profiles
+
+
+def profile_path(directory, name, ext):
+    """Path of a stored profile file, or None for an invalid or unknown name."""
+    if not _NAME_RE.match(name):
+        return None
+    path = os.path.join(directory, name + ext)
+    return path if os.path.exists(path) else None
+
+
+def load_stacks(path):
+    stacks = Counter()
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            stacks[stack] += int(count)
+    return stacks
+
+
+# ─── Analysis ────────────────────────────────────────────────────────
+def layer_of(frames):
+    """Attribute a stack to the innermost frame belonging to a known layer."""
+    for frame in reversed(frames):
+        module = frame.split(':', 1)[0]
+        for prefix, layer in LAYERS:
+            if module == prefix or module.startswith(prefix + '.'):
+                return layer
+        if module in PROJECT_MODULES:
+            return 'app'
+    return 'other'
+
+
+def summarize(stacks, limit=30):
+    """Top functions by self and total samples, and samples per layer."""
+    self_counts = Counter()
+    total_counts = Counter()
+    layers = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        self_counts[frames[-1]] += count
+        for frame in set(frames):
+            total_counts[frame] += count
+        layers[layer_of(frames)] += count
+    samples = sum(stacks.values())
+    top = [
+        {'function': func, 'self': self_counts[func], 'total': total,
+         'layer': layer_of([func])}
+        for func, total in total_counts.most_common(limit)
+    ]
+    return {
+        'samples': samples,
+        'top_self': self_counts.most_common(limit),
+        'top_total': top,
+        'layers': layers.most_common(),
+    }
+
+
+# ─── Request Hooks ───────────────────────────────────────────────────
+def _wants_profile(config):
+    if session.get('user_role') == 'admin' and (
+            request.headers.get('X-Profile') == '1' or request.args.get('_profile') == '1'):
+        return True
+    rate = config['PROFILE_SAMPLE_RATE']
+    return rate > 0 and random.random() < rate
+
+
+def init_app(app):
+    """Profile flagged or sampled requests and store their collapsed stacks."""
+    @app.before_request
+    def _start_profiler():
+        if request.endpoint == 'static' or not _wants_profile(app.config):
+            return
+        sampler = StackSampler(threading.get_ident(), app.config['PROFILE_INTERVAL_MS'] / 1000)
+        g.profiler = sampler
+        g.profile_started = time.time()
+        sampler.start()
+
+    @app.after_request
+    def _profile_status(response):
+        if 'profiler' in g:
+            g.profile_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _stop_profiler(exc):
+        sampler = g.pop('profiler', None)
+        if sampler is None:
+            return
+        stacks = sampler.stop()
+        started = g.pop('profile_started')
+        meta = {
+            'started': started,
+            'duration_ms': round((time.time() - started) * 1000, 2),
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint or 'unmatched',
+            'status': g.pop('profile_status', 500 if exc else 200),
+            'samples': sum(stacks.values()),
+            'interval_ms': app.config['PROFILE_INTERVAL_MS'],
+        }
+        try:
+            _save(app.config['PROFILE_DIR'], app.config['PROFILE_KEEP'], meta, stacks)
+        except OSError as e:
+            print(f"[Profiler Error] {e}")
@@ -0,0 +1,211 @@
+"""
+Rate Limiting — Token buckets and admission control
+Expensive POST endpoints draw from per-user and per-IP token buckets
+configured in RATE_LIMITS; an empty bucket answers 429 with Retry-After.
+Image analyses additionally need one of ANALYSIS_CONCURRENCY host-wide
+leases; a request that cannot get one quickly is refused with 503 rather
+than holding its worker thread. Addresses in RATE_LIMIT_EXEMPT (e.g. a
+load generator) skip the buckets but not the analysis leases. Buckets and leases live in a SQLite file in WAL mode so the
+limits hold across all workers on the host.
+"""
+
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import Response, current_app, jsonify, request, session
+
+from metrics import RATE_LIMITED
+
+
+class AnalysisBusy(Exception):
+    """Raised when no analysis slot frees up within the wait time."""
+
+    def __init__(self, retry_after):
+        super().__init__(f'all analysis slots busy, retry in {retry_after}s')
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Token buckets and counted leases shared by every worker on the host.
+
+    Like SharedCache, each (process, thread) pair opens its own
+    connection lazily, so instances are safe to create before fork.
+    """
+
+    PURGE_EVERY = 500       # Takes between idle-bucket sweeps
+    IDLE_SECONDS = 3600     # Buckets untouched this long are full again anyway
+
+    def __init__(self, path, lock_timeout=5.0):
+        self.path = path
+        self.lock_timeout = lock_timeout
+        self._local = threading.local()
+        self._takes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.lock_timeout,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS buckets (
+                                key TEXT PRIMARY KEY,
+                                tokens REAL NOT NULL,
+                                updated_at REAL NOT NULL)""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS leases (
+                                id TEXT PRIMARY KEY,
+                                name TEXT NOT NULL,
+                                expires_at REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_leases_name ON leases(name, expires_at)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _immediate(self):
+        """Write transaction taken up front, so read-modify-write is atomic across workers."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def take(self, key, capacity, per_seconds, cost=1):
+        """Take ``cost`` tokens from a bucket refilling ``capacity`` tokens per ``per_seconds``.
+
+        Returns (allowed, retry_after_seconds).
+        """
+        rate = capacity / per_seconds
+        now = time.time()
+        with self._immediate() as conn:
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?",
+                               (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity,
+                                                      row[0] + (now - row[1]) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                         (key, tokens, now))
+        self._takes += 1
+        if self._takes % self.PURGE_EVERY == 0:
+            self._conn().execute("DELETE FROM buckets WHERE updated_at < ?",
+                                 (now - self.IDLE_SECONDS,))
+        return allowed, 0 if allowed else math.ceil((cost - tokens) / rate)
+
+    def acquire(self, name, limit, ttl):
+        """Claim one of ``limit`` leases; returns its id, or None if all are held.
+
+        Leases expire after ``ttl`` seconds so a crashed worker cannot leak them.
+        """
+        now = time.time()
+        with self._immediate() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND expires_at <= ?", (name, now))
+            held = conn.execute("SELECT COUNT(*) FROM leases WHERE name = ?", (name,)).fetchone()[0]
+            if held >= limit:
+                return None
+            lease_id = uuid.uuid4().hex
+            conn.execute("INSERT INTO leases (id, name, expires_at) VALUES (?, ?, ?)",
+                         (lease_id, name, now + ttl))
+        return lease_id
+
+    def release(self, lease_id):
+        self._conn().execute("DELETE FROM leases WHERE id = ?", (lease_id,))
+
+
+def _limiter():
+    return current_app.extensions['rate_limiter']
+
+
+# ─── Analysis Admission ──────────────────────────────────────────────
+@contextmanager
+def analysis_slot():
+    """Hold one of the host-wide analysis slots, waiting up to ANALYSIS_SLOT_WAIT seconds."""
+    config = current_app.config
+    limiter = _limiter()
+    deadline = time.monotonic() + config['ANALYSIS_SLOT_WAIT']
+    while True:
+        try:
+            lease = limiter.acquire('analysis', config['ANALYSIS_CONCURRENCY'],
+                                    config['ANALYSIS_LEASE_TTL'])
+        except sqlite3.Error as e:
+            print(f"[Rate Limit Error] {e}")
+            lease = ''  # Fail open: the limiter must not take analysis down
+        if lease is not None:
+            break
+        if time.monotonic() >= deadline:
+            RATE_LIMITED.labels(request.endpoint or 'unmatched', 'analysis').inc()
+            raise AnalysisBusy(retry_after=5)
+        time.sleep(0.05)
+    try:
+        yield
+    finally:
+        if lease:
+            limiter.release(lease)
+
+
+# ─── Request Hook ────────────────────────────────────────────────────
+def retry_later(message, retry_after, status):
+    """``status`` response (JSON for /api/ endpoints) with a Retry-After header."""
+    if request.path.startswith('/api/'):
+        response = jsonify({'error': message, 'retry_after': retry_after})
+        response.status_code = status
+    else:
+        response = Response(message, status=status, mimetype='text/plain')
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def too_many_requests(message, retry_after):
+    return retry_later(message, retry_after, 429)
+
+
+def _subject(scope):
+    """Bucket subject for a scope, or None when the scope does not apply."""
+    if scope == 'ip':
+        return request.remote_addr
+    if scope == 'user':
+        if 'user_id' in session:
+            return f"u{session['user_id']}"
+        # Before login the account being tried is the user. Keyed with the
+        # address too, so nobody can lock an account out from elsewhere
+        email = request.form.get('email', '').strip().lower() if request.endpoint == 'login' else ''
+        return f'e{email}|{request.remote_addr}' if email else None
+    raise ValueError(f'unknown rate limit scope {scope!r}')
+
+
+def init_app(app):
+    """Apply RATE_LIMITS to POST requests and register the shared limiter."""
+    app.extensions['rate_limiter'] = RateLimiter(app.config['RATE_LIMIT_PATH'])
+
+    @app.before_request
+    def _rate_limit():
+        if request.method != 'POST' or request.remote_addr in app.config['RATE_LIMIT_EXEMPT']:
+            return
+        limits = app.config['RATE_LIMITS'].get(request.endpoint)
+        if not limits:
+            return
+        limiter = app.extensions['rate_limiter']
+        for scope, (capacity, per_seconds) in limits.items():
+            subject = _subject(scope)
+            if subject is None:
+                continue
+            key = json.dumps([request.endpoint, scope, subject])
+            try:
+                allowed, retry_after = limiter.take(key, capacity, per_seconds)
+            except sqlite3.Error as e:
+                print(f"[Rate Limit Error] {e}")
+                return
+            if not allowed:
+                RATE_LIMITED.labels(request.endpoint, scope).inc()
+                return too_many_requests('Too many requests. Please slow down.', retry_after)
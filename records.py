@@ -0,0 +1,100 @@
+"""
+Records — Compact row objects for cached views and listing grids
+"""
+
+import zlib
+from typing import NamedTuple, Optional
+
+# product_ai_analysis columns, selected with an ``ai_`` prefix in joins
+AI_COLUMNS = ('id', 'product_id', 'blur_score', 'is_blurry', 'condition_label',
+              'condition_confidence', 'feedback_text', 'trust_score', 'analyzed_at')
+
+AI_SELECT = ', '.join(f'ai.{col} AS ai_{col}' for col in AI_COLUMNS)
+
+# Joined columns that change without touching products.updated_at
+_DISPLAY_COLUMNS = ('seller_name', 'seller_email', 'seller_department', 'seller_phone',
+                    'category_name', 'category_icon')
+
+
+def _stamp(value):
+    return int(value.timestamp()) if value else 0
+
+
+class ProductView(NamedTuple):
+    """Everything the product page renders, loaded by a single query."""
+    product: dict
+    ai_analysis: Optional[dict]
+    trust_info: Optional[dict]
+    etag: str
+    last_modified: object
+
+    @property
+    def seller_id(self):
+        return self.product['seller_id']
+
+    @classmethod
+    def from_row(cls, row, trust_label):
+        """Split a products/users/categories/ai join row into product and analysis parts."""
+        product = {k: v for k, v in row.items() if not k.startswith('ai_')}
+        ai_analysis = None
+        trust_info = None
+        if row['ai_id'] is not None:
+            ai_analysis = {col: row[f'ai_{col}'] for col in AI_COLUMNS}
+            trust_info = trust_label(ai_analysis['trust_score'])
+
+        # Validators: product and analysis timestamps, plus a checksum of
+        # the seller/category fields so profile or category edits show up
+        updated_at = product['updated_at']
+        analyzed_at = row['ai_analyzed_at']
+        display = zlib.crc32(repr([row[col] for col in _DISPLAY_COLUMNS]).encode())
+        etag = f"p{product['id']}-{_stamp(updated_at)}-{_stamp(analyzed_at)}-{display:08x}"
+        last_modified = max(filter(None, (updated_at, analyzed_at)), default=None)
+        return cls(product, ai_analysis, trust_info, etag, last_modified)
+
+
+# ─── Listing Cards ───────────────────────────────────────────────────
+# Columns any listing grid may show; queries select only the ones they need
+CARD_FIELDS = ('id', 'title', 'price', 'image_filename', 'item_condition', 'status',
+               'views_count', 'created_at', 'seller_id', 'seller_name', 'seller_email',
+               'category_name', 'category_icon', 'trust_score', 'condition_label',
+               'is_blurry')
+
+
+class ListingCard:
+    """One product card in a listing grid, with its trust label resolved once."""
+    __slots__ = CARD_FIELDS + ('trust_info',)
+
+    def __getitem__(self, name):
+        # Lets templates and helpers written for dict rows keep working
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def __getstate__(self):
+        return tuple(getattr(self, f) for f in self.__slots__)
+
+    def __setstate__(self, state):
+        for field, value in zip(self.__slots__, state):
+            setattr(self, field, value)
+
+    @classmethod
+    def from_row(cls, row, trust_label):
+        card = cls.__new__(cls)
+        for field in CARD_FIELDS:
+            setattr(card, field, row.get(field))
+        score = card.trust_score
+        card.trust_info = trust_label(score) if score is not None else None
+        return card
+
+
+def make_cards(rows, trust_label):
+    """Map listing rows to cards, computing each distinct trust label only once."""
+    labels = {}
+
+    def cached_label(score):
+        if score not in labels:
+            labels[score] = trust_label(score)
+        return labels[score]
+
+    return [ListingCard.from_row(row, cached_label) for row in rows]
@@ -0,0 +1,155 @@
+"""
+Daily Rollups — Incremental per-day, per-category aggregates
+Folds new products, sales, messages and AI analyses into daily_category_stats
+so dashboard trends never scan the source tables. Each source keeps a
+watermark in rollup_watermarks; a run only reads rows past it.
+
+Run from cron (e.g. every 5 minutes):  python rollups.py
+"""
+
+# Rows with no category are rolled up under category_id 0.
+# source -> (watermark column, SQL folding rows in (last, upper] into the rollup)
+_SOURCES = {
+    'products': ('last_id', """
+        INSERT INTO daily_category_stats (day, category_id, listings_created)
+        SELECT DATE(p.created_at), COALESCE(p.category_id, 0), COUNT(*)
+        FROM products p
+        WHERE p.id > %s AND p.id <= %s
+        GROUP BY DATE(p.created_at), COALESCE(p.category_id, 0)
+        ON DUPLICATE KEY UPDATE
+            listings_created = listings_created + VALUES(listings_created)
+    """),
+    'sales': ('last_ts', """
+        INSERT INTO daily_category_stats (day, category_id, sold_count, time_to_sold_sum)
+        SELECT DATE(p.sold_at), COALESCE(p.category_id, 0), COUNT(*),
+               SUM(TIMESTAMPDIFF(SECOND, p.created_at, p.sold_at))
+        FROM products p
+        WHERE p.sold_at > %s AND p.sold_at <= %s
+        GROUP BY DATE(p.sold_at), COALESCE(p.category_id, 0)
+        ON DUPLICATE KEY UPDATE
+            sold_count = sold_count + VALUES(sold_count),
+            time_to_sold_sum = time_to_sold_sum + VALUES(time_to_sold_sum)
+    """),
+    'messages': ('last_id', """
+        INSERT INTO daily_category_stats (day, category_id, messages_count)
+        SELECT DATE(m.created_at), COALESCE(p.category_id, 0), COUNT(*)
+        FROM messages m
+        LEFT JOIN products p ON p.id = m.product_id
+        WHERE m.id > %s AND m.id <= %s
+        GROUP BY DATE(m.created_at), COALESCE(p.category_id, 0)
+        ON DUPLICATE KEY UPDATE
+            messages_count = messages_count + VALUES(messages_count)
+    """),
+    'analyses': ('last_id', """
+        INSERT INTO daily_category_stats
+            (day, category_id, analyses_count, trust_sum, blurry_count)
+        SELECT DATE(ai.analyzed_at), COALESCE(p.category_id, 0), COUNT(*),
+               SUM(ai.trust_score), SUM(ai.is_blurry)
+        FROM product_ai_analysis ai
+        JOIN products p ON p.id = ai.product_id
+        WHERE ai.id > %s AND ai.id <= %s
+        GROUP BY DATE(ai.analyzed_at), COALESCE(p.category_id, 0)
+        ON DUPLICATE KEY UPDATE
+            analyses_count = analyses_count + VALUES(analyses_count),
+            trust_sum = trust_sum + VALUES(trust_sum),
+            blurry_count = blurry_count + VALUES(blurry_count)
+    """),
+}
+
+# Upper bound for the next batch of each source.
+# Ids and timestamps are assigned when a statement runs but become visible at
+# commit, so a row can appear below a watermark that has already passed it.
+# Every source stops a minute short of now, by which time the transactions
+# that wrote rows before the bound have ended.
+_UPPER_BOUNDS = {
+    'products': """SELECT COALESCE((SELECT id FROM products
+                                     WHERE created_at < NOW() - INTERVAL 1 MINUTE
+                                     ORDER BY id DESC LIMIT 1), 0) AS upper""",
+    'sales': "SELECT NOW() - INTERVAL 1 MINUTE AS upper",
+    'messages': """SELECT COALESCE((SELECT id FROM messages
+                                     WHERE created_at < NOW() - INTERVAL 1 MINUTE
+                                     ORDER BY id DESC LIMIT 1), 0) AS upper""",
+    'analyses': """SELECT COALESCE((SELECT id FROM product_ai_analysis
+                                     WHERE analyzed_at < NOW() - INTERVAL 1 MINUTE
+                                     ORDER BY id DESC LIMIT 1), 0) AS upper""",
+}
+
+
+def _roll_source(transaction, source):
+    """Fold one source past its watermark. Returns MySQL's affected-row count."""
+    column, fold_sql = _SOURCES[source]
+    with transaction() as cur:
+        cur.execute("INSERT IGNORE INTO rollup_watermarks (source) VALUES (%s)", (source,))
+        cur.execute(f"SELECT {column} AS mark FROM rollup_watermarks "
+                    "WHERE source = %s FOR UPDATE", (source,))
+        last = cur.fetchone()['mark']
+        cur.execute(_UPPER_BOUNDS[source])
+        upper = cur.fetchone()['upper']
+        if upper is None or upper <= last:
+            return 0
+        count = cur.execute(fold_sql, (last, upper))
+        cur.execute(f"UPDATE rollup_watermarks SET {column} = %s WHERE source = %s",
+                    (upper, source))
+    return count
+
+
+def run_rollup(transaction):
+    """Fold all new activity into daily_category_stats. Safe to run concurrently."""
+    return {source: _roll_source(transaction, source) for source in _SOURCES}
+
+
+# ─── Chart Series ────────────────────────────────────────────────────
+# metric -> (numerator column, denominator column or None for a plain count, scale)
+METRICS = {
+    'listings': ('listings_created', None, 1),
+    'sold': ('sold_count', None, 1),
+    'messages': ('messages_count', None, 1),
+    'analyses': ('analyses_count', None, 1),
+    'sell_through': ('sold_count', 'listings_created', 1),
+    'time_to_sold_hours': ('time_to_sold_sum', 'sold_count', 1 / 3600),
+    'avg_trust': ('trust_sum', 'analyses_count', 1),
+    'blurry_rate': ('blurry_count', 'analyses_count', 1),
+}
+
+
+def _ratio(num, den, scale):
+    if den is None:
+        return int(num)
+    return round(num * scale / den, 2) if den else None
+
+
+def build_series(rows, metric, start, days):
+    """Turn rollup rows into dense per-category and total arrays, one value per day.
+
+    ``rows`` carry ``day``, ``category_id``, ``num`` and ``den`` columns.
+    """
+    num_col, den_col, scale = METRICS[metric]
+    per_category = {}
+    totals_num = [0] * days
+    totals_den = [0] * days
+    for row in rows:
+        idx = (row['day'] - start).days
+        if not 0 <= idx < days:
+            continue
+        num = float(row['num'] or 0)
+        den = float(row['den'] or 0) if den_col else None
+        nums, dens = per_category.setdefault(row['category_id'], ([0] * days, [0] * days))
+        nums[idx] += num
+        totals_num[idx] += num
+        if den_col:
+            dens[idx] += den
+            totals_den[idx] += den
+
+    def finish(nums, dens):
+        return [_ratio(n, d if den_col else None, scale) for n, d in zip(nums, dens)]
+
+    return {
+        'series': {str(cat): finish(n, d) for cat, (n, d) in per_category.items()},
+        'total': finish(totals_num, totals_den),
+    }
+
+
+if __name__ == '__main__':
+    from db import transaction
+    counts = run_rollup(transaction)
+    print("✅ Rollup complete: " + ", ".join(f"{k}={v}" for k, v in counts.items()))
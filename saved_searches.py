@@ -0,0 +1,147 @@
+"""
+Saved Searches — Reverse-indexed queries and a notification feed
+A saved search is the homepage's search text and category. Its words go
+into saved_search_terms (term → search), so a new listing is matched by
+looking up the listing's own words instead of re-running every stored
+query. A search matches when all of its words appear in the title or
+description (whole words, unlike the homepage's substring search) and
+its category, if any, is the listing's.
+
+Matches land in search_notifications. Each user's newest notification id
+is kept in the shared cache, so a poll that has already seen it costs no
+MySQL query at all. The cached id only ever rises, so a poll that read
+MAX(id) before a match committed cannot store a stale value over it.
+"""
+
+import re
+
+from flask import current_app
+
+_WORD = re.compile(r'[a-z0-9]+')
+MAX_TERM = 50
+
+
+def terms(text):
+    """Distinct lowercase words of ``text``, as stored in the reverse index."""
+    return sorted({word[:MAX_TERM] for word in _WORD.findall((text or '').lower())})
+
+
+def _latest_key(user_id):
+    return f'notify:{user_id}'
+
+
+# ─── Saving ──────────────────────────────────────────────────────────
+def save_search(transaction, user_id, query_text, category_id, limit):
+    """Store a search and index its words. Returns the new id, or None over ``limit``."""
+    words = terms(query_text)
+    with transaction() as cur:
+        cur.execute("SELECT COUNT(*) AS n FROM saved_searches WHERE user_id = %s FOR UPDATE",
+                    (user_id,))
+        if cur.fetchone()['n'] >= limit:
+            return None
+        cur.execute(
+            """INSERT INTO saved_searches (user_id, query_text, category_id, term_count)
+               VALUES (%s, %s, %s, %s)""",
+            (user_id, query_text, category_id, len(words))
+        )
+        search_id = cur.lastrowid
+        cur.executemany("INSERT INTO saved_search_terms (term, search_id) VALUES (%s, %s)",
+                        [(word, search_id) for word in words])
+    return search_id
+
+
+def delete_search(query_db, user_id, search_id):
+    """Remove one of the user's searches; its terms and notifications cascade."""
+    query_db("DELETE FROM saved_searches WHERE id = %s AND user_id = %s",
+             (search_id, user_id), commit=True)
+
+
+# ─── Matching ────────────────────────────────────────────────────────
+def match_product(query_db, transaction, product_id, seller_id, title, description, category_id):
+    """Notify owners of saved searches the new listing satisfies. Returns the match count."""
+    words = terms(f'{title} {description}')
+    matches = []
+    if words:
+        # Every stored word must be among the listing's words
+        placeholders = ', '.join(['%s'] * len(words))
+        matches += query_db(
+            f"""SELECT s.id, s.user_id FROM saved_search_terms t
+                JOIN saved_searches s ON s.id = t.search_id
+                WHERE t.term IN ({placeholders})
+                  AND (s.category_id IS NULL OR s.category_id = %s)
+                GROUP BY s.id, s.user_id, s.term_count
+                HAVING COUNT(*) = s.term_count""",
+            words + [category_id or 0]
+        )
+    if category_id:
+        # Category-only searches have no words to look up
+        matches += query_db(
+            """SELECT id, user_id FROM saved_searches
+               WHERE term_count = 0 AND category_id = %s""",
+            (category_id,)
+        )
+    matches = [m for m in matches if m['user_id'] != seller_id]
+    if not matches:
+        return 0
+
+    with transaction() as cur:
+        cur.executemany(
+            """INSERT INTO search_notifications (user_id, search_id, product_id)
+               VALUES (%s, %s, %s)""",
+            [(m['user_id'], m['id'], product_id) for m in matches]
+        )
+        users = sorted({m['user_id'] for m in matches})
+        cur.execute(
+            f"""SELECT user_id, MAX(id) AS latest FROM search_notifications
+                WHERE user_id IN ({', '.join(['%s'] * len(users))}) GROUP BY user_id""",
+            users
+        )
+        latest = cur.fetchall()
+    cache = current_app.extensions['shared_cache']
+    for row in latest:
+        cache.set_max(_latest_key(row['user_id']), row['latest'])
+    return len(matches)
+
+
+def notify_matches(query_db, transaction, product_id, seller_id, title, description, category_id):
+    """match_product for add_product. Failures only cost notifications."""
+    try:
+        return match_product(query_db, transaction, product_id, seller_id,
+                             title, description, category_id)
+    except Exception as e:
+        print(f"[Saved Search Error] {e}")
+        return 0
+
+
+# ─── Feed ────────────────────────────────────────────────────────────
+def latest_notification_id(query_db, user_id):
+    """Newest notification id for the user (0 if none), from the shared cache."""
+    cache = current_app.extensions['shared_cache']
+    latest = cache.get(_latest_key(user_id))
+    if latest is None:
+        latest = cache.set_max(_latest_key(user_id), query_db(
+            "SELECT COALESCE(MAX(id), 0) AS latest FROM search_notifications WHERE user_id = %s",
+            (user_id,), one=True)['latest'])
+    return latest
+
+
+def notifications_after(query_db, user_id, after_id, limit):
+    """The user's notifications newer than ``after_id``, newest first."""
+    if after_id >= latest_notification_id(query_db, user_id):
+        return []
+    return query_db(
+        """SELECT n.id, n.product_id, n.is_read, n.created_at,
+                  s.query_text, p.title, p.price, p.image_filename
+           FROM search_notifications n
+           JOIN saved_searches s ON s.id = n.search_id
+           JOIN products p ON p.id = n.product_id
+           WHERE n.user_id = %s AND n.id > %s AND p.status = 'available'
+           ORDER BY n.id DESC LIMIT %s""",
+        (user_id, after_id, limit)
+    )
+
+
+def mark_read(query_db, user_id, up_to_id):
+    query_db("""UPDATE search_notifications SET is_read = TRUE
+                WHERE user_id = %s AND id <= %s AND is_read = FALSE""",
+             (user_id, up_to_id), commit=True)
@@ -54,7 +54,10 @@ CREATE TABLE IF NOT EXISTS products (
     status ENUM('available', 'sold', 'removed') DEFAULT 'available',
     image_filename VARCHAR(255),
     views_count INT DEFAULT 0,
+    image_hash BIGINT UNSIGNED DEFAULT NULL,
+    duplicate_of INT DEFAULT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sold_at TIMESTAMP NULL DEFAULT NULL,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (seller_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE SET NULL
@@ -76,27 +79,240 @@ CREATE TABLE IF NOT EXISTS product_ai_analysis (
     FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
 );
 
+-- ---------------------------------------------------
+-- Near-Duplicate Photo Clusters (rebuilt by dupes.py --cluster)
+-- cluster_id = oldest product id in the cluster
+-- No foreign key: members may be archived (products_archive)
+-- ---------------------------------------------------
+CREATE TABLE IF NOT EXISTS duplicate_clusters (
+    product_id INT PRIMARY KEY,
+    cluster_id INT NOT NULL
+);
+
 -- ---------------------------------------------------
 -- Messages (Buyer-Seller Communication)
+-- Range-partitioned by month; conversations.py --maintain splits pmax
+-- into monthly partitions ahead of time. Partitioned tables cannot have
+-- foreign keys: deleting a user deletes their messages explicitly, and
+-- product_id keeps pointing at archived listings.
 -- ---------------------------------------------------
 CREATE TABLE IF NOT EXISTS messages (
-    id INT AUTO_INCREMENT PRIMARY KEY,
+    id INT AUTO_INCREMENT,
     sender_id INT NOT NULL,
     receiver_id INT NOT NULL,
     product_id INT,
     message_text TEXT NOT NULL,
     is_read BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+)
+PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) (
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- One summary row per (user pair, product); user_low < user_high,
+-- product_id 0 = no product. live_since bounds chat queries for pruning.
+CREATE TABLE IF NOT EXISTS conversations (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_low INT NOT NULL,
+    user_high INT NOT NULL,
+    product_id INT NOT NULL DEFAULT 0,
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    live_since TIMESTAMP NULL DEFAULT NULL,
+    last_message_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_message VARCHAR(255),
+    last_sender_id INT,
+    message_count INT DEFAULT 0,
+    unread_low INT DEFAULT 0,
+    unread_high INT DEFAULT 0,
+    archived BOOLEAN DEFAULT FALSE,
+    UNIQUE KEY uq_conversation (user_low, user_high, product_id),
+    FOREIGN KEY (user_low) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_high) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Compacted closed conversations: zlib-compressed JSON, read on demand
+CREATE TABLE IF NOT EXISTS message_archives (
+    conversation_id INT PRIMARY KEY,
+    message_count INT NOT NULL,
+    first_at TIMESTAMP NULL DEFAULT NULL,
+    last_at TIMESTAMP NULL DEFAULT NULL,
+    payload MEDIUMBLOB NOT NULL,
+    FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
+);
+
+-- ---------------------------------------------------
+-- Seller Statistics (denormalized, maintained by seller_stats.py)
+-- ---------------------------------------------------
+CREATE TABLE IF NOT EXISTS seller_stats (
+    seller_id INT PRIMARY KEY,
+    listing_count INT DEFAULT 0,
+    active_count INT DEFAULT 0,
+    sold_count INT DEFAULT 0,
+    total_views INT DEFAULT 0,
+    avg_trust FLOAT DEFAULT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (seller_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- ---------------------------------------------------
+-- Daily Rollups (maintained incrementally by rollups.py)
+-- category_id 0 = uncategorized
+-- ---------------------------------------------------
+CREATE TABLE IF NOT EXISTS daily_category_stats (
+    day DATE NOT NULL,
+    category_id INT NOT NULL DEFAULT 0,
+    listings_created INT DEFAULT 0,
+    sold_count INT DEFAULT 0,
+    time_to_sold_sum BIGINT DEFAULT 0,
+    messages_count INT DEFAULT 0,
+    analyses_count INT DEFAULT 0,
+    trust_sum BIGINT DEFAULT 0,
+    blurry_count INT DEFAULT 0,
+    PRIMARY KEY (day, category_id)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+    source VARCHAR(30) PRIMARY KEY,
+    last_id INT DEFAULT 0,
+    last_ts DATETIME DEFAULT '2000-01-01 00:00:00',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- ---------------------------------------------------
+-- Price Distributions (t-digests maintained by price_stats.py)
+-- category_id 0 = uncategorized, item_condition '*' = all conditions
+-- ---------------------------------------------------
+CREATE TABLE IF NOT EXISTS price_digests (
+    category_id INT NOT NULL DEFAULT 0,
+    item_condition VARCHAR(20) NOT NULL,
+    kind ENUM('listed', 'sold', 'days_to_sold') NOT NULL,
+    digest BLOB NOT NULL,
+    samples INT DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (category_id, item_condition, kind)
+);
+
+-- ---------------------------------------------------
+-- Saved Searches (saved_searches.py)
+-- saved_search_terms is the reverse index: word -> saved searches
+-- ---------------------------------------------------
+CREATE TABLE IF NOT EXISTS saved_searches (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    query_text VARCHAR(200) NOT NULL DEFAULT '',
+    category_id INT DEFAULT NULL,
+    term_count INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS saved_search_terms (
+    term VARCHAR(50) NOT NULL,
+    search_id INT NOT NULL,
+    PRIMARY KEY (term, search_id),
+    FOREIGN KEY (search_id) REFERENCES saved_searches(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS search_notifications (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    search_id INT NOT NULL,
+    product_id INT NOT NULL,
+    is_read BOOLEAN DEFAULT FALSE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (sender_id) REFERENCES users(id) ON DELETE CASCADE,
-    FOREIGN KEY (receiver_id) REFERENCES users(id) ON DELETE CASCADE,
-    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE SET NULL
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (search_id) REFERENCES saved_searches(id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+);
+
+-- ---------------------------------------------------
+-- Trending Scores (decayed engagement, maintained by trending.py)
+-- log_score = ln(sum of weight * exp((t - epoch) / tau)); category_id 0 = uncategorized
+-- ---------------------------------------------------
+CREATE TABLE IF NOT EXISTS product_trending (
+    product_id INT PRIMARY KEY,
+    category_id INT NOT NULL DEFAULT 0,
+    log_score DOUBLE NOT NULL,
+    trust_boost DOUBLE NOT NULL DEFAULT 0,
+    rank_score DOUBLE NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+);
+
+-- ---------------------------------------------------
+-- Archived Listings (cold tier, filled by archive.py)
+-- Same ids and columns as products / product_ai_analysis
+-- ---------------------------------------------------
+CREATE TABLE IF NOT EXISTS products_archive (
+    id INT PRIMARY KEY,
+    seller_id INT NOT NULL,
+    title VARCHAR(200) NOT NULL,
+    description TEXT,
+    price DECIMAL(10, 2) NOT NULL,
+    category_id INT,
+    item_condition ENUM('New', 'Like New', 'Used', 'Heavily Used') DEFAULT 'Used',
+    status ENUM('available', 'sold', 'removed') DEFAULT 'sold',
+    image_filename VARCHAR(255),
+    views_count INT DEFAULT 0,
+    image_hash BIGINT UNSIGNED DEFAULT NULL,
+    duplicate_of INT DEFAULT NULL,
+    created_at TIMESTAMP NULL DEFAULT NULL,
+    sold_at TIMESTAMP NULL DEFAULT NULL,
+    updated_at TIMESTAMP NULL DEFAULT NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (seller_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE SET NULL
+);
+
+CREATE TABLE IF NOT EXISTS product_ai_analysis_archive (
+    id INT PRIMARY KEY,
+    product_id INT NOT NULL UNIQUE,
+    blur_score FLOAT DEFAULT 0.0,
+    is_blurry BOOLEAN DEFAULT FALSE,
+    condition_label VARCHAR(30) DEFAULT 'Unknown',
+    condition_confidence FLOAT DEFAULT 0.0,
+    feedback_text TEXT,
+    trust_score INT DEFAULT 0,
+    analyzed_at TIMESTAMP NULL DEFAULT NULL,
+    FOREIGN KEY (product_id) REFERENCES products_archive(id) ON DELETE CASCADE
+);
+
+-- ---------------------------------------------------
+-- Cache Versions (bumped on writes to invalidate cached results)
+-- ---------------------------------------------------
+CREATE TABLE IF NOT EXISTS cache_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
 );
 
 -- ---------------------------------------------------
 -- Indexes for Performance
 -- ---------------------------------------------------
+CREATE INDEX idx_users_name ON users(full_name);
 CREATE INDEX idx_products_seller ON products(seller_id);
 CREATE INDEX idx_products_category ON products(category_id);
 CREATE INDEX idx_products_status ON products(status);
-CREATE INDEX idx_messages_receiver ON messages(receiver_id);
+CREATE INDEX idx_products_sold_at ON products(sold_at);
+CREATE INDEX idx_products_lifecycle ON products(status, updated_at);
+CREATE INDEX idx_products_duplicate ON products(duplicate_of);
+CREATE INDEX idx_messages_receiver ON messages(receiver_id, is_read);
+CREATE INDEX idx_messages_pair ON messages(sender_id, receiver_id, created_at);
+CREATE INDEX idx_conversations_low ON conversations(user_low, last_message_at);
+CREATE INDEX idx_conversations_high ON conversations(user_high, last_message_at);
 CREATE INDEX idx_ai_product ON product_ai_analysis(product_id);
+CREATE INDEX idx_ai_analyzed ON product_ai_analysis(analyzed_at);
+CREATE INDEX idx_ai_trust ON product_ai_analysis(trust_score);
+CREATE INDEX idx_ai_blur ON product_ai_analysis(blur_score);
+CREATE INDEX idx_ai_blurry ON product_ai_analysis(is_blurry, analyzed_at);
+CREATE INDEX idx_ai_condition ON product_ai_analysis(condition_label, analyzed_at);
+CREATE INDEX idx_duplicate_cluster ON duplicate_clusters(cluster_id);
+CREATE INDEX idx_saved_searches_user ON saved_searches(user_id);
+CREATE INDEX idx_saved_searches_category ON saved_searches(category_id, term_count);
+CREATE INDEX idx_notifications_user ON search_notifications(user_id, id);
+CREATE INDEX idx_trending_rank ON product_trending(rank_score);
+CREATE INDEX idx_trending_category ON product_trending(category_id, rank_score);
+CREATE INDEX idx_archive_seller ON products_archive(seller_id);
+CREATE INDEX idx_archive_category ON products_archive(category_id);
@@ -0,0 +1,332 @@
+"""
+Seed Data — Synthetic production-scale dataset
+Generates users, products (backed by a pool of generated images), AI
+analyses and message threads with realistic skew: a few power sellers
+own most listings, a few products draw most views and chats, and some
+conversations run long. Rows are bulk loaded with LOAD DATA LOCAL INFILE
+(or batched executemany) while secondary indexes are dropped, then the
+indexes, seller_stats and the catalog cache version are rebuilt.
+
+    python seed_data.py --users 100000 --products 1000000 --threads 300000
+    python seed_data.py --method executemany --products 50000
+
+Run setup_db.py first. Rows are appended after the current max ids, so
+seeding an existing database keeps its data.
+"""
+
+import argparse
+import os
+import random
+import re
+import tempfile
+import time
+from array import array
+from datetime import datetime, timedelta
+
+import pymysql
+from PIL import Image, ImageDraw, ImageFilter
+from werkzeug.security import generate_password_hash
+
+from cache import bump_version
+from config import Config
+from conversations import rebuild_conversations
+from seller_stats import rebuild_seller_stats
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+_INDEX_RE = re.compile(r'^CREATE INDEX (\w+) ON (\w+)\((.+)\);', re.M)
+
+DEPARTMENTS = ('Computer Science', 'Mechanical', 'Electrical', 'Civil', 'Chemistry',
+               'Physics', 'Mathematics', 'Economics', 'Biotechnology', 'Architecture')
+FIRST_NAMES = ('Aarav', 'Diya', 'Rahul', 'Priya', 'Arjun', 'Ananya', 'Vikram', 'Sneha',
+               'Karan', 'Meera', 'Rohan', 'Isha', 'Aditya', 'Kavya', 'Nikhil', 'Pooja')
+LAST_NAMES = ('Sharma', 'Patel', 'Iyer', 'Reddy', 'Singh', 'Gupta', 'Nair', 'Das',
+              'Mehta', 'Joshi', 'Rao', 'Khan', 'Verma', 'Menon', 'Bose', 'Kulkarni')
+# (category_id, nouns, price range)
+CATALOG = (
+    (1, ('Textbook', 'Novel', 'Lab Manual', 'Reference Guide', 'GATE Prep Book'), (80, 1500)),
+    (2, ('Laptop', 'Calculator', 'Headphones', 'Monitor', 'Phone', 'Keyboard'), (300, 60000)),
+    (3, ('Hoodie', 'Lab Coat', 'Jacket', 'Sneakers', 'Formal Shirt'), (150, 3000)),
+    (4, ('Study Table', 'Chair', 'Bookshelf', 'Mattress', 'Lamp'), (200, 8000)),
+    (5, ('Cricket Bat', 'Football', 'Badminton Racket', 'Cycle', 'Yoga Mat'), (100, 12000)),
+    (6, ('Drafting Kit', 'Notes Bundle', 'Pen Set', 'Graph Book', 'Whiteboard'), (20, 1200)),
+    (7, ('Watch', 'Backpack', 'Water Bottle', 'Sunglasses', 'Power Bank'), (100, 5000)),
+    (8, ('Guitar', 'Board Game', 'Plant', 'Kettle', 'Extension Board'), (50, 6000)),
+)
+ADJECTIVES = ('Barely used', 'Good condition', 'Like new', 'Slightly worn', 'Well kept',
+              'Gently used', 'Almost new', 'Old but working')
+MESSAGES = ('Hi, is this still available?', 'Can you do a lower price?', 'Where can we meet?',
+            'Is the price negotiable?', 'I can pick it up tomorrow.', 'Sure, that works.',
+            'Does it have any scratches?', 'Can you share more photos?', 'Deal!',
+            'I will be near the library at 5.', 'Sorry, it is sold.', 'Thanks!')
+
+USER_COLUMNS = ('id', 'full_name', 'email', 'password_hash', 'phone', 'department', 'role',
+                'created_at')
+PRODUCT_COLUMNS = ('id', 'seller_id', 'title', 'description', 'price', 'category_id',
+                   'item_condition', 'status', 'image_filename', 'views_count', 'created_at',
+                   'sold_at')
+AI_COLUMNS = ('product_id', 'blur_score', 'is_blurry', 'condition_label',
+              'condition_confidence', 'feedback_text', 'trust_score', 'analyzed_at')
+MESSAGE_COLUMNS = ('sender_id', 'receiver_id', 'product_id', 'message_text', 'is_read',
+                   'created_at')
+
+
+def skewed(rng, n, power):
+    """Index in [0, n) biased towards 0; higher ``power`` means heavier skew."""
+    return min(int(n * rng.random() ** power), n - 1)
+
+
+# ─── Images ──────────────────────────────────────────────────────────
+def generate_images(folder, count, rng, blur_threshold):
+    """Write ``count`` product photos; returns [(filename, blur_score)]."""
+    os.makedirs(folder, exist_ok=True)
+    images = []
+    for i in range(count):
+        img = Image.new('RGB', (480, 360), tuple(rng.randrange(120, 255) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        for _ in range(rng.randint(3, 8)):
+            x0, x1 = sorted(rng.sample(range(480), 2))
+            y0, y1 = sorted(rng.sample(range(360), 2))
+            draw.rectangle((x0, y0, x1, y1), fill=tuple(rng.randrange(256) for _ in range(3)))
+        # About one photo in six is out of focus
+        blurry = rng.random() < 0.16
+        if blurry:
+            img = img.filter(ImageFilter.GaussianBlur(rng.uniform(3, 8)))
+        blur_score = (rng.uniform(10, blur_threshold * 0.9) if blurry
+                      else rng.uniform(blur_threshold * 1.2, blur_threshold * 12))
+        filename = f'seed_{i:05d}.jpg'
+        img.save(os.path.join(folder, filename), quality=80)
+        images.append((filename, round(blur_score, 2)))
+    return images
+
+
+# ─── Row Generators ──────────────────────────────────────────────────
+def user_rows(rng, first_id, count, password_hash, now, days):
+    for uid in range(first_id, first_id + count):
+        name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+        yield (uid, name, f'seed{uid}@campus.edu', password_hash,
+               f'9{rng.randrange(10 ** 9):09d}', rng.choice(DEPARTMENTS),
+               'staff' if rng.random() < 0.05 else 'student',
+               now - timedelta(seconds=rng.randrange(days * 86400)))
+
+
+def product_rows(rng, first_id, count, sellers, images, now, days, out):
+    """Products plus their AI analyses; records seller and age per product in ``out``."""
+    seller_count = len(sellers)
+    for pid in range(first_id, first_id + count):
+        seller = sellers[skewed(rng, seller_count, 3)]
+        category_id, nouns, (low, high) = rng.choice(CATALOG)
+        noun = rng.choice(nouns)
+        created = now - timedelta(seconds=rng.randrange(days * 86400))
+        status = rng.choices(('available', 'sold', 'removed'), (70, 25, 5))[0]
+        sold_at = (created + timedelta(seconds=rng.randrange(1, 30 * 86400))
+                   if status == 'sold' else None)
+        if sold_at and sold_at > now:
+            sold_at = now
+        condition = rng.choice(Config.ITEM_CONDITIONS)
+        image, blur_score = rng.choice(images)
+        # Pareto views: most listings get a handful, a few go viral
+        views = int(rng.paretovariate(1.2) * 5) - 5
+        out['sellers'].append(seller)
+        out['ages'].append(int((now - created).total_seconds()))
+        product = (pid, seller, f'{noun} - {rng.choice(ADJECTIVES)}',
+                   f'{rng.choice(ADJECTIVES)} {noun.lower()}. Pick up on campus.',
+                   round(rng.uniform(low, high), -1) or low, category_id, condition, status,
+                   image, views, created, sold_at)
+        analysis = None
+        if rng.random() < 0.9:
+            is_blurry = blur_score < Config.BLUR_THRESHOLD
+            trust = max(5, min(100, int(rng.gauss(45 if is_blurry else 75, 12))))
+            analysis = (pid, blur_score, int(is_blurry), condition,
+                        round(rng.uniform(0.55, 0.99), 3),
+                        'Image is blurry, consider retaking.' if is_blurry else 'Clear image.',
+                        trust, created + timedelta(seconds=rng.randrange(1, 30)))
+        yield product, analysis
+
+
+def message_rows(rng, threads, first_product, products, now):
+    """Conversations about (mostly popular) products with log-normal lengths."""
+    product_count = len(products['sellers'])
+    for _ in range(threads):
+        idx = skewed(rng, product_count, 2.5)
+        seller = products['sellers'][idx]
+        buyer = products['buyers'][skewed(rng, len(products['buyers']), 1.5)]
+        if buyer == seller:
+            continue
+        length = max(1, min(400, int(rng.lognormvariate(1.5, 1.0))))
+        age = products['ages'][idx]
+        at = now - timedelta(seconds=rng.randrange(max(age, 1)))
+        for n in range(length):
+            sender, receiver = (buyer, seller) if n % 2 == 0 else (seller, buyer)
+            at += timedelta(seconds=rng.randrange(30, 6 * 3600))
+            if at > now:
+                break
+            yield (sender, receiver, first_product + idx, rng.choice(MESSAGES),
+                   int(rng.random() < 0.85), at)
+
+
+# ─── Loading ─────────────────────────────────────────────────────────
+def _tsv(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n'))
+
+
+class Loader:
+    """Buffers rows per table and writes them in batches."""
+
+    def __init__(self, conn, method, batch_size):
+        self.conn = conn
+        self.method = method
+        self.batch_size = batch_size
+        self.buffers = {}
+        self.counts = {}
+
+    def add(self, table, columns, row):
+        rows = self.buffers.setdefault((table, columns), [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush(table, columns)
+
+    def flush(self, table, columns):
+        rows = self.buffers.get((table, columns))
+        if not rows:
+            return
+        cols = ', '.join(columns)
+        with self.conn.cursor() as cur:
+            if self.method == 'infile':
+                with tempfile.NamedTemporaryFile('w', suffix='.tsv', delete=False,
+                                                 encoding='utf-8') as f:
+                    for row in rows:
+                        f.write('\t'.join(_tsv(v) for v in row) + '\n')
+                try:
+                    cur.execute(f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} "
+                                f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' "
+                                f"LINES TERMINATED BY '\\n' ({cols})", (f.name,))
+                finally:
+                    os.remove(f.name)
+            else:
+                placeholders = ', '.join(['%s'] * len(columns))
+                cur.executemany(f"INSERT INTO {table} ({cols}) VALUES ({placeholders})", rows)
+        self.conn.commit()
+        self.counts[table] = self.counts.get(table, 0) + len(rows)
+        rows.clear()
+
+    def flush_all(self):
+        for table, columns in list(self.buffers):
+            self.flush(table, columns)
+
+
+def secondary_indexes(tables):
+    """(name, table, columns) of the schema's CREATE INDEX statements for ``tables``."""
+    with open(SCHEMA_PATH) as f:
+        return [m for m in _INDEX_RE.findall(f.read()) if m[1] in tables]
+
+
+def drop_indexes(cur, indexes):
+    """Drop what can be dropped; indexes backing a foreign key stay in place."""
+    dropped = []
+    for name, table, columns in indexes:
+        try:
+            cur.execute(f"ALTER TABLE {table} DROP INDEX {name}")
+            dropped.append((name, table, columns))
+        except pymysql.err.MySQLError as e:
+            print(f"   keeping {table}.{name}: {e.args[-1]}")
+    return dropped
+
+
+def create_indexes(cur, indexes):
+    # One ALTER per table builds all of its indexes in a single pass
+    by_table = {}
+    for name, table, columns in indexes:
+        by_table.setdefault(table, []).append(f"ADD INDEX {name} ({columns})")
+    for table, clauses in by_table.items():
+        cur.execute(f"ALTER TABLE {table} {', '.join(clauses)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate and bulk load a synthetic dataset.')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--threads', type=int, default=30000, help='message conversations')
+    parser.add_argument('--images', type=int, default=200, help='distinct generated photos')
+    parser.add_argument('--days', type=int, default=365, help='history to spread rows over')
+    parser.add_argument('--method', choices=('infile', 'executemany'), default='infile')
+    parser.add_argument('--batch', type=int, default=20000, help='rows per load batch')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    now = datetime.now().replace(microsecond=0)
+    conn = pymysql.connect(host=Config.MYSQL_HOST, user=Config.MYSQL_USER,
+                           password=Config.MYSQL_PASSWORD, database=Config.MYSQL_DB,
+                           port=Config.MYSQL_PORT, charset='utf8mb4',
+                           local_infile=args.method == 'infile')
+    started = time.time()
+
+    print(f"🖼  Generating {args.images} product images...")
+    images = generate_images(Config.UPLOAD_FOLDER, args.images, rng, Config.BLUR_THRESHOLD)
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM users")
+        first_user = cur.fetchone()[0] + 1
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM products")
+        first_product = cur.fetchone()[0] + 1
+        cur.execute("SET SESSION unique_checks = 0, foreign_key_checks = 0")
+        print("🔧 Dropping secondary indexes...")
+        indexes = drop_indexes(cur, secondary_indexes(
+            {'users', 'products', 'product_ai_analysis', 'messages'}))
+
+    loader = Loader(conn, args.method, args.batch)
+    try:
+        print(f"👤 Loading {args.users} users...")
+        password_hash = generate_password_hash('Seed1234')
+        for row in user_rows(rng, first_user, args.users, password_hash, now, args.days):
+            loader.add('users', USER_COLUMNS, row)
+        loader.flush_all()
+
+        print(f"📦 Loading {args.products} products and analyses...")
+        users = array('i', range(first_user, first_user + args.users))
+        # Sellers are a shuffled subset so power sellers are not just the oldest accounts
+        sellers = array('i', rng.sample(users, max(1, len(users) * 2 // 5)))
+        products = {'sellers': array('i'), 'ages': array('i'), 'buyers': users}
+        for product, analysis in product_rows(rng, first_product, args.products, sellers,
+                                              images, now, args.days, products):
+            loader.add('products', PRODUCT_COLUMNS, product)
+            if analysis:
+                loader.add('product_ai_analysis', AI_COLUMNS, analysis)
+        loader.flush_all()
+
+        print(f"💬 Loading {args.threads} message threads...")
+        for row in message_rows(rng, args.threads, first_product, products, now):
+            loader.add('messages', MESSAGE_COLUMNS, row)
+        loader.flush_all()
+    finally:
+        with conn.cursor() as cur:
+            print("🔧 Rebuilding secondary indexes...")
+            create_indexes(cur, indexes)
+            cur.execute("SET SESSION unique_checks = 1, foreign_key_checks = 1")
+
+    def query_db(query, args=(), commit=False):
+        with conn.cursor() as cur:
+            cur.execute(query, args)
+        if commit:
+            conn.commit()
+
+    rebuild_seller_stats(query_db)
+    rebuild_conversations(query_db)
+    bump_version(query_db)
+    conn.close()
+
+    elapsed = time.time() - started
+    total = sum(loader.counts.values())
+    print("✅ Seeded " + ", ".join(f"{t}={n}" for t, n in loader.counts.items())
+          + f" in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)")
+    print("   Run rollups.py to fold the new rows into the admin time series, and")
+    print("   conversations.py --maintain to split messages into monthly partitions.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Seller Statistics — Denormalized per-seller counters
+Keeps the seller_stats table in step with products so the admin user list
+can join one row per user instead of counting products per row.
+Archived listings still count towards their seller.
+"""
+
+from archive import with_archive
+
+# One row per listing in either tier, filtered to the sellers being refreshed
+_LISTINGS = """
+    SELECT p.id, p.seller_id, p.status, p.views_count, ai.trust_score
+    FROM {products} p
+    LEFT JOIN {ai} ai ON ai.product_id = p.id
+"""
+
+_UPSERT_TAIL = """
+    ON DUPLICATE KEY UPDATE
+        listing_count = VALUES(listing_count),
+        active_count = VALUES(active_count),
+        sold_count = VALUES(sold_count),
+        total_views = VALUES(total_views),
+        avg_trust = VALUES(avg_trust)
+"""
+
+
+def refresh_seller_stats(query_db, seller_id):
+    """Recompute one seller's row. Call after a product insert, status change or delete."""
+    refresh_sellers(query_db, [seller_id])
+
+
+def refresh_sellers(query_db, seller_ids):
+    """Recompute the rows of several sellers in one statement."""
+    seller_ids = sorted(set(seller_ids))
+    if not seller_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(seller_ids))
+    listings, params = with_archive(_LISTINGS + f"WHERE p.seller_id IN ({placeholders})",
+                                    seller_ids)
+    query_db(
+        f"""INSERT INTO seller_stats
+               (seller_id, listing_count, active_count, sold_count, total_views, avg_trust)
+            SELECT u.id, COUNT(p.id),
+                   COALESCE(SUM(p.status = 'available'), 0),
+                   COALESCE(SUM(p.status = 'sold'), 0),
+                   COALESCE(SUM(p.views_count), 0),
+                   AVG(p.trust_score)
+            FROM users u
+            LEFT JOIN ({listings}) p ON p.seller_id = u.id
+            WHERE u.id IN ({placeholders})
+            GROUP BY u.id""" + _UPSERT_TAIL,
+        params + seller_ids, commit=True
+    )
+
+
+def rebuild_seller_stats(query_db):
+    """Rebuild every seller's row from scratch (backfill or repair)."""
+    listings, _ = with_archive(_LISTINGS)
+    query_db(
+        f"""INSERT INTO seller_stats
+               (seller_id, listing_count, active_count, sold_count, total_views, avg_trust)
+            SELECT p.seller_id, COUNT(p.id),
+                   COALESCE(SUM(p.status = 'available'), 0),
+                   COALESCE(SUM(p.status = 'sold'), 0),
+                   COALESCE(SUM(p.views_count), 0),
+                   AVG(p.trust_score)
+            FROM ({listings}) p
+            GROUP BY p.seller_id""" + _UPSERT_TAIL,
+        commit=True
+    )
+
+
+if __name__ == '__main__':
+    from db import query_db
+    rebuild_seller_stats(query_db)
+    print("✅ seller_stats rebuilt")
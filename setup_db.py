@@ -72,13 +72,22 @@ CREATE TABLE IF NOT EXISTS products (
     status ENUM('available', 'sold', 'removed') DEFAULT 'available',
     image_filename VARCHAR(255),
     views_count INT DEFAULT 0,
+    image_hash BIGINT UNSIGNED DEFAULT NULL,
+    duplicate_of INT DEFAULT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sold_at TIMESTAMP NULL DEFAULT NULL,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (seller_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE SET NULL
 )
 """)
 
+# Columns added after the first release
+try:
+    cursor.execute("ALTER TABLE products ADD COLUMN sold_at TIMESTAMP NULL DEFAULT NULL")
+except pymysql.err.OperationalError:
+    pass  # Already exists
+
 cursor.execute("""
 CREATE TABLE IF NOT EXISTS product_ai_analysis (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -94,25 +103,233 @@ CREATE TABLE IF NOT EXISTS product_ai_analysis (
 )
 """)
 
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS duplicate_clusters (
+    product_id INT PRIMARY KEY,
+    cluster_id INT NOT NULL
+)
+""")
+
 cursor.execute("""
 CREATE TABLE IF NOT EXISTS messages (
-    id INT AUTO_INCREMENT PRIMARY KEY,
+    id INT AUTO_INCREMENT,
     sender_id INT NOT NULL,
     receiver_id INT NOT NULL,
     product_id INT,
     message_text TEXT NOT NULL,
     is_read BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+)
+PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) (
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+)
+""")
+
+# Older installs: partitioned tables cannot have foreign keys, and the
+# partition column must be part of the primary key
+cursor.execute("""
+SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS
+WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = 'messages'
+""")
+for (constraint,) in cursor.fetchall():
+    cursor.execute(f"ALTER TABLE messages DROP FOREIGN KEY {constraint}")
+cursor.execute("""
+SELECT COUNT(*) FROM information_schema.PARTITIONS
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'messages' AND PARTITION_NAME IS NOT NULL
+""")
+if cursor.fetchone()[0] == 0:
+    cursor.execute("""ALTER TABLE messages
+                      MODIFY created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                      DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at)""")
+    cursor.execute("""ALTER TABLE messages PARTITION BY RANGE (UNIX_TIMESTAMP(created_at))
+                      (PARTITION pmax VALUES LESS THAN MAXVALUE)""")
+
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS conversations (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_low INT NOT NULL,
+    user_high INT NOT NULL,
+    product_id INT NOT NULL DEFAULT 0,
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    live_since TIMESTAMP NULL DEFAULT NULL,
+    last_message_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_message VARCHAR(255),
+    last_sender_id INT,
+    message_count INT DEFAULT 0,
+    unread_low INT DEFAULT 0,
+    unread_high INT DEFAULT 0,
+    archived BOOLEAN DEFAULT FALSE,
+    UNIQUE KEY uq_conversation (user_low, user_high, product_id),
+    FOREIGN KEY (user_low) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_high) REFERENCES users(id) ON DELETE CASCADE
+)
+""")
+
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS message_archives (
+    conversation_id INT PRIMARY KEY,
+    message_count INT NOT NULL,
+    first_at TIMESTAMP NULL DEFAULT NULL,
+    last_at TIMESTAMP NULL DEFAULT NULL,
+    payload MEDIUMBLOB NOT NULL,
+    FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
+)
+""")
+
+
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS seller_stats (
+    seller_id INT PRIMARY KEY,
+    listing_count INT DEFAULT 0,
+    active_count INT DEFAULT 0,
+    sold_count INT DEFAULT 0,
+    total_views INT DEFAULT 0,
+    avg_trust FLOAT DEFAULT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (seller_id) REFERENCES users(id) ON DELETE CASCADE
+)
+""")
+
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS daily_category_stats (
+    day DATE NOT NULL,
+    category_id INT NOT NULL DEFAULT 0,
+    listings_created INT DEFAULT 0,
+    sold_count INT DEFAULT 0,
+    time_to_sold_sum BIGINT DEFAULT 0,
+    messages_count INT DEFAULT 0,
+    analyses_count INT DEFAULT 0,
+    trust_sum BIGINT DEFAULT 0,
+    blurry_count INT DEFAULT 0,
+    PRIMARY KEY (day, category_id)
+)
+""")
+
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+    source VARCHAR(30) PRIMARY KEY,
+    last_id INT DEFAULT 0,
+    last_ts DATETIME DEFAULT '2000-01-01 00:00:00',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+)
+""")
+
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS price_digests (
+    category_id INT NOT NULL DEFAULT 0,
+    item_condition VARCHAR(20) NOT NULL,
+    kind ENUM('listed', 'sold', 'days_to_sold') NOT NULL,
+    digest BLOB NOT NULL,
+    samples INT DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (category_id, item_condition, kind)
+)
+""")
+
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS saved_searches (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    query_text VARCHAR(200) NOT NULL DEFAULT '',
+    category_id INT DEFAULT NULL,
+    term_count INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE
+)
+""")
+
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS saved_search_terms (
+    term VARCHAR(50) NOT NULL,
+    search_id INT NOT NULL,
+    PRIMARY KEY (term, search_id),
+    FOREIGN KEY (search_id) REFERENCES saved_searches(id) ON DELETE CASCADE
+)
+""")
+
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS search_notifications (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    search_id INT NOT NULL,
+    product_id INT NOT NULL,
+    is_read BOOLEAN DEFAULT FALSE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (sender_id) REFERENCES users(id) ON DELETE CASCADE,
-    FOREIGN KEY (receiver_id) REFERENCES users(id) ON DELETE CASCADE,
-    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE SET NULL
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (search_id) REFERENCES saved_searches(id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+)
+""")
+
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS product_trending (
+    product_id INT PRIMARY KEY,
+    category_id INT NOT NULL DEFAULT 0,
+    log_score DOUBLE NOT NULL,
+    trust_boost DOUBLE NOT NULL DEFAULT 0,
+    rank_score DOUBLE NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+)
+""")
+
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS products_archive (
+    id INT PRIMARY KEY,
+    seller_id INT NOT NULL,
+    title VARCHAR(200) NOT NULL,
+    description TEXT,
+    price DECIMAL(10, 2) NOT NULL,
+    category_id INT,
+    item_condition ENUM('New', 'Like New', 'Used', 'Heavily Used') DEFAULT 'Used',
+    status ENUM('available', 'sold', 'removed') DEFAULT 'sold',
+    image_filename VARCHAR(255),
+    views_count INT DEFAULT 0,
+    image_hash BIGINT UNSIGNED DEFAULT NULL,
+    duplicate_of INT DEFAULT NULL,
+    created_at TIMESTAMP NULL DEFAULT NULL,
+    sold_at TIMESTAMP NULL DEFAULT NULL,
+    updated_at TIMESTAMP NULL DEFAULT NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (seller_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE SET NULL
+)
+""")
+
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS product_ai_analysis_archive (
+    id INT PRIMARY KEY,
+    product_id INT NOT NULL UNIQUE,
+    blur_score FLOAT DEFAULT 0.0,
+    is_blurry BOOLEAN DEFAULT FALSE,
+    condition_label VARCHAR(30) DEFAULT 'Unknown',
+    condition_confidence FLOAT DEFAULT 0.0,
+    feedback_text TEXT,
+    trust_score INT DEFAULT 0,
+    analyzed_at TIMESTAMP NULL DEFAULT NULL,
+    FOREIGN KEY (product_id) REFERENCES products_archive(id) ON DELETE CASCADE
+)
+""")
+
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS cache_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
 )
 """)
 
 conn.commit()
 print("✅ Database 'campus_marketplace' created successfully!")
-print("✅ All tables created: users, categories, products, product_ai_analysis, messages")
+print("✅ All tables created: users, categories, products, product_ai_analysis, messages, seller_stats, "
+      "daily_category_stats, rollup_watermarks, cache_versions, duplicate_clusters, "
+      "price_digests, saved_searches, saved_search_terms, search_notifications, "
+      "product_trending, products_archive, product_ai_analysis_archive, "
+      "conversations, message_archives")
 print("✅ 8 categories inserted")
+print("   Run conversations.py --rebuild, then --maintain (daily) for message partitions")
 
 cursor.close()
 conn.close()
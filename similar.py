@@ -0,0 +1,235 @@
+"""
+Similar Items — Image embeddings and a memory-mapped nearest-neighbor index
+Every listing photo gets a compact L2-normalized descriptor (colour
+layout plus edge orientation) stored as one float16 row. The index is two
+append-only files that every worker memory-maps read-only:
+
+    vectors.f16   N x DIM float16 embeddings
+    ids.i32       N product ids; negative = hidden (sold, removed, deleted)
+
+Adds append a row and status changes flip the id's sign in place. Each
+worker keeps a float32 copy of the matrix, extended when the files grow,
+so a lookup is one BLAS matrix-vector product without converting. Hidden rows
+are reclaimed by ``python similar.py --rebuild``, which also backfills
+existing listings.
+"""
+
+import argparse
+import fcntl
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from flask import current_app
+from PIL import Image
+
+DIM = 96
+_SIDE = 64
+
+
+# ─── Embedding ───────────────────────────────────────────────────────
+def image_embedding(path):
+    """96-d descriptor: 4x4x4 HSV histogram + 2x2-cell 8-bin gradient orientations."""
+    with Image.open(path) as img:
+        img = img.convert('RGB').resize((_SIDE, _SIDE))
+        hsv = np.asarray(img.convert('HSV')) >> 6
+        gray = np.asarray(img.convert('L'), dtype=np.float32)
+
+    colour = np.bincount((hsv[..., 0] * 16 + hsv[..., 1] * 4 + hsv[..., 2]).ravel(),
+                         minlength=64).astype(np.float32)
+
+    gy, gx = np.gradient(gray)
+    magnitude = np.hypot(gx, gy)
+    orientation = np.minimum((np.arctan2(gy, gx) % np.pi) / np.pi * 8, 7).astype(np.intp)
+    half = _SIDE // 2
+    cells = (np.arange(_SIDE)[:, None] // half) * 2 + np.arange(_SIDE)[None, :] // half
+    edges = np.bincount((cells * 8 + orientation).ravel(), weights=magnitude.ravel(),
+                        minlength=32).astype(np.float32)
+
+    # Hellinger mapping on each normalized histogram, then unit length overall
+    vector = np.concatenate([np.sqrt(colour / max(colour.sum(), 1e-9)),
+                             np.sqrt(edges / max(edges.sum(), 1e-9))])
+    return vector / max(np.linalg.norm(vector), 1e-9)
+
+
+# ─── Index ───────────────────────────────────────────────────────────
+class SimilarIndex:
+    """Append-only embedding files shared by all workers; each searches its own float32 copy."""
+
+    def __init__(self, directory, dim=DIM):
+        self.directory = directory
+        self.dim = dim
+        self.vectors_path = os.path.join(directory, 'vectors.f16')
+        self.ids_path = os.path.join(directory, 'ids.i32')
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._maps = None       # (ids memmap, float32 vectors)
+        os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def _writing(self):
+        """Exclusive lock across processes for appends, flips and rebuilds."""
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load(self):
+        """Mapped ids and a float32 copy of the vectors, refreshed when the files change.
+
+        Appends only convert the new rows; a rebuild (new inode) converts all.
+        The ids stay mapped so sign flips from other workers show up at once.
+        """
+        try:
+            st = os.stat(self.ids_path)
+        except FileNotFoundError:
+            return None
+        stamp = (st.st_ino, st.st_size)
+        with self._lock:
+            if stamp != self._stamp:
+                count = st.st_size // 4
+                if count == 0:
+                    self._maps = None
+                else:
+                    # ids are written after their vectors, so every listed row is complete
+                    ids = np.memmap(self.ids_path, dtype=np.int32, mode='r', shape=(count,))
+                    mapped = np.memmap(self.vectors_path, dtype=np.float16, mode='r',
+                                       shape=(count, self.dim))
+                    done = 0
+                    if self._maps is not None and self._stamp[0] == st.st_ino:
+                        done = len(self._maps[1])
+                    if done:
+                        vectors = np.concatenate([self._maps[1],
+                                                  mapped[done:].astype(np.float32)])
+                    else:
+                        vectors = mapped.astype(np.float32)
+                    del mapped
+                    self._maps = (ids, vectors)
+                self._stamp = stamp
+            return self._maps
+
+    def add(self, product_id, vector):
+        """Append a product's embedding, hiding any older row for it."""
+        row = np.asarray(vector, dtype=np.float16).reshape(self.dim)
+        with self._writing():
+            self._flip([product_id], hide=True)
+            with open(self.vectors_path, 'ab') as f:
+                f.write(row.tobytes())
+            with open(self.ids_path, 'ab') as f:
+                f.write(np.int32(product_id).tobytes())
+
+    def set_listed(self, product_ids, listed):
+        """Show or hide products in results without touching their vectors."""
+        with self._writing():
+            self._flip(product_ids, hide=not listed)
+
+    def _flip(self, product_ids, hide):
+        if not os.path.exists(self.ids_path) or os.path.getsize(self.ids_path) == 0:
+            return
+        ids = np.memmap(self.ids_path, dtype=np.int32, mode='r+')
+        wanted = np.asarray(list(product_ids), dtype=np.int32)
+        rows = np.flatnonzero(np.isin(np.abs(ids), wanted))
+        if len(rows):
+            ids[rows] = -np.abs(ids[rows]) if hide else np.abs(ids[rows])
+            ids.flush()
+        del ids
+
+    def search(self, product_id, k):
+        """Up to ``k`` listed product ids most similar to ``product_id``, best first."""
+        maps = self._load()
+        if maps is None:
+            return []
+        ids, vectors = maps
+        rows = np.flatnonzero(np.abs(ids) == product_id)
+        if not len(rows):
+            return []
+        scores = vectors @ vectors[rows[-1]]
+        scores[(ids <= 0) | (ids == product_id)] = -np.inf
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [int(ids[i]) for i in top if scores[i] > -np.inf]
+
+    def rebuild(self, items):
+        """Replace the index with ``items`` of (product_id, vector); returns the row count."""
+        tmp_vectors = self.vectors_path + '.tmp'
+        tmp_ids = self.ids_path + '.tmp'
+        count = 0
+        with open(tmp_vectors, 'wb') as fv, open(tmp_ids, 'wb') as fi:
+            for product_id, vector in items:
+                fv.write(np.asarray(vector, dtype=np.float16).reshape(self.dim).tobytes())
+                fi.write(np.int32(product_id).tobytes())
+                count += 1
+        with self._writing():
+            os.replace(tmp_vectors, self.vectors_path)
+            os.replace(tmp_ids, self.ids_path)
+        return count
+
+
+# ─── App Helpers ─────────────────────────────────────────────────────
+def _index():
+    return current_app.extensions['similar_index']
+
+
+def index_product(product_id, image_path):
+    """Embed a new listing's photo. Failures only cost the similar block."""
+    try:
+        _index().add(product_id, image_embedding(image_path))
+    except Exception as e:
+        print(f"[Similar Index Error] {e}")
+
+
+def set_listed(product_ids, listed):
+    """Hide sold, removed or deleted listings from results (or show restored ones)."""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    try:
+        _index().set_listed(product_ids, listed)
+    except Exception as e:
+        print(f"[Similar Index Error] {e}")
+
+
+def similar_ids(product_id, k):
+    try:
+        return _index().search(product_id, k)
+    except Exception as e:
+        print(f"[Similar Index Error] {e}")
+        return []
+
+
+def init_app(app):
+    app.extensions['similar_index'] = SimilarIndex(app.config['SIMILAR_INDEX_DIR'])
+
+
+# ─── Rebuild ─────────────────────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild the similar-items index.')
+    parser.add_argument('--rebuild', action='store_true', required=True)
+    parser.parse_args()
+
+    from config import Config
+    from db import query_db
+
+    rows = query_db("""SELECT id, image_filename FROM products
+                       WHERE status = 'available' AND image_filename IS NOT NULL
+                       ORDER BY id""")
+
+    def embeddings():
+        for row in rows:
+            path = os.path.join(Config.UPLOAD_FOLDER, row['image_filename'])
+            try:
+                yield row['id'], image_embedding(path)
+            except (OSError, ValueError) as e:
+                print(f"   skipping product {row['id']}: {e}")
+
+    count = SimilarIndex(Config.SIMILAR_INDEX_DIR).rebuild(embeddings())
+    print(f"✅ Similar-items index rebuilt with {count} listings")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+"""
+Trending — Decayed engagement scores
+Views, chat starts and the listing itself are engagement events. Each
+adds ``weight * exp(-(now - t) / tau)`` to its product's score, so
+yesterday's attention fades instead of counting forever like
+views_count.
+
+Decaying every score on a schedule is avoided by keeping scores in the
+log domain relative to a fixed epoch:
+
+    log_score = ln( sum  weight * exp((t - EPOCH) / tau) )
+
+Every score shrinks by the same factor over time, so this column orders
+products exactly as the decayed scores do. An event is a log-add-exp and
+nothing is rewritten when time passes. rank_score adds
+ln(0.5 + trust / 100), which scales engagement by the listing's AI trust.
+
+Workers buffer events in memory and fold them into product_trending on a
+background thread. The homepage's 'trending' sort reads the indexed
+rank_score column. The per-category top-K cards are precomputed into the
+shared cache.
+
+Backfill existing listings:  python trending.py --rebuild
+"""
+
+import argparse
+import atexit
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import current_app
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+def _logaddexp(a, b):
+    if a is None:
+        return b
+    hi, lo = max(a, b), min(a, b)
+    return hi + math.log1p(math.exp(lo - hi))
+
+
+def trust_boost(trust_score):
+    """Log-domain trust multiplier, 0.5x at trust 0 to 1.5x at trust 100; 1x when unknown."""
+    if trust_score is None:
+        return 0.0
+    return math.log(0.5 + min(max(trust_score, 0), 100) / 100)
+
+
+class TrendingScorer:
+    """Per-process buffer of engagement events, flushed every ``interval`` seconds."""
+
+    # Log-add-exp of the stored score and the incoming delta, in SQL, so
+    # concurrent flushes from several workers cannot lose each other's events
+    _MERGE = ("GREATEST(log_score, VALUES(log_score)) "
+              "+ LN(1 + EXP(-ABS(log_score - VALUES(log_score))))")
+
+    def __init__(self, transaction, half_life_hours, weights, interval=10.0, max_pending=1000):
+        self.transaction = transaction
+        self.tau = half_life_hours * 3600 / math.log(2)
+        self.weights = weights
+        self.interval = interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._wakeup = threading.Event()
+        self._worker = None
+        self._worker_pid = None
+        atexit.register(self.flush)
+
+    def event_log_weight(self, event, at=None):
+        """ln(weight) of an event at time ``at``, on the shared epoch scale."""
+        at = time.time() if at is None else at
+        return math.log(self.weights[event]) + (at - EPOCH) / self.tau
+
+    def add(self, product_id, event):
+        """Record an event. Never touches the database on the request path."""
+        value = self.event_log_weight(event)
+        with self._lock:
+            self._pending[product_id] = _logaddexp(self._pending.get(product_id), value)
+            pending = len(self._pending)
+        self._ensure_worker()
+        if pending >= self.max_pending:
+            self._wakeup.set()
+
+    def add_listing(self, product_id, trust_score):
+        """Seed a new listing's row with its 'listed' event and trust multiplier."""
+        value = self.event_log_weight('listed')
+        boost = trust_boost(trust_score)
+        try:
+            with self.transaction() as cur:
+                cur.execute(
+                    f"""INSERT INTO product_trending
+                           (product_id, category_id, log_score, trust_boost, rank_score)
+                        SELECT id, COALESCE(category_id, 0), %s, %s, %s
+                        FROM products WHERE id = %s
+                        ON DUPLICATE KEY UPDATE log_score = {self._MERGE},
+                            trust_boost = VALUES(trust_boost),
+                            rank_score = log_score + trust_boost""",
+                    (value, boost, value + boost, product_id)
+                )
+        except Exception as e:
+            print(f"[Trending Error] {e}")
+
+    def flush(self):
+        """Fold buffered events into product_trending. Returns the number of products updated."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            with self.transaction() as cur:
+                for product_id, value in pending.items():
+                    # Listings from before the table existed get their row on first event
+                    cur.execute(
+                        f"""INSERT INTO product_trending
+                               (product_id, category_id, log_score, rank_score)
+                            SELECT id, COALESCE(category_id, 0), %s, %s
+                            FROM products WHERE id = %s
+                            ON DUPLICATE KEY UPDATE log_score = {self._MERGE},
+                                rank_score = log_score + trust_boost""",
+                        (value, value, product_id)
+                    )
+        except Exception as e:
+            print(f"[Trending Error] {e}")
+            # Put the events back so the next flush retries them
+            with self._lock:
+                for product_id, value in pending.items():
+                    self._pending[product_id] = _logaddexp(self._pending.get(product_id), value)
+            return 0
+        return len(pending)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _ensure_worker(self):
+        """Start the flush thread once per process (threads do not survive fork)."""
+        if self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker_pid != os.getpid() or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='trending',
+                                                daemon=True)
+                self._worker.start()
+                self._worker_pid = os.getpid()
+
+
+# ─── App Helpers ─────────────────────────────────────────────────────
+def _scorer():
+    return current_app.extensions['trending']
+
+
+def record_event(product_id, event):
+    _scorer().add(product_id, event)
+
+
+def seed_listing(product_id, trust_score):
+    _scorer().add_listing(product_id, trust_score)
+
+
+def top_trending(query_db, make_cards, trust_label):
+    """{category_id: [cards]} of the top TRENDING_TOP_K listings per category, key 0 = all.
+
+    Computed with one windowed query at most once per TRENDING_TOP_TTL
+    across all workers; requests only read the cached structure.
+    """
+    config = current_app.config
+
+    def load():
+        rows = query_db(
+            """SELECT ranked.*, u.full_name AS seller_name,
+                      c.name AS category_name, c.icon AS category_icon,
+                      ai.trust_score, ai.condition_label
+               FROM (
+                   SELECT p.id, p.title, p.price, p.image_filename, p.item_condition,
+                          p.created_at, p.seller_id, p.category_id, t.rank_score,
+                          ROW_NUMBER() OVER (PARTITION BY t.category_id
+                                             ORDER BY t.rank_score DESC) AS category_rank
+                   FROM product_trending t
+                   JOIN products p ON p.id = t.product_id
+                   WHERE p.status = 'available'
+               ) ranked
+               JOIN users u ON u.id = ranked.seller_id
+               LEFT JOIN categories c ON c.id = ranked.category_id
+               LEFT JOIN product_ai_analysis ai ON ai.product_id = ranked.id
+               WHERE ranked.category_rank <= %s
+               ORDER BY ranked.rank_score DESC""",
+            (config['TRENDING_TOP_K'],)
+        )
+        top = {0: []}
+        for row in rows:
+            if row['category_id']:
+                top.setdefault(row['category_id'], []).append(row)
+            top[0].append(row)
+        top[0] = top[0][:config['TRENDING_TOP_K']]
+        return {category: make_cards(group, trust_label) for category, group in top.items()}
+
+    return current_app.extensions['shared_cache'].get_or_set(
+        'trending:top', load, ttl=config['TRENDING_TOP_TTL'])
+
+
+def init_app(app, transaction):
+    app.extensions['trending'] = TrendingScorer(
+        transaction,
+        half_life_hours=app.config['TRENDING_HALF_LIFE_HOURS'],
+        weights=app.config['TRENDING_WEIGHTS'],
+        interval=app.config['TRENDING_FLUSH_INTERVAL'])
+
+
+# ─── Rebuild ─────────────────────────────────────────────────────────
+def rebuild_trending(query_db, transaction, scorer):
+    """Recompute every score from listing times, views, first messages and trust.
+
+    Individual view times are not recorded, so a product's views_count
+    is credited at its last update. Chat starts use each conversation's
+    first message about the product.
+    """
+    products = query_db(
+        """SELECT p.id, COALESCE(p.category_id, 0) AS category_id, p.views_count,
+                  UNIX_TIMESTAMP(p.created_at) AS created, UNIX_TIMESTAMP(p.updated_at) AS updated,
+                  ai.trust_score
+           FROM products p
+           LEFT JOIN product_ai_analysis ai ON ai.product_id = p.id"""
+    )
+    chats = query_db(
+        """SELECT product_id, UNIX_TIMESTAMP(MIN(created_at)) AS started
+           FROM messages WHERE product_id IS NOT NULL
+           GROUP BY product_id, sender_id, receiver_id"""
+    )
+    scores = {}
+    for p in products:
+        score = scorer.event_log_weight('listed', float(p['created']))
+        if p['views_count']:
+            score = _logaddexp(score, math.log(p['views_count'])
+                               + scorer.event_log_weight('view', float(p['updated'])))
+        scores[p['id']] = score
+    for chat in chats:
+        if chat['product_id'] in scores:
+            scores[chat['product_id']] = _logaddexp(
+                scores[chat['product_id']], scorer.event_log_weight('chat', float(chat['started'])))
+
+    rows = []
+    for p in products:
+        boost = trust_boost(p['trust_score'])
+        rows.append((p['id'], p['category_id'], scores[p['id']], boost, scores[p['id']] + boost))
+    with transaction() as cur:
+        cur.execute("DELETE FROM product_trending")
+        cur.executemany(
+            """INSERT INTO product_trending
+                   (product_id, category_id, log_score, trust_boost, rank_score)
+               VALUES (%s, %s, %s, %s, %s)""",
+            rows
+        )
+    return len(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild trending scores from history.')
+    parser.add_argument('--rebuild', action='store_true', required=True)
+    parser.parse_args()
+
+    from config import Config
+    from db import query_db, transaction
+    scorer = TrendingScorer(transaction, Config.TRENDING_HALF_LIFE_HOURS, Config.TRENDING_WEIGHTS)
+    count = rebuild_trending(query_db, transaction, scorer)
+    print(f"✅ Trending scores rebuilt for {count} listings")
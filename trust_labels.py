@@ -0,0 +1,43 @@
+"""
+Trust Labels — Score to badge mapping for listing grids and product pages
+The mapping is ai_module.trust_scorer.get_trust_label, so badges always
+match the labels an analysis returns. trust_scorer is a leaf module: it is
+loaded from its file on first use without running ai_module's package
+__init__, which imports TensorFlow for the analysis pipeline. If it cannot
+be loaded on its own, it is imported normally.
+"""
+
+import importlib.util
+import os
+import threading
+
+_lock = threading.Lock()
+_funcs = {}
+
+
+def _load_leaf():
+    package = importlib.util.find_spec('ai_module')
+    if package is None or not package.submodule_search_locations:
+        raise ImportError('ai_module not found')
+    path = os.path.join(list(package.submodule_search_locations)[0], 'trust_scorer.py')
+    spec = importlib.util.spec_from_file_location('ai_module.trust_scorer', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.get_trust_label
+
+
+def _label_func():
+    if not _funcs:
+        with _lock:
+            if not _funcs:
+                try:
+                    _funcs['get_trust_label'] = _load_leaf()
+                except (ImportError, OSError):
+                    from ai_module.trust_scorer import get_trust_label
+                    _funcs['get_trust_label'] = get_trust_label
+    return _funcs['get_trust_label']
+
+
+def get_trust_label(score):
+    """{'label', 'color', 'icon'} for a trust score, from ai_module's trust scorer."""
+    return _label_func()(score)
@@ -0,0 +1,89 @@
+"""
+View Counter — Batched product view counting
+Product pages record views in memory; a background thread folds them into
+products.views_count and seller_stats.total_views with one transaction per
+flush instead of two UPDATEs per page view.
+"""
+
+import atexit
+import os
+import threading
+
+
+class ViewCounter:
+    """Per-process buffer of product views, flushed every ``interval`` seconds."""
+
+    def __init__(self, transaction, interval=5.0, max_pending=1000):
+        self.transaction = transaction
+        self.interval = interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._products = {}
+        self._sellers = {}
+        self._wakeup = threading.Event()
+        self._worker = None
+        self._worker_pid = None
+        atexit.register(self.flush)
+
+    def add(self, product_id, seller_id, count=1):
+        """Record a view. Never touches the database on the request path."""
+        with self._lock:
+            self._products[product_id] = self._products.get(product_id, 0) + count
+            self._sellers[seller_id] = self._sellers.get(seller_id, 0) + count
+            pending = len(self._products)
+        self._ensure_worker()
+        if pending >= self.max_pending:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write buffered views to the database. Returns the number of products updated."""
+        with self._lock:
+            products, self._products = self._products, {}
+            sellers, self._sellers = self._sellers, {}
+        if not products:
+            return 0
+        try:
+            with self.transaction() as cur:
+                # updated_at is pinned: a view is not a content change
+                self._add_counts(cur, 'products', 'views_count', 'id', products,
+                                 extra=', updated_at = updated_at')
+                self._add_counts(cur, 'seller_stats', 'total_views', 'seller_id', sellers)
+        except Exception as e:
+            print(f"[View Counter Error] {e}")
+            # Put the counts back so the next flush retries them
+            with self._lock:
+                for pid, n in products.items():
+                    self._products[pid] = self._products.get(pid, 0) + n
+                for sid, n in sellers.items():
+                    self._sellers[sid] = self._sellers.get(sid, 0) + n
+            return 0
+        return len(products)
+
+    @staticmethod
+    def _add_counts(cur, table, column, key, counts, extra=''):
+        """Add per-key increments to ``column`` with a single CASE update."""
+        cases = ' '.join(['WHEN %s THEN %s'] * len(counts))
+        placeholders = ', '.join(['%s'] * len(counts))
+        params = [v for item in counts.items() for v in item] + list(counts)
+        cur.execute(
+            f"UPDATE {table} SET {column} = {column} + CASE {key} {cases} ELSE 0 END{extra} "
+            f"WHERE {key} IN ({placeholders})",
+            params
+        )
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _ensure_worker(self):
+        """Start the flush thread once per process (threads do not survive fork)."""
+        if self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker_pid != os.getpid() or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='view-counter',
+                                                daemon=True)
+                self._worker.start()
+                self._worker_pid = os.getpid()